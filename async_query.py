@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Superset のグローバル非同期クエリ（GLOBAL_ASYNC_QUERIES）クライアント
+
+GLOBAL_ASYNC_QUERIES が有効な Superset では /api/v1/chart/data がデータの代わりに
+202 とジョブ情報（job_id / channel_id / result_url）だけを返し、クエリは Celery ワーカーで実行される。
+本モジュールでは
+- 多数の query_context をまとめて投入（同期モードで 200 が返った場合はそのまま結果として扱う）
+- ジョブの状態は /api/v1/async_event/（GAQ_TRANSPORT = "polling" のイベントストリーム）で一括追跡
+- イベント API が使えない場合（websocket トランスポートなど）は result_url を指数バックオフでポーリング
+- 完了したジョブから順に result_url の結果を取得
+を行い、1クエリにつき1リクエストをブロックしたまま待つことを避ける。
+
+イベントのチャネルは chart/data の応答で設定される async-token Cookie で決まるため、
+Guest Token ごとの requests.Session をそのまま渡せばよい。
+
+使い方:
+    from async_query import AsyncQueryClient
+    client = AsyncQueryClient(workers=8)
+    for key, result, error, seconds in client.run([(key, guest, query_context), ...]):
+        ...
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import superset_client
+from superset_client import SUPERSET_URL, parse_json
+
+POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 5.0
+JOB_TIMEOUT = 300
+
+# result_url がまだ結果を返せないときのステータス（キャッシュ未作成）
+# イベントで完了が通知された後の 422 は結果がキャッシュから消えたことを意味するため待たない
+NOT_READY = (404, 422)
+MISSING_AFTER_DONE = 422
+
+class AsyncQueryError(Exception):
+    """非同期ジョブがエラー・期限切れ・タイムアウトで終了した"""
+
+class AsyncQueryClient:
+    """
+    チャートデータの非同期ジョブをまとめて投入・追跡する
+
+    Args:
+        workers: 投入・結果取得の同時リクエスト数
+        poll_interval: イベント / result_url ポーリングの初回間隔（秒）
+        max_interval: バックオフの上限（秒）
+        timeout: 1ジョブあたりの待ち時間の上限（秒）
+    """
+
+    def __init__(self, workers=4, poll_interval=POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, timeout=JOB_TIMEOUT):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.events_available = True
+        self._last_event_ids = {}
+
+    def submit(self, http_session, query_context):
+        """
+        query_context を投入
+
+        Returns:
+            tuple: ("done", クエリごとの結果) または ("pending", ジョブ情報)
+        """
+        response = http_session.post(f"{SUPERSET_URL}/api/v1/chart/data", json=query_context)
+        response.raise_for_status()
+        body = parse_json(response)
+        if response.status_code == 202:
+            return "pending", body
+        return "done", body["result"]
+
+    def fetch_result(self, http_session, result_url, done=False):
+        """
+        完了したジョブの結果を取得（まだ取得できない場合は None）
+
+        Args:
+            done: イベントストリームで完了が通知済み（この場合 422 は結果の欠落としてエラーにする）
+        """
+        response = http_session.get(f"{SUPERSET_URL}{result_url}")
+        if done and response.status_code == MISSING_AFTER_DONE:
+            raise AsyncQueryError(f"完了したジョブの結果がキャッシュにありません（削除または期限切れ）: {result_url}")
+        if response.status_code in NOT_READY:
+            return None
+        if response.status_code == 410:
+            raise AsyncQueryError(f"結果の有効期限が切れました: {result_url}")
+        response.raise_for_status()
+        return parse_json(response)["result"]
+
+    def poll_events(self, http_session):
+        """
+        イベントストリームから前回以降のイベントを取得
+
+        Returns:
+            list: イベント（job_id / status / errors / result_url）。イベント API が使えない場合は None
+        """
+        last_id = self._last_event_ids.get(id(http_session))
+        params = {"last_id": last_id} if last_id else {}
+        response = http_session.get(f"{SUPERSET_URL}/api/v1/async_event/", params=params)
+        if response.status_code in (404, 405):
+            return None
+        response.raise_for_status()
+        events = parse_json(response)["result"]
+        if events:
+            self._last_event_ids[id(http_session)] = events[-1]["id"]
+        return events
+
+    def run(self, tasks):
+        """
+        タスクを一括投入し、終わったものから順に返す
+
+        Args:
+            tasks: (key, http_session, query_context) のリスト（http_session が None なら管理者セッション）
+
+        Yields:
+            tuple: (key, クエリごとの結果, エラーメッセージ, 投入から結果取得までの秒数)
+        """
+        jobs = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            submitted = {}
+            for key, http_session, query_context in tasks:
+                http_session = http_session or superset_client.session
+                future = executor.submit(self.submit, http_session, query_context)
+                submitted[future] = (key, http_session, time.perf_counter())
+
+            for future in as_completed(submitted):
+                key, http_session, started = submitted[future]
+                try:
+                    state, body = future.result()
+                except Exception as e:
+                    yield key, None, str(e), time.perf_counter() - started
+                    continue
+                if state == "done":
+                    yield key, body, None, time.perf_counter() - started
+                    continue
+                jobs[body["job_id"]] = {
+                    "key": key,
+                    "session": http_session,
+                    "result_url": body["result_url"],
+                    "started": started,
+                    "next_poll": None if self.events_available else time.perf_counter() + self.poll_interval,
+                    "delay": self.poll_interval,
+                }
+
+            yield from self._track(executor, jobs)
+
+    def _track(self, executor, jobs):
+        in_flight = {}
+        interval = self.poll_interval
+        while jobs:
+            progressed = False
+
+            # 結果の取得が終わったもの
+            for future in [f for f in in_flight if f.done()]:
+                job_id = in_flight.pop(future)
+                job = jobs.get(job_id)
+                if job is None:  # 取得中にエラーイベントで終了済み
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    del jobs[job_id]
+                    yield job["key"], None, str(e), time.perf_counter() - job["started"]
+                    continue
+                if result is None:
+                    # イベントより先に result_url を見た / キャッシュ書き込み前: バックオフして再取得
+                    job["next_poll"] = time.perf_counter() + job["delay"]
+                    job["delay"] = min(job["delay"] * 2, self.max_interval)
+                    continue
+                del jobs[job_id]
+                progressed = True
+                yield job["key"], result, None, time.perf_counter() - job["started"]
+
+            # イベントストリームで状態を確認（セッション = チャネルごと）
+            if self.events_available:
+                for http_session in {id(job["session"]): job["session"] for job in jobs.values()}.values():
+                    events = self.poll_events(http_session)
+                    if events is None:
+                        print("ℹ️  イベント API が使えないため result_url のポーリングに切り替えます")
+                        self.events_available = False
+                        for job in jobs.values():
+                            job["next_poll"] = job["next_poll"] or time.perf_counter()
+                        break
+                    for event in events:
+                        job = jobs.get(event.get("job_id"))
+                        if not job:
+                            continue
+                        if event["status"] == "done":
+                            job["done"] = True
+                            job["next_poll"] = time.perf_counter()
+                            progressed = True
+                        elif event["status"] == "error":
+                            del jobs[event["job_id"]]
+                            progressed = True
+                            messages = [e.get("message", str(e)) for e in event.get("errors") or []]
+                            error = "; ".join(messages) or "非同期クエリが失敗しました"
+                            yield job["key"], None, error, time.perf_counter() - job["started"]
+
+            now = time.perf_counter()
+            fetching = set(in_flight.values())
+            for job_id, job in list(jobs.items()):
+                if job_id in fetching:
+                    continue
+                if now - job["started"] > self.timeout:
+                    del jobs[job_id]
+                    yield job["key"], None, f"{self.timeout}秒以内に完了しませんでした", now - job["started"]
+                elif job["next_poll"] is not None and job["next_poll"] <= now:
+                    job["next_poll"] = None
+                    in_flight[executor.submit(self.fetch_result, job["session"], job["result_url"],
+                                              job.get("done", False))] = job_id
+
+            if not jobs:
+                break
+            interval = self.poll_interval if progressed else min(interval * 2, self.max_interval)
+            if in_flight:
+                wait(in_flight, timeout=interval, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(interval)
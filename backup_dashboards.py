@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Dashboard バックアップ / リストアスクリプト
+
+- snapshot: 全Dashboardを export API で並列エクスポートし、コンテンツアドレス方式で保存
+  前回スナップショットから changed_on が変わっていない Dashboard はエクスポート自体をスキップ
+- restore: スナップショットから zip を再構成し、import API へ並列数を制限して投入
+
+使い方:
+    python backup_dashboards.py snapshot [--workers 8]
+    python backup_dashboards.py restore [--manifest backups/snapshots/xxx.json] [--dashboard 12 15]
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from superset_client import SUPERSET_URL, session, login, configure_pool, fetch_all, rison_ids
+from content_store import put_blob, get_blob
+
+BACKUP_DIR = "backups"
+SNAPSHOT_DIR = os.path.join(BACKUP_DIR, "snapshots")
+DEFAULT_WORKERS = 8
+
+def latest_manifest_path():
+    """最新のスナップショットマニフェストのパスを返す"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return None
+    names = sorted(n for n in os.listdir(SNAPSHOT_DIR) if n.endswith(".json"))
+    return os.path.join(SNAPSHOT_DIR, names[-1]) if names else None
+
+def load_manifest(path):
+    """マニフェストを読み込む（存在しなければ空）"""
+    if not path or not os.path.exists(path):
+        return {"dashboards": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compute_versions():
+    """
+    Dashboard ごとのバージョンキーを計算
+
+    Dashboard 自体の changed_on に加え、所属 Chart と参照 Dataset の changed_on を含める
+    （Chart だけを編集しても Dashboard の changed_on は更新されないため）
+    """
+    dashboards = fetch_all("dashboard", columns=["id", "dashboard_title", "changed_on_utc"])
+    charts = fetch_all("chart", columns=["id", "changed_on_utc", "datasource_id", "datasource_type", "dashboards.id"])
+    datasets = fetch_all("dataset", columns=["id", "changed_on_utc"])
+
+    dataset_changed = {ds["id"]: ds["changed_on_utc"] for ds in datasets}
+    charts_by_dashboard = {}
+    for chart in charts:
+        for dashboard in chart.get("dashboards", []):
+            charts_by_dashboard.setdefault(dashboard["id"], []).append(chart)
+
+    versions = {}
+    for dashboard in dashboards:
+        members = sorted(charts_by_dashboard.get(dashboard["id"], []), key=lambda c: c["id"])
+        dataset_ids = sorted({c["datasource_id"] for c in members if c.get("datasource_type") == "table"})
+        versions[str(dashboard["id"])] = {
+            "title": dashboard["dashboard_title"],
+            "version": [
+                dashboard["changed_on_utc"],
+                [[c["id"], c["changed_on_utc"]] for c in members],
+                [[ds_id, dataset_changed.get(ds_id)] for ds_id in dataset_ids],
+            ],
+        }
+    return versions
+
+def export_dashboard(dashboard_id):
+    """
+    Dashboard を export API で取得し、zip の各ファイルをストアへ保存
+
+    Returns:
+        tuple: ({相対パス: ダイジェスト}, 新規に書き込んだファイル数)
+    """
+    response = session.get(
+        f"{SUPERSET_URL}/api/v1/dashboard/export/",
+        params={"q": rison_ids([dashboard_id])},
+    )
+    response.raise_for_status()
+
+    files = {}
+    written = 0
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        for name in archive.namelist():
+            if name.endswith("/"):
+                continue
+            # 先頭の "dashboard_export_<timestamp>/" はエクスポートごとに変わるので除去
+            relpath = name.split("/", 1)[1] if "/" in name else name
+            digest, is_new = put_blob(BACKUP_DIR, archive.read(name))
+            files[relpath] = digest
+            written += int(is_new)
+
+    return files, written
+
+def snapshot(workers):
+    """全Dashboardのスナップショットを作成"""
+    print("📸 スナップショットを作成中...")
+
+    previous = load_manifest(latest_manifest_path())["dashboards"]
+    versions = compute_versions()
+
+    entries = {}
+    targets = []
+    for dashboard_id, info in versions.items():
+        prev = previous.get(dashboard_id)
+        if prev and prev["version"] == info["version"]:
+            entries[dashboard_id] = prev
+        else:
+            targets.append(dashboard_id)
+
+    print(f"📊 Dashboard {len(versions)}件 (変更あり: {len(targets)}件 / スキップ: {len(entries)}件)")
+
+    written_total = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(export_dashboard, int(d)): d for d in targets}
+        for future in as_completed(futures):
+            dashboard_id = futures[future]
+            title = versions[dashboard_id]["title"]
+            try:
+                files, written = future.result()
+            except Exception as e:
+                print(f"  ❌ {title} (ID: {dashboard_id}): {e}")
+                failed += 1
+                # 失敗時は前回分を引き継ぐ
+                if dashboard_id in previous:
+                    entries[dashboard_id] = previous[dashboard_id]
+                continue
+
+            entries[dashboard_id] = {**versions[dashboard_id], "files": files}
+            written_total += written
+            print(f"  ✅ {title} (ID: {dashboard_id}) - {len(files)}ファイル / 新規 {written}件")
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    created_at = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    manifest_path = os.path.join(SNAPSHOT_DIR, f"{created_at}.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"created_at": created_at, "dashboards": entries}, f, ensure_ascii=False, indent=2)
+
+    print()
+    print(f"結果: エクスポート {len(targets) - failed}件 / 失敗 {failed}件 / 新規オブジェクト {written_total}件")
+    print(f"📄 マニフェスト: {manifest_path}")
+    return failed == 0
+
+def build_bundle(entry):
+    """マニフェストのエントリから import 用 zip を再構成"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for relpath, digest in sorted(entry["files"].items()):
+            archive.writestr(f"dashboard_export_restore/{relpath}", get_blob(BACKUP_DIR, digest))
+    return buffer.getvalue()
+
+def import_dashboard(entry, overwrite, passwords):
+    """zip を import API へ送信"""
+    data = {"overwrite": "true" if overwrite else "false"}
+    if passwords:
+        data["passwords"] = json.dumps(passwords)
+
+    response = session.post(
+        f"{SUPERSET_URL}/api/v1/dashboard/import/",
+        files={"formData": ("dashboard.zip", build_bundle(entry), "application/zip")},
+        data=data,
+        # multipart送信のため共通ヘッダーの Content-Type を外す
+        headers={"Content-Type": None},
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code} - {response.text}")
+
+def restore(manifest_path, dashboard_ids, workers, overwrite, passwords):
+    """スナップショットから Dashboard をリストア"""
+    manifest_path = manifest_path or latest_manifest_path()
+    if not manifest_path:
+        print("❌ スナップショットが見つかりません")
+        return False
+
+    entries = load_manifest(manifest_path)["dashboards"]
+    if dashboard_ids:
+        entries = {k: v for k, v in entries.items() if k in {str(d) for d in dashboard_ids}}
+
+    print(f"♻️  {manifest_path} から {len(entries)}件のDashboardをリストア中...")
+
+    retry = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(import_dashboard, e, overwrite, passwords): d for d, e in entries.items()}
+        for future in as_completed(futures):
+            dashboard_id = futures[future]
+            try:
+                future.result()
+                print(f"  ✅ {entries[dashboard_id]['title']} (ID: {dashboard_id})")
+            except Exception as e:
+                # 共有Dataset/Databaseの同時importによる競合はあとで逐次リトライ
+                print(f"  ⚠️  {entries[dashboard_id]['title']} (ID: {dashboard_id}): {e}")
+                retry.append(dashboard_id)
+
+    failed = 0
+    for dashboard_id in retry:
+        try:
+            import_dashboard(entries[dashboard_id], overwrite, passwords)
+            print(f"  ✅ (リトライ) {entries[dashboard_id]['title']} (ID: {dashboard_id})")
+        except Exception as e:
+            print(f"  ❌ {entries[dashboard_id]['title']} (ID: {dashboard_id}): {e}")
+            failed += 1
+
+    print()
+    print(f"結果: 成功 {len(entries) - failed}件 / 失敗 {failed}件")
+    return failed == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard バックアップ / リストア")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="全Dashboardをエクスポート")
+    snapshot_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+
+    restore_parser = subparsers.add_parser("restore", help="スナップショットからimport")
+    restore_parser.add_argument("--manifest", help="マニフェストのパス（省略時は最新）")
+    restore_parser.add_argument("--dashboard", type=int, nargs="*", help="対象Dashboard ID（省略時は全件）")
+    restore_parser.add_argument("--workers", type=int, default=4)
+    restore_parser.add_argument("--no-overwrite", action="store_true", help="既存オブジェクトを上書きしない")
+    restore_parser.add_argument("--passwords", help="Database パスワードの JSON ファイル ({\"databases/xxx.yaml\": \"pw\"})")
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Dashboard バックアップ / リストア")
+    print("=" * 60)
+    print()
+
+    if not login():
+        return
+
+    configure_pool(args.workers)
+
+    if args.command == "snapshot":
+        snapshot(args.workers)
+    else:
+        passwords = None
+        if args.passwords:
+            with open(args.passwords, encoding="utf-8") as f:
+                passwords = json.load(f)
+        restore(args.manifest, args.dashboard, args.workers, not args.no_overwrite, passwords)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+テナント分離方式のベンチマーク
+
+このリポジトリで試した部署フィルタリング方式を、同じ Dashboard・同じ負荷で比較する。
+    rls         Guest Token の RLS 句（generate_guest_token.py）
+    url_param   埋め込み SDK の urlParams + Jinja の url_param()（URL_PARAMS_FILTERING_PROJECT.md）
+
+Guest Token の user.extra_json + Jinja（SupersetService）は、Superset が current_user() などの
+extra_json を参照できるマクロを公開していないため（JINJA_TEMPLATE_INVESTIGATION.md）計測できない。
+--strategies extra_json を指定しても理由を表示してスキップする。
+
+方式ごとに Dataset（SQL を方式に合わせて包んだもの）・チャート・埋め込み Dashboard を複製し、
+全部署で同じ回数だけ全チャートを並列取得して、レイテンシ・キャッシュヒット率・トークンサイズを並べる。
+あわせて rls の結果との一致（データの正しさ）と、url_param を別部署の値に書き換えた場合の挙動（改ざん耐性）も確認する。
+
+使い方:
+    python benchmark_tenant_strategies.py                       # 埋め込み Dashboard を元に rls / url_param を比較
+    python benchmark_tenant_strategies.py --iterations 10 --workers 8
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from superset_client import login, guest_session, session, SUPERSET_URL
+from dashboard_metadata import patch_dashboard_metadata
+from chart_builders import ChartNode, build_position_json, grid_rows
+from generate_guest_token import DEPARTMENTS, DASHBOARD_ID, generate_guest_token
+from chart_data import NO_FILTER, get_chart, get_dataset, load_chart, chart_query_context, dashboard_time_ranges, fetch_chart_data
+
+STRATEGIES = ("rls", "url_param")
+
+# 計測できない方式と理由
+UNSUPPORTED_STRATEGIES = {
+    "extra_json": "Superset の Jinja には Guest Token の extra_json を参照できるマクロがない"
+                  "（current_user() は提供されておらず、全リクエストがエラーになる）",
+}
+
+# 方式ごとに Dataset SQL の外側に付ける部署条件
+STRATEGY_WHERE = {
+    "rls": None,
+    "url_param": "department_id = {{ url_param('department_id', 0)|int }}",
+}
+
+SECURITY_NOTES = {
+    "rls": "サーバー側で強制（署名付きトークン）",
+    "url_param": "クライアントが値を指定（改ざん可能）",
+}
+
+DASHBOARD_TITLE = "テナント分離ベンチマーク ({strategy})"
+
+def strategy_sql(strategy, base_sql):
+    where = STRATEGY_WHERE[strategy]
+    if not where:
+        return base_sql
+    return f"SELECT * FROM (\n{base_sql.strip().rstrip(';')}\n) AS base\nWHERE {where}"
+
+def strategy_token(strategy, department_id, username, dashboard_uuid):
+    token, _ = generate_guest_token(department_id, username, dashboard_uuid, rls=strategy == "rls")
+    return token
+
+def _find(resource, column, value):
+    response = session.get(
+        f"{SUPERSET_URL}/api/v1/{resource}/",
+        params={"q": json.dumps({"filters": [{"col": column, "opr": "eq", "value": value}]})},
+    )
+    response.raise_for_status()
+    result = response.json()["result"]
+    return result[0]["id"] if result else None
+
+def clone_dataset(dataset_id, strategy):
+    """元 Dataset の SQL を方式に合わせて包んだ Virtual Dataset（既存なら再利用）"""
+    source = get_dataset(dataset_id)
+    name = f"{source['table_name']}__{strategy}"
+    existing = _find("dataset", "table_name", name)
+    if existing:
+        return existing
+
+    base_sql = source.get("sql") or f"SELECT * FROM {source['table_name']}"
+    response = session.post(f"{SUPERSET_URL}/api/v1/dataset/", json={
+        "database": source["database"]["id"],
+        "schema": source.get("schema"),
+        "table_name": name,
+        "sql": strategy_sql(strategy, base_sql),
+    })
+    if response.status_code != 201:
+        raise RuntimeError(f"Dataset作成失敗: {response.status_code} - {response.text}")
+    return response.json()["id"]
+
+def embed(dashboard_id):
+    """埋め込み設定を有効にして UUID を返す"""
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/embedded")
+    if response.status_code == 200:
+        return response.json()["result"]["uuid"]
+    response = session.post(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/embedded", json={"allowed_domains": []})
+    response.raise_for_status()
+    return response.json()["result"]["uuid"]
+
+def provision(strategy, source_chart_ids):
+    """
+    方式ごとの Dashboard を用意（既存なら再利用）
+
+    Returns:
+        tuple: (dashboard_id, 埋め込み UUID, {元チャートID: 複製チャートID})
+    """
+    title = DASHBOARD_TITLE.format(strategy=strategy)
+    dashboard_id = _find("dashboard", "dashboard_title", title)
+    suffix = f" [{strategy}]"
+
+    if dashboard_id:
+        response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/charts")
+        response.raise_for_status()
+        by_name = {chart["slice_name"]: chart["id"] for chart in response.json()["result"]}
+        mapping = {}
+        for chart_id in source_chart_ids:
+            slice_name, _, _, _ = get_chart(chart_id)
+            if slice_name + suffix in by_name:
+                mapping[chart_id] = by_name[slice_name + suffix]
+        return dashboard_id, embed(dashboard_id), mapping
+
+    response = session.post(f"{SUPERSET_URL}/api/v1/dashboard/", json={"dashboard_title": title, "published": True})
+    if response.status_code != 201:
+        raise RuntimeError(f"Dashboard作成失敗: {response.status_code} - {response.text}")
+    dashboard_id = response.json()["id"]
+
+    mapping = {}
+    nodes = []
+    for chart_id in source_chart_ids:
+        slice_name, viz_type, datasource_id, params = get_chart(chart_id)
+        dataset_id = clone_dataset(datasource_id, strategy)
+        params = {**params, "datasource": f"{dataset_id}__table"}
+        response = session.post(f"{SUPERSET_URL}/api/v1/chart/", json={
+            "slice_name": slice_name + suffix,
+            "viz_type": viz_type,
+            "datasource_id": dataset_id,
+            "datasource_type": "table",
+            "params": json.dumps(params),
+            "dashboards": [dashboard_id],
+        })
+        if response.status_code != 201:
+            raise RuntimeError(f"Chart作成失敗: {response.status_code} - {response.text}")
+        mapping[chart_id] = response.json()["id"]
+        nodes.append(ChartNode(mapping[chart_id], slice_name + suffix))
+
+    patch_dashboard_metadata(dashboard_id, position_json=build_position_json(grid_rows(nodes)))
+    return dashboard_id, embed(dashboard_id), mapping
+
+def fetch(guest, chart, url_params, force=False):
+    started = time.perf_counter()
+    query_context = chart_query_context(chart, chart["time_range"], force=force, url_params=url_params)
+    result = fetch_chart_data(query_context, http_session=guest)[0]
+    return time.perf_counter() - started, bool(result.get("is_cached")), result.get("data", [])
+
+def _fingerprint(data):
+    return json.dumps(sorted(json.dumps(row, sort_keys=True, default=str) for row in data))
+
+def run_load(targets, iterations, workers):
+    """
+    全方式 × 全部署 × 全チャートを iterations 回取得（方式間で時間帯の偏りが出ないよう交互に実行）
+
+    複製したチャートは前回の実行のキャッシュが残っているため、1回目は force で必ず DB に問い合わせ、
+    それが終わってから2回目以降を実行する
+
+    Returns:
+        list: (方式, 部署ID, 元チャートID, 回, 秒, キャッシュ有無, データ)
+    """
+    tasks = []
+    for iteration in range(iterations):
+        for department_id, _, _ in DEPARTMENTS:
+            for strategy, target in targets.items():
+                url_params = {"department_id": department_id} if strategy == "url_param" else None
+                for source_id, chart in target["charts"].items():
+                    tasks.append((strategy, department_id, source_id, iteration, target["guests"][department_id],
+                                  chart, url_params))
+
+    def run(task):
+        strategy, department_id, source_id, iteration, guest, chart, url_params = task
+        try:
+            seconds, cached, data = fetch(guest, chart, url_params, force=iteration == 0)
+        except requests.RequestException as e:
+            return strategy, department_id, source_id, iteration, None, False, str(e)
+        return strategy, department_id, source_id, iteration, seconds, cached, data
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, [t for t in tasks if t[3] == 0]))
+        return results + list(executor.map(run, [t for t in tasks if t[3] > 0]))
+
+def tamper_check(target):
+    """url_param を別部署の値に書き換えて、その部署のデータが見えるか"""
+    (own_id, _, _), (other_id, _, _) = DEPARTMENTS[0], DEPARTMENTS[1]
+    guest = target["guests"][own_id]
+    for chart in target["charts"].values():
+        try:
+            _, _, own = fetch(guest, chart, {"department_id": own_id})
+            _, _, other = fetch(guest, chart, {"department_id": other_id})
+        except requests.RequestException:
+            continue
+        if own and other and _fingerprint(own) != _fingerprint(other):
+            return True
+    return False
+
+def _percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="テナント分離方式のベンチマーク")
+    parser.add_argument("--dashboard", default=DASHBOARD_ID, help="元にする Dashboard")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES + tuple(UNSUPPORTED_STRATEGIES),
+                        default=list(STRATEGIES))
+    parser.add_argument("--iterations", type=int, default=5, help="部署ごとの Dashboard 読み込み回数")
+    parser.add_argument("--workers", type=int, default=6)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("テナント分離方式のベンチマーク")
+    print("=" * 60)
+
+    for strategy in [s for s in args.strategies if s in UNSUPPORTED_STRATEGIES]:
+        print(f"⚠️  {strategy} はスキップします: {UNSUPPORTED_STRATEGIES[strategy]}")
+    args.strategies = [s for s in args.strategies if s not in UNSUPPORTED_STRATEGIES]
+    if not args.strategies:
+        return
+
+    if not login():
+        return
+
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{args.dashboard}/charts")
+    response.raise_for_status()
+    source_ids = [chart["id"] for chart in response.json()["result"]]
+    time_ranges = dashboard_time_ranges(args.dashboard, source_ids)
+
+    targets = {}
+    for strategy in args.strategies:
+        print(f"🏗️  {strategy}: Dashboard を準備中...")
+        dashboard_id, uuid, mapping = provision(strategy, source_ids)
+        charts = {}
+        for source_id, clone_id in mapping.items():
+            column, time_range = time_ranges.get(source_id, (None, NO_FILTER))
+            chart = load_chart(clone_id, column, dashboard_id=dashboard_id)
+            chart["time_range"] = time_range
+            charts[source_id] = chart
+        tokens = {d: strategy_token(strategy, d, user, uuid) for d, user, _ in DEPARTMENTS}
+        targets[strategy] = {
+            "dashboard_id": dashboard_id,
+            "charts": charts,
+            "tokens": tokens,
+            "guests": {d: guest_session(token) for d, token in tokens.items()},
+        }
+        print(f"  ✅ Dashboard ID: {dashboard_id} / チャート {len(charts)}件")
+    print()
+
+    print(f"🚀 {len(DEPARTMENTS)}部署 × {args.iterations}回 × 方式 {len(targets)}件 を実行中...")
+    results = run_load(targets, args.iterations, args.workers)
+    print()
+
+    # rls の1回目の結果を正解とする
+    baseline = {(d, s): _fingerprint(data) for strategy, d, s, i, seconds, _, data in results
+                if strategy == "rls" and i == 0 and seconds is not None}
+
+    print(f"{'方式':<12} {'未キャッシュp50':>9} {'キャッシュp50':>13} {'p95':>9} {'ヒット率':>8} {'トークン':>9} {'一致':>8} {'エラー':>6}")
+    print("-" * 84)
+    for strategy, target in targets.items():
+        rows = [r for r in results if r[0] == strategy]
+        ok = [r for r in rows if r[4] is not None]
+        # レイテンシは実際にキャッシュを使ったかで分ける（ヒット率は force しない2回目以降で求める）
+        cold = [r[4] for r in ok if not r[5]]
+        warm = [r[4] for r in ok if r[5]]
+        repeated = [r for r in ok if r[3] > 0]
+        hit_rate = sum(r[5] for r in repeated) / len(repeated) if repeated else 0
+        token_size = statistics.mean(len(t.encode()) for t in target["tokens"].values())
+        first = [r for r in ok if r[3] == 0 and (r[1], r[2]) in baseline]
+        matched = sum(_fingerprint(r[6]) == baseline[(r[1], r[2])] for r in first)
+        print(f"{strategy:<12} {_percentile(cold, 0.5) * 1000:>7.0f}ms {_percentile(warm, 0.5) * 1000:>11.0f}ms "
+              f"{_percentile(warm or cold, 0.95) * 1000:>7.0f}ms {hit_rate:>8.1%} {token_size:>7.0f}B "
+              f"{matched:>3}/{len(first):<4} {len(rows) - len(ok):>6}")
+
+    print()
+    print("🔒 安全性")
+    for strategy, target in targets.items():
+        note = SECURITY_NOTES[strategy]
+        if strategy == "url_param":
+            note += " → ❌ 別部署の値で他部署のデータを取得できました" if tamper_check(target) else " → ✅ 書き換えても結果は変わりませんでした"
+        print(f"  {strategy:<12} {note}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+埋め込み Dashboard のブラウザ性能計測（Chrome DevTools Protocol）
+
+test_angular_app.py はコンソールログを見るだけなので、チャート数が増えたときのフロントエンドの劣化が追えない。
+部署ごとに新しいブラウザコンテキストで Angular アプリ（localhost:4200）を開き、
+ホストページと Superset の iframe の両方について
+- LCP（Largest Contentful Paint）と Long Task（50ms 超）の件数・合計・Total Blocking Time
+- チャートごとの描画完了時刻（iframe のドキュメント開始から、SVG / Canvas / テーブル、または
+  「No results」などの空表示・テキストだけのチャートが描かれ読み込み表示が消えるまで）
+- CDP Performance.getMetrics（JS ヒープ、ScriptDuration、LayoutDuration、DOM ノード数など）
+を記録し、実行ごとに同じ形の JSON レポートを出力する。Chrome のトレース（DevTools の Performance で開ける）も保存する。
+
+アプリは最初の部署を自動で表示するため、それ以外の部署はタブで切り替えた時点からの値だけを記録する
+（ホストの Long Task は切り替え後のもの、CDP の *Duration は切り替え前との差分、wall_seconds はクリックから。
+ホストの LCP はクリック後は更新されないため記録しない。iframe は作り直されるのでそのまま）。
+
+LCP / Long Task / チャート描画は初期化スクリプト（PerformanceObserver と MutationObserver）で各フレームに仕込む。
+localhost:4200 と localhost:8088 は同一サイトのため、iframe も同じレンダラーで計測される。
+
+使い方:
+    python browser_metrics.py                                    # 全部署を計測して reports/browser_metrics/ に保存
+    python browser_metrics.py --department 営業部 --no-trace
+    python browser_metrics.py --baseline reports/browser_metrics/20250101T000000Z/report.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+
+from generate_guest_token import DEPARTMENTS
+from superset_client import SUPERSET_URL
+
+APP_URL = "http://localhost:4200"
+REPORT_DIR = os.path.join("reports", "browser_metrics")
+VIEWPORT = {"width": 1400, "height": 1000}
+RENDER_TIMEOUT = 60
+SETTLE_MS = 1000
+LONG_TASK_MS = 50
+REGRESSION_RATIO = 0.2
+
+CDP_METRICS = ("JSHeapUsedSize", "JSHeapTotalSize", "ScriptDuration", "LayoutDuration",
+               "RecalcStyleDuration", "TaskDuration", "Nodes", "JSEventListeners", "Frames")
+
+# 累積値（部署切り替えでは切り替え前との差分を記録する）。それ以外はその時点の値
+CDP_CUMULATIVE = ("ScriptDuration", "LayoutDuration", "RecalcStyleDuration", "TaskDuration")
+
+TRACE_CATEGORIES = ["devtools.timeline", "disabled-by-default-devtools.timeline", "blink.user_timing", "loading", "v8"]
+
+# 描画済みとみなす要素（グラフ・テーブル、データなしの空表示、テキストだけのチャート）
+RENDERED_SELECTOR = ", ".join([
+    "canvas", "svg", "table",
+    ".ant-empty", "[data-test='no-results']", ".no-results", ".empty-state",
+    ".markdown-container", ".superset-legacy-chart-big-number", ".big_number", ".header-line",
+])
+EMPTY_SELECTOR = ".ant-empty, [data-test='no-results'], .no-results, .empty-state"
+
+# 各フレームで実行: LCP / Long Task / チャートの描画完了を window.__perf に記録
+PERF_INIT_SCRIPT = """
+((selectors) => {
+  if (window.__perf) return;
+  const perf = window.__perf = { origin: performance.timeOrigin, lcp: null, longTasks: [], charts: {} };
+  const now = () => performance.timeOrigin + performance.now();
+  try {
+    new PerformanceObserver((list) => {
+      const entries = list.getEntries();
+      const last = entries[entries.length - 1];
+      perf.lcp = { time: last.startTime, size: last.size, element: last.element ? last.element.tagName : null };
+    }).observe({ type: 'largest-contentful-paint', buffered: true });
+    new PerformanceObserver((list) => {
+      for (const entry of list.getEntries()) perf.longTasks.push({ start: entry.startTime, duration: entry.duration });
+    }).observe({ type: 'longtask', buffered: true });
+  } catch (e) {}
+
+  const scan = () => {
+    document.querySelectorAll('[data-test-chart-id]').forEach((el) => {
+      const id = el.getAttribute('data-test-chart-id');
+      const chart = perf.charts[id] = perf.charts[id] || {
+        id: Number(id),
+        name: el.getAttribute('data-test-chart-name'),
+        viz_type: el.getAttribute('data-test-viz-type'),
+        seen: now(),
+        rendered: null,
+        empty: false,
+      };
+      if (chart.rendered) return;
+      const body = el.querySelector('.chart-container') || el;
+      if (body.querySelector('.loading')) return;
+      const noData = /no results|no data/i.test(body.textContent || '');
+      if (body.querySelector(selectors.rendered) || noData) {
+        chart.rendered = now();
+        chart.empty = noData || !!body.querySelector(selectors.empty);
+      }
+    });
+  };
+  let scheduled = false;
+  new MutationObserver(() => {
+    if (scheduled) return;
+    scheduled = true;
+    requestAnimationFrame(() => { scheduled = false; scan(); });
+  }).observe(document, { childList: true, subtree: true });
+})(%s);
+""" % json.dumps({"rendered": RENDERED_SELECTOR, "empty": EMPTY_SELECTOR})
+
+def summarize_frame(perf, since=None):
+    """
+    フレームの LCP / Long Task の集計
+
+    since: 部署を切り替えた時刻（performance.now()）。指定時はそれ以降の Long Task だけを数え、LCP は記録しない
+    """
+    if not perf:
+        return None
+    durations = [task["duration"] for task in perf["longTasks"] if since is None or task["start"] >= since]
+    lcp = perf["lcp"] if since is None else None
+    return {
+        "lcp_ms": round(lcp["time"], 1) if lcp else None,
+        "lcp_element": lcp["element"] if lcp else None,
+        "long_tasks": len(durations),
+        "long_task_ms": round(sum(durations), 1),
+        "total_blocking_time_ms": round(sum(max(0, d - LONG_TASK_MS) for d in durations), 1),
+    }
+
+def summarize_charts(perf):
+    """チャートごとの描画完了時刻（iframe のドキュメント開始からの ms）"""
+    if not perf:
+        return []
+    charts = []
+    for chart in sorted(perf["charts"].values(), key=lambda c: c["id"]):
+        rendered = round(chart["rendered"] - perf["origin"], 1) if chart["rendered"] else None
+        charts.append({"id": chart["id"], "name": chart["name"], "viz_type": chart["viz_type"], "rendered_ms": rendered,
+                       "empty": chart.get("empty", False)})
+    return charts
+
+async def cdp_metrics(cdp):
+    return {m["name"]: m["value"] for m in (await cdp.send("Performance.getMetrics"))["metrics"]}
+
+def embedded_frame(page):
+    return next((f for f in page.frames if f.url.startswith(f"{SUPERSET_URL}/embedded/")), None)
+
+async def wait_for_charts(page, timeout, previous=None):
+    """
+    埋め込み Dashboard の全チャートが描画されるまで待つ（タイムアウト時は途中経過のまま）
+
+    previous: 部署切り替え前の iframe（新しい iframe に入れ替わるまでは待つ）
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        frame = embedded_frame(page)
+        if frame and frame is not previous:
+            try:
+                charts = await frame.evaluate("window.__perf ? Object.values(window.__perf.charts) : []")
+            except Exception:
+                charts = []  # 再埋め込みでフレームが入れ替わった
+            if charts and all(c["rendered"] for c in charts):
+                return True
+        await page.wait_for_timeout(250)
+    return False
+
+async def measure_department(browser, department_name, first, trace_path):
+    """1部署分の計測"""
+    context = await browser.new_context(viewport=VIEWPORT)
+    await context.add_init_script(PERF_INIT_SCRIPT)
+    page = await context.new_page()
+    cdp = await context.new_cdp_session(page)
+    await cdp.send("Performance.enable", {"timeDomain": "timeTicks"})
+    tracing = False
+    try:
+        # トレースも切り替え時点から記録する
+        if trace_path and first:
+            await browser.start_tracing(page=page, path=trace_path, screenshots=True, categories=TRACE_CATEGORIES)
+            tracing = True
+        started = time.perf_counter()
+        await page.goto(APP_URL, wait_until="networkidle", timeout=60000)
+        # アプリは最初の部署を自動で表示するため、それ以外は表示が終わってからタブで切り替え、
+        # 切り替え時点からの値だけを記録する
+        previous = switched_at = None
+        before = {}
+        if not first:
+            await wait_for_charts(page, RENDER_TIMEOUT)
+            await page.wait_for_timeout(SETTLE_MS)
+            previous = embedded_frame(page)
+            if trace_path:
+                await browser.start_tracing(page=page, path=trace_path, screenshots=True, categories=TRACE_CATEGORIES)
+                tracing = True
+            before = await cdp_metrics(cdp)
+            switched_at = await page.evaluate("performance.now()")
+            started = time.perf_counter()
+            await page.click(f'button:has-text("{department_name}")')
+        completed = await wait_for_charts(page, RENDER_TIMEOUT, previous)
+        await page.wait_for_timeout(SETTLE_MS)
+        wall_seconds = time.perf_counter() - started
+
+        host = await page.evaluate("window.__perf")
+        frame = embedded_frame(page)
+        embedded = await frame.evaluate("window.__perf") if frame else None
+        metrics = await cdp_metrics(cdp)
+        for name in CDP_CUMULATIVE:
+            if name in metrics and name in before:
+                metrics[name] -= before[name]
+    finally:
+        if tracing:
+            await browser.stop_tracing()
+        await context.close()
+
+    charts = summarize_charts(embedded)
+    rendered = [c["rendered_ms"] for c in charts if c["rendered_ms"] is not None]
+    return {
+        "scope": "initial" if first else "switch",
+        "wall_seconds": round(wall_seconds, 2),
+        "all_charts_rendered": completed,
+        "host": summarize_frame(host, switched_at),
+        "embedded": summarize_frame(embedded),
+        "chart_count": len(charts),
+        "empty_charts": sum(c["empty"] for c in charts),
+        "last_chart_rendered_ms": max(rendered) if rendered else None,
+        "charts": charts,
+        "cdp": {name: metrics.get(name) for name in CDP_METRICS},
+        "trace": trace_path,
+    }
+
+async def measure(department_names, run_dir, trace):
+    """部署ごとに順番に計測（並列にすると互いの CPU 負荷が Long Task に混ざるため）"""
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        raise RuntimeError("計測には playwright が必要です (pip install playwright && playwright install chromium)") from None
+
+    first_department = DEPARTMENTS[0][2]
+    results = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            for name in department_names:
+                trace_path = os.path.join(run_dir, f"trace-{name}.json") if trace else None
+                print(f"⏱️  {name} を計測中...")
+                results[name] = await measure_department(browser, name, name == first_department, trace_path)
+        finally:
+            await browser.close()
+    return results
+
+def comparable_values(result):
+    """前回レポートとの比較に使う値（小さいほど良い）"""
+    values = {"last_chart_rendered_ms": result["last_chart_rendered_ms"], "js_heap_used": result["cdp"]["JSHeapUsedSize"]}
+    for scope in ("host", "embedded"):
+        if result[scope]:
+            values[f"{scope}.lcp_ms"] = result[scope]["lcp_ms"]
+            values[f"{scope}.total_blocking_time_ms"] = result[scope]["total_blocking_time_ms"]
+    return values
+
+def print_result(name, result):
+    embedded = result["embedded"] or {}
+    heap = (result["cdp"]["JSHeapUsedSize"] or 0) / 1024 / 1024
+    mark = "✅" if result["all_charts_rendered"] else "⚠️ "
+    scope = " (タブ切り替え)" if result.get("scope") == "switch" else ""
+    print(f"{mark} {name}{scope}: チャート {result['chart_count']}件 (空 {result.get('empty_charts', 0)}件) / "
+          f"最後の描画 {result['last_chart_rendered_ms']}ms / "
+          f"LCP {embedded.get('lcp_ms')}ms / TBT {embedded.get('total_blocking_time_ms')}ms / ヒープ {heap:.1f}MB")
+    for chart in sorted(result["charts"], key=lambda c: c["rendered_ms"] or float("inf"), reverse=True)[:5]:
+        rendered = f"{chart['rendered_ms']}ms" if chart["rendered_ms"] is not None else "未描画"
+        if chart.get("empty"):
+            rendered += " (データなし)"
+        print(f"    {chart['name']} ({chart['viz_type']}): {rendered}")
+
+def print_comparison(results, baseline):
+    print()
+    print(f"📈 前回との比較 ({baseline['run_at']})")
+    for name, result in results.items():
+        previous = baseline["departments"].get(name)
+        if not previous:
+            continue
+        before = comparable_values(previous)
+        for key, value in comparable_values(result).items():
+            old = before.get(key)
+            if value is None or not old:
+                continue
+            change = (value - old) / old
+            mark = "⚠️ " if change > REGRESSION_RATIO else "  "
+            print(f"  {mark}{name} {key}: {old:,.1f} → {value:,.1f} ({change:+.0%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="埋め込み Dashboard のブラウザ性能計測")
+    parser.add_argument("--department", nargs="+", choices=[d[2] for d in DEPARTMENTS], help="部署名（省略時は全部署）")
+    parser.add_argument("--no-trace", action="store_true", help="Chrome のトレースを保存しない")
+    parser.add_argument("--baseline", help="比較する前回のレポート")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("埋め込み Dashboard のブラウザ性能計測")
+    print("=" * 60)
+
+    run_at = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    run_dir = os.path.join(REPORT_DIR, run_at)
+    os.makedirs(run_dir, exist_ok=True)
+
+    department_names = args.department or [d[2] for d in DEPARTMENTS]
+    results = asyncio.run(measure(department_names, run_dir, not args.no_trace))
+
+    print()
+    for name, result in results.items():
+        print_result(name, result)
+
+    report_path = os.path.join(run_dir, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"run_at": run_at, "url": APP_URL, "viewport": VIEWPORT, "departments": results},
+                  f, ensure_ascii=False, indent=2)
+    print()
+    print(f"💾 {report_path} に保存しました")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
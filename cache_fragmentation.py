@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+クエリキャッシュの分断分析
+
+Superset のチャートデータのキャッシュキーには、クエリ内容（カラム・メトリック・フィルター・解決済みの期間）に加えて
+- Guest Token の RLS 句（部署ごとに異なる）
+- Dataset SQL の Jinja が参照したユーザー固有の値（current_username() / extra_json など）
+- url_param() の値
+が含まれるため、同じチャートでもテナント・ユーザーごとに別のキャッシュエントリになる。
+
+(チャート, 部署, フィルター状態) の全組み合わせについてキャッシュキーの入力を導出し、
+ワーキングセットのサイズと想定ヒット率を見積もって、共有化の余地があるチャートを示す。
+
+使い方:
+    python cache_fragmentation.py
+    python cache_fragmentation.py --views 500 --users-per-department 20 --measure
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+
+import requests
+
+from superset_client import login, guest_session, session, SUPERSET_URL
+from dataset_sql import guest_rls_clauses, is_templated
+from generate_guest_token import DEPARTMENTS, DASHBOARD_ID, generate_guest_token
+from chart_data import NO_FILTER, load_chart, get_dataset, chart_query_context, dashboard_time_ranges, fetch_chart_data
+from time_range import resolve
+
+DEFAULT_FILTER_STATES = [NO_FILTER, "Last 7 days", "Last 30 days", "previous calendar month"]
+DEFAULT_ENTRY_BYTES = 20000
+TENANT_COLUMN = "department_id"
+
+# Jinja のうちキャッシュキーに値が入るもの（スコープ: user = ユーザーごと, url = URL パラメータごと）
+JINJA_CACHE_INPUTS = [
+    (re.compile(r"current_username\s*\("), "user", "current_username()"),
+    (re.compile(r"current_user_id\s*\("), "user", "current_user_id()"),
+    (re.compile(r"current_user_email\s*\("), "user", "current_user_email()"),
+    (re.compile(r"extra_json"), "user", "extra_json"),
+    (re.compile(r"url_param\s*\("), "url", "url_param()"),
+]
+
+def jinja_inputs(sql):
+    """Dataset SQL の Jinja がキャッシュキーに加える値の種類"""
+    if not is_templated(sql):
+        return []
+    return [(scope, name) for pattern, scope, name in JINJA_CACHE_INPUTS if pattern.search(sql)]
+
+def cache_key(chart, rls, extra_cache_keys, filter_state):
+    """
+    Superset と同じ要素からキャッシュキーを導出
+
+    期間は解決済みの日付がキーに入るため、相対期間（Last 30 days など）のキーは毎日 0時に切り替わる
+    """
+    query = chart_query_context(chart, filter_state)["queries"][0]
+    query = {**query, "filters": [f for f in query["filters"] if f["op"] != "TEMPORAL_RANGE"]}
+    inputs = {
+        "datasource": f"{chart['datasource_id']}__table",
+        "query": query,
+        "time_range": [str(bound) for bound in resolve(filter_state)],
+        "rls": rls,
+        "extra_cache_keys": extra_cache_keys,
+    }
+    return hashlib.md5(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def hit_rate(request_rates):
+    """
+    各キーへのキャッシュ有効期間内の平均リクエスト数から想定ヒット率を計算
+
+    リクエストをポアソン到着とみなし、期間内で最初の1回だけがミスになるとする
+    """
+    total = sum(request_rates)
+    if not total:
+        return 0.0
+    misses = sum(1 - math.exp(-rate) for rate in request_rates)
+    return 1 - misses / total
+
+def analyze(chart, filter_states, state_weights, views, users_per_department, strategy):
+    """
+    1チャート分のキー数・ヒット率
+
+    strategy:
+        current: 現状（部署ごとの RLS・Jinja のユーザー固有値を含む）
+        shared: テナント共通のキー（Dataset に部署カラムがなければ RLS を外す / Jinja を RLS に置き換え）
+    """
+    jinja = jinja_inputs(chart["sql"])
+    per_user = strategy == "current" and any(scope == "user" for scope, _ in jinja)
+    needs_rls = chart["has_tenant_column"] or strategy == "current"
+
+    keys = {}
+    for department_id, _, _ in DEPARTMENTS:
+        rls = guest_rls_clauses(department_id) if needs_rls else []
+        users = range(users_per_department) if per_user else [None]
+        for user in users:
+            extra = [f"{department_id}-{user}"] if user is not None else []
+            for filter_state, weight in zip(filter_states, state_weights):
+                key = cache_key(chart, rls, extra, filter_state)
+                rate = views / len(DEPARTMENTS) / len(users) * weight
+                keys[key] = keys.get(key, 0) + rate
+    return len(keys), hit_rate(list(keys.values()))
+
+def recommendations(chart):
+    found = []
+    jinja = jinja_inputs(chart["sql"])
+    for scope, name in jinja:
+        if scope == "user":
+            found.append(f"Jinja の {name} でキーがユーザー単位に分かれる → RLS（部署単位）に置き換え")
+        elif scope == "url":
+            found.append(f"Jinja の {name} でキーが URL パラメータごとに分かれる → Native Filter に置き換え")
+    if not chart["has_tenant_column"]:
+        found.append(f"Dataset に {TENANT_COLUMN} がないのに RLS 句がキーに入る → RLS ルールの対象 Dataset を限定して全部署で共有")
+    if any(f != NO_FILTER for f in chart["filter_states"]):
+        found.append("相対期間は解決済みの日付がキーに入り毎日切り替わる → キャッシュ有効期限は 1日以内で十分")
+    return found
+
+def measure_entry_bytes(chart, guest, filter_state):
+    """
+    実際の応答サイズ（キャッシュエントリの大きさの目安）
+
+    Returns:
+        tuple: (バイト数, エラー)。取得に失敗した場合は (DEFAULT_ENTRY_BYTES, エラーメッセージ)
+    """
+    try:
+        result = fetch_chart_data(chart_query_context(chart, filter_state), http_session=guest)[0]
+    except requests.RequestException as e:
+        return DEFAULT_ENTRY_BYTES, str(e)
+    return len(json.dumps(result.get("data", []), ensure_ascii=False).encode()), None
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:,.0f}{unit}"
+        size /= 1024
+    return f"{size:,.1f}TB"
+
+def main():
+    parser = argparse.ArgumentParser(description="クエリキャッシュの分断分析")
+    parser.add_argument("--dashboard", default=DASHBOARD_ID)
+    parser.add_argument("--filter-states", nargs="+", default=DEFAULT_FILTER_STATES, help="想定する期間フィルターの状態")
+    parser.add_argument("--default-share", type=float, default=0.7, help="既定の期間フィルターのまま閲覧される割合")
+    parser.add_argument("--views", type=float, default=100, help="キャッシュ有効期間内の Dashboard 閲覧数")
+    parser.add_argument("--users-per-department", type=int, default=10)
+    parser.add_argument("--measure", action="store_true", help="Chart Data API で実際のエントリサイズを計測")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("クエリキャッシュの分断分析")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{args.dashboard}/charts")
+    response.raise_for_status()
+    time_ranges = dashboard_time_ranges(args.dashboard, [item["id"] for item in response.json()["result"]])
+
+    guest = None
+    if args.measure:
+        department_id, user_name, _ = DEPARTMENTS[0]
+        guest = guest_session(generate_guest_token(department_id, user_name)[0])
+
+    print(f"閲覧数 {args.views:g}/有効期間, 部署 {len(DEPARTMENTS)}, 部署あたりユーザー {args.users_per_department}")
+    print()
+    print(f"{'チャート':<32} {'キー数':>8} {'ワーキングセット':>14} {'ヒット率':>8} {'共有時キー':>10} {'共有時ヒット率':>14}")
+    print("-" * 96)
+
+    total_bytes = shared_bytes = 0
+    estimated = 0
+    advice = {}
+    for item in response.json()["result"]:
+        column, default_state = time_ranges.get(item["id"], (None, NO_FILTER))
+        chart = load_chart(item["id"], column, dashboard_id=args.dashboard)
+        columns = {c["column_name"] for c in get_dataset(chart["datasource_id"]).get("columns", [])}
+        chart["has_tenant_column"] = TENANT_COLUMN in columns
+
+        # 既定の状態に default_share、残りを他の状態で等分
+        others = [s for s in args.filter_states if s != default_state]
+        chart["filter_states"] = [default_state] + others
+        weights = [args.default_share] + [(1 - args.default_share) / len(others)] * len(others) if others else [1.0]
+
+        entry_bytes, error = measure_entry_bytes(chart, guest, default_state) if guest else (DEFAULT_ENTRY_BYTES, None)
+        if error:
+            print(f"⚠️  {chart['name']}: エントリサイズを計測できませんでした: {error}")
+        # 計測していないサイズ（既定値）には * を付ける
+        mark = " " if guest and not error else "*"
+        estimated += mark == "*"
+        keys, rate = analyze(chart, chart["filter_states"], weights, args.views, args.users_per_department, "current")
+        keys_shared, rate_shared = analyze(chart, chart["filter_states"], weights, args.views, args.users_per_department, "shared")
+        total_bytes += keys * entry_bytes
+        shared_bytes += keys_shared * entry_bytes
+
+        print(f"{chart['name']:<32} {keys:>8,} {_format_bytes(keys * entry_bytes):>13}{mark} {rate:>8.1%} "
+              f"{keys_shared:>10,} {rate_shared:>14.1%}")
+        advice[chart["name"]] = recommendations(chart)
+
+    print()
+    print(f"📦 ワーキングセット合計: {_format_bytes(total_bytes)} (共有化した場合 {_format_bytes(shared_bytes)})")
+    if estimated:
+        print(f"   * {estimated}チャートはエントリサイズを計測していない推定値 ({_format_bytes(DEFAULT_ENTRY_BYTES)}/エントリ) です"
+              + ("" if guest else "（--measure で計測）"))
+    print()
+    print("💡 推奨")
+    for name, found in advice.items():
+        for item in found:
+            print(f"  {name}: {item}")
+
+if __name__ == "__main__":
+    main()
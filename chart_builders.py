@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Chart / Dashboard 定義ビルダー
+
+円グラフ・テーブル・棒グラフの params、position_json のノード、Native Filter を
+型付きクラスで組み立てる。生成時に値を検証するため、不正な params は API を呼ぶ前に検出できる。
+
+- __slots__ でインスタンスあたりのメモリを抑える（テナント数分の大量生成を想定）
+- 各チャートの固定値部分は JSON 文字列化した結果をキャッシュし、可変部分だけを毎回エンコードする
+"""
+
+import json
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+ROW_LIMIT_MAX = 100000
+AGGREGATES = ("SUM", "AVG", "MIN", "MAX", "COUNT", "COUNT_DISTINCT")
+# options で上書きさせないフィールド（payload の viz_type / datasource_id と食い違うため）
+RESERVED_OPTIONS = ("datasource", "viz_type")
+
+# 区切り文字を詰めた高速エンコーダ（json.dumps はキーワード引数ごとにエンコーダを生成するため再利用）
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+def _require(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+def _require_columns(value, field):
+    _require(
+        isinstance(value, (list, tuple)) and all(isinstance(c, str) and c for c in value),
+        f"{field} はカラム名(文字列)のリストで指定してください: {value!r}",
+    )
+    return list(value)
+
+def _validate_metric(metric):
+    """保存済みメトリック名（"count" など）または SIMPLE/SQL の adhoc メトリックを検証"""
+    if isinstance(metric, str):
+        _require(metric, "metric が空です")
+        return metric
+
+    _require(isinstance(metric, dict), f"metric は文字列か dict で指定してください: {metric!r}")
+    expression_type = metric.get("expressionType")
+    if expression_type == "SIMPLE":
+        _require(metric.get("aggregate") in AGGREGATES, f"未対応の集計関数です: {metric.get('aggregate')!r}")
+        _require(metric.get("column", {}).get("column_name"), "SIMPLE メトリックには column.column_name が必要です")
+    elif expression_type == "SQL":
+        _require(metric.get("sqlExpression"), "SQL メトリックには sqlExpression が必要です")
+    else:
+        raise ValueError(f"未対応の expressionType です: {expression_type!r}")
+    _require(metric.get("label"), "adhoc メトリックには label が必要です")
+    return metric
+
+def simple_metric(column_name, aggregate="SUM", column_type="NUMERIC"):
+    """SIMPLE 形式の adhoc メトリックを生成（例: SUM(amount)）"""
+    return _validate_metric({
+        "expressionType": "SIMPLE",
+        "column": {"column_name": column_name, "type": column_type},
+        "aggregate": aggregate,
+        "label": f"{aggregate}({column_name})",
+    })
+
+@lru_cache(maxsize=None)
+def _constant_fragment(cls, overridden):
+    """固定値部分の JSON 断片（前後の {} を除いたもの）をキャッシュ"""
+    constants = {k: v for k, v in cls.CONSTANTS.items() if k not in overridden}
+    return _encode(constants)[1:-1]
+
+class ChartSpec(ABC):
+    """チャート定義の基底クラス"""
+
+    __slots__ = ("slice_name", "dataset_id", "adhoc_filters", "row_limit", "options")
+
+    VIZ_TYPE = None
+    CONSTANTS = {}
+
+    def __init__(self, slice_name, dataset_id, row_limit, adhoc_filters=None, **options):
+        _require(isinstance(slice_name, str) and slice_name.strip(), "slice_name が空です")
+        _require(isinstance(dataset_id, int) and dataset_id > 0, f"dataset_id が不正です: {dataset_id!r}")
+        _require(
+            isinstance(row_limit, int) and 0 < row_limit <= ROW_LIMIT_MAX,
+            f"row_limit は 1〜{ROW_LIMIT_MAX} で指定してください: {row_limit!r}",
+        )
+        _require(adhoc_filters is None or isinstance(adhoc_filters, list), "adhoc_filters はリストで指定してください")
+        reserved = sorted(set(options) & set(RESERVED_OPTIONS))
+        _require(not reserved, f"options では指定できないフィールドです: {reserved}")
+
+        self.slice_name = slice_name
+        self.dataset_id = dataset_id
+        self.row_limit = row_limit
+        self.adhoc_filters = adhoc_filters
+        self.options = options
+
+    @abstractmethod
+    def _fields(self):
+        """チャート種別ごとの可変フィールド"""
+
+    def params(self):
+        """params を dict で返す"""
+        return json.loads(self.params_json())
+
+    def params_json(self):
+        """params を JSON 文字列で返す"""
+        fields = {
+            "datasource": f"{self.dataset_id}__table",
+            "viz_type": self.VIZ_TYPE,
+            "row_limit": self.row_limit,
+        }
+        fields.update(self._fields())
+        if self.adhoc_filters is not None:
+            fields["adhoc_filters"] = self.adhoc_filters
+        fields.update(self.options)
+
+        dynamic = _encode(fields)[1:-1]
+        constant = _constant_fragment(type(self), frozenset(fields) & frozenset(self.CONSTANTS))
+        return "{" + dynamic + ("," + constant if constant else "") + "}"
+
+    def payload(self):
+        """POST /api/v1/chart/ のリクエストボディ"""
+        return {
+            "slice_name": self.slice_name,
+            "viz_type": self.VIZ_TYPE,
+            "datasource_id": self.dataset_id,
+            "datasource_type": "table",
+            "params": self.params_json(),
+        }
+
+class PieChartSpec(ChartSpec):
+    """円グラフ"""
+
+    __slots__ = ("groupby", "metric")
+
+    VIZ_TYPE = "pie"
+    CONSTANTS = {
+        "slice_id": None,
+        "adhoc_filters": [],
+        "color_scheme": "supersetColors",
+        "show_labels": True,
+        "show_legend": True,
+        "label_type": "key_value",
+        "number_format": "SMART_NUMBER",
+        "date_format": "smart_date",
+        "show_labels_threshold": 5,
+        "sort_by_metric": True,
+    }
+
+    def __init__(self, slice_name, dataset_id, groupby, metric, row_limit=10000, **kwargs):
+        super().__init__(slice_name, dataset_id, row_limit, **kwargs)
+        self.groupby = _require_columns(groupby, "groupby")
+        _require(self.groupby, "円グラフには groupby が1つ以上必要です")
+        self.metric = _validate_metric(metric)
+
+    def _fields(self):
+        return {"groupby": self.groupby, "metric": self.metric}
+
+class TableChartSpec(ChartSpec):
+    """テーブル（raw モード: all_columns / aggregate モード: groupby + metrics）"""
+
+    __slots__ = ("all_columns", "order_by_cols", "groupby", "metrics")
+
+    VIZ_TYPE = "table"
+    CONSTANTS = {
+        "slice_id": None,
+        "adhoc_filters": [],
+        "table_timestamp_format": "smart_date",
+        "show_cell_bars": True,
+        "color_pn": True,
+    }
+
+    def __init__(self, slice_name, dataset_id, all_columns=(), order_by_cols=(), groupby=(), metrics=(),
+                 row_limit=100, **kwargs):
+        super().__init__(slice_name, dataset_id, row_limit, **kwargs)
+        self.all_columns = _require_columns(all_columns, "all_columns")
+        self.groupby = _require_columns(groupby, "groupby")
+        self.metrics = [_validate_metric(m) for m in metrics]
+        _require(
+            bool(self.all_columns) != bool(self.groupby or self.metrics),
+            "all_columns (raw) と groupby/metrics (aggregate) のどちらか一方を指定してください",
+        )
+
+        order_by_cols = [list(o) for o in order_by_cols]
+        _require(
+            all(len(o) == 2 and isinstance(o[0], str) and isinstance(o[1], bool) for o in order_by_cols),
+            f"order_by_cols は [カラム名, 昇順(bool)] のリストで指定してください: {order_by_cols!r}",
+        )
+        self.order_by_cols = order_by_cols
+
+    @property
+    def query_mode(self):
+        return "raw" if self.all_columns else "aggregate"
+
+    def _fields(self):
+        if self.query_mode == "raw":
+            return {
+                "query_mode": "raw",
+                "groupby": [],
+                "all_columns": self.all_columns,
+                "order_by_cols": self.order_by_cols,
+            }
+        return {
+            "query_mode": "aggregate",
+            "groupby": self.groupby,
+            "metrics": self.metrics,
+        }
+
+class BarChartSpec(ChartSpec):
+    """棒グラフ（columns でスタック/系列分割）"""
+
+    __slots__ = ("metrics", "groupby", "columns", "viz_type")
+
+    CONSTANTS = {
+        "show_legend": True,
+    }
+
+    def __init__(self, slice_name, dataset_id, metrics, groupby, columns=(), viz_type="bar",
+                 row_limit=10000, **kwargs):
+        super().__init__(slice_name, dataset_id, row_limit, **kwargs)
+        _require(viz_type in ("bar", "dist_bar"), f"未対応の viz_type です: {viz_type!r}")
+        _require(metrics, "棒グラフには metrics が1つ以上必要です")
+        self.metrics = [_validate_metric(m) for m in metrics]
+        self.groupby = _require_columns(groupby, "groupby")
+        self.columns = _require_columns(columns, "columns")
+        self.viz_type = viz_type
+
+    @property
+    def VIZ_TYPE(self):
+        return self.viz_type
+
+    def _fields(self):
+        return {"metrics": self.metrics, "groupby": self.groupby, "columns": self.columns}
+
+# =====================================================
+# Dashboard レイアウト (position_json)
+# =====================================================
+
+GRID_COLUMNS = 12
+
+class ChartNode:
+    """position_json の CHART ノード"""
+
+    __slots__ = ("chart_id", "slice_name", "width", "height", "node_id")
+
+    def __init__(self, chart_id, slice_name=None, width=6, height=50, node_id=None):
+        _require(isinstance(chart_id, int) and chart_id > 0, f"chart_id が不正です: {chart_id!r}")
+        _require(isinstance(width, int) and 1 <= width <= GRID_COLUMNS, f"width は 1〜{GRID_COLUMNS} で指定してください: {width!r}")
+        _require(isinstance(height, int) and height > 0, f"height が不正です: {height!r}")
+        self.chart_id = chart_id
+        self.slice_name = slice_name
+        self.width = width
+        self.height = height
+        self.node_id = node_id or f"CHART-{chart_id}"
+
+    def to_dict(self, parent_id):
+        meta = {"width": self.width, "height": self.height, "chartId": self.chart_id}
+        if self.slice_name:
+            meta["sliceName"] = self.slice_name
+        return {"type": "CHART", "id": self.node_id, "children": [], "parents": ["ROOT_ID", "GRID_ID", parent_id], "meta": meta}
+
+class RowNode:
+    """position_json の ROW ノード"""
+
+    __slots__ = ("charts", "node_id")
+
+    def __init__(self, charts, node_id=None):
+        _require(charts, "ROW には1つ以上の CHART が必要です")
+        total = sum(c.width for c in charts)
+        _require(total <= GRID_COLUMNS, f"ROW 内の width 合計が {GRID_COLUMNS} を超えています: {total}")
+        self.charts = list(charts)
+        self.node_id = node_id
+
+def build_position_json(rows):
+    """ROW のリストから position_json (dict) を構築"""
+    position = {
+        "DASHBOARD_VERSION_KEY": "v2",
+        "ROOT_ID": {"type": "ROOT", "id": "ROOT_ID", "children": ["GRID_ID"]},
+        "GRID_ID": {"type": "GRID", "id": "GRID_ID", "children": [], "parents": ["ROOT_ID"]},
+    }
+
+    for index, row in enumerate(rows, start=1):
+        row_id = row.node_id or f"ROW-{index}"
+        _require(row_id not in position, f"ノードIDが重複しています: {row_id}")
+        position["GRID_ID"]["children"].append(row_id)
+        position[row_id] = {
+            "type": "ROW",
+            "id": row_id,
+            "children": [c.node_id for c in row.charts],
+            "parents": ["ROOT_ID", "GRID_ID"],
+            "meta": {"background": "BACKGROUND_TRANSPARENT"},
+        }
+        for chart in row.charts:
+            _require(chart.node_id not in position, f"ノードIDが重複しています: {chart.node_id}")
+            position[chart.node_id] = chart.to_dict(row_id)
+
+    return position
+
+def grid_rows(chart_nodes, per_row=2):
+    """CHART ノードを per_row 個ずつ ROW に詰める（幅は均等割り、渡されたノードは変更しない）"""
+    _require(1 <= per_row <= GRID_COLUMNS, f"per_row は 1〜{GRID_COLUMNS} で指定してください: {per_row!r}")
+    width = GRID_COLUMNS // per_row
+    rows = []
+    for i in range(0, len(chart_nodes), per_row):
+        chunk = [ChartNode(n.chart_id, n.slice_name, width, n.height, n.node_id) for n in chart_nodes[i:i + per_row]]
+        rows.append(RowNode(chunk))
+    return rows
+
+# =====================================================
+# Native Filter
+# =====================================================
+
+FILTER_TYPES = ("filter_time", "filter_select", "filter_range", "filter_timecolumn", "filter_timegrain")
+
+class NativeFilterSpec:
+    """json_metadata.native_filter_configuration の1要素"""
+
+    __slots__ = ("filter_id", "name", "filter_type", "targets", "default_value", "control_values",
+                 "cascade_parent_ids", "charts_in_scope", "tabs_in_scope", "root_path", "excluded")
+
+    CONTROL_VALUES = {
+        "enableEmptyFilter": False,
+        "defaultToFirstItem": False,
+        "multiSelect": False,
+        "searchAllOptions": False,
+        "inverseSelection": False,
+    }
+
+    def __init__(self, filter_id, name, dataset_id, column, filter_type="filter_time", default_value=None,
+                 control_values=None, cascade_parent_ids=(), charts_in_scope=None, tabs_in_scope=(), root_path=("ROOT_ID",), excluded=()):
+        _require(isinstance(filter_id, str) and filter_id.startswith("NATIVE_FILTER-"),
+                 f"filter_id は NATIVE_FILTER- で始めてください: {filter_id!r}")
+        _require(isinstance(name, str) and name.strip(), "name が空です")
+        _require(filter_type in FILTER_TYPES, f"未対応の filterType です: {filter_type!r}")
+        _require(isinstance(dataset_id, int) and dataset_id > 0, f"dataset_id が不正です: {dataset_id!r}")
+        _require(isinstance(column, str) and column, f"column が不正です: {column!r}")
+        _require(filter_id not in cascade_parent_ids, "自分自身を cascadeParentIds に含めることはできません")
+
+        self.filter_id = filter_id
+        self.name = name
+        self.filter_type = filter_type
+        self.targets = [{"datasetId": dataset_id, "column": {"name": column}}]
+        self.default_value = default_value
+        self.control_values = {**self.CONTROL_VALUES, **(control_values or {})}
+        self.cascade_parent_ids = list(cascade_parent_ids)
+        self.charts_in_scope = list(charts_in_scope) if charts_in_scope is not None else None
+        self.tabs_in_scope = list(tabs_in_scope)
+        self.root_path = list(root_path)
+        self.excluded = list(excluded)
+
+    def to_dict(self):
+        default_data_mask = {"extraFormData": {}, "filterState": {}, "ownState": {}}
+        if self.default_value is not None:
+            default_data_mask["filterState"] = {"value": self.default_value}
+
+        config = {
+            "id": self.filter_id,
+            "name": self.name,
+            "filterType": self.filter_type,
+            "type": "NATIVE_FILTER",
+            "description": "",
+            "targets": self.targets,
+            "defaultDataMask": default_data_mask,
+            "controlValues": self.control_values,
+            "cascadeParentIds": self.cascade_parent_ids,
+            "scope": {"rootPath": self.root_path, "excluded": self.excluded},
+            "tabsInScope": self.tabs_in_scope,
+            "isInstant": True,
+            "allowsMultipleValues": False,
+            "isRequired": False,
+        }
+        if self.charts_in_scope is not None:
+            config["chartsInScope"] = self.charts_in_scope
+        return config
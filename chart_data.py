@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Chart Data API (/api/v1/chart/data) 用の query_context ビルダー
+
+保存済みチャートの params から、フロントエンドが送るものと同じ query_context を組み立てて
+チャートのデータを直接取得する（画面を開かずに埋め込みユーザーと同じ結果を得るため）。
+Guest Token のユーザーは form_data の dashboardId / slice_id で Dashboard 経由のアクセスとして認可されるため、
+埋め込み Dashboard の ID を渡して読み込んだチャートはそれを付けて送る。
+
+Dashboard の全チャートを並列に取得し、dict のリスト / pandas.DataFrame / pyarrow.Table で返す
+（pandas・pyarrow は使う場合のみ必要）。
+"""
+
+import copy
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import superset_client
+from superset_client import SUPERSET_URL, STREAMING, parse_json, iter_json_items
+from dashboard_metadata import get_dashboard
+
+NO_FILTER = "No filter"
+DEFAULT_ROW_LIMIT = 10000
+
+def metric_label(metric):
+    """結果データのキーになるメトリック名"""
+    return metric if isinstance(metric, str) else metric["label"]
+
+def metric_sql(metric):
+    """メトリックを SQL の集計式に変換（直接クエリでの検算用）"""
+    if isinstance(metric, str):
+        if metric == "count":
+            return "COUNT(*)"
+        raise ValueError(f"保存済みメトリックは SQL に変換できません: {metric!r}")
+    if metric["expressionType"] == "SQL":
+        return metric["sqlExpression"]
+    column = metric["column"]["column_name"]
+    if metric["aggregate"] == "COUNT_DISTINCT":
+        return f"COUNT(DISTINCT {column})"
+    return f"{metric['aggregate']}({column})"
+
+def _order_by(value):
+    """order_by_cols の要素（'["order_date", false]' のような JSON 文字列 or リスト）を [カラム, 昇順] に変換"""
+    column, ascending = json.loads(value) if isinstance(value, str) else value
+    return [column, bool(ascending)]
+
+def chart_query(params):
+    """
+    保存済みチャートの params からクエリ部分を取り出す
+
+    viz_type ごとに params のキーが異なる
+        pie: groupby + metric（単数）。sort_by_metric でメトリック降順
+        table (raw): all_columns + order_by_cols（集計しない）
+        table (aggregate) / bar / dist_bar: groupby (+ columns) + metrics
+
+    Returns:
+        dict: groupby, columns, metrics, filters, orderby, row_limit
+    """
+    raw = params.get("query_mode") == "raw" or (params.get("all_columns") and not params.get("metrics"))
+    metrics = [] if raw else list(params.get("metrics") or [])
+    if not raw and params.get("metric"):
+        metrics.append(params["metric"])
+
+    if raw:
+        groupby, columns = [], list(params.get("all_columns") or [])
+        orderby = [_order_by(o) for o in params.get("order_by_cols") or []]
+    else:
+        groupby, columns = list(params.get("groupby") or []) + list(params.get("columns") or []), []
+        orderby = [[metrics[0], False]] if metrics and params.get("sort_by_metric") else []
+
+    filters = []
+    for adhoc in params.get("adhoc_filters") or []:
+        if adhoc.get("expressionType") == "SIMPLE" and adhoc.get("clause", "WHERE") == "WHERE":
+            filters.append({"col": adhoc["subject"], "op": adhoc["operator"], "val": adhoc.get("comparator")})
+
+    return {
+        "groupby": groupby,
+        "columns": columns,
+        "metrics": metrics,
+        "filters": filters,
+        "orderby": orderby,
+        "row_limit": params.get("row_limit") or DEFAULT_ROW_LIMIT,
+    }
+
+def build_query_context(datasource_id, groupby=(), metrics=(), filters=(), time_column=None, time_range=NO_FILTER,
+                        row_limit=DEFAULT_ROW_LIMIT, force=False, url_params=None, orderby=(), row_offset=0,
+                        dashboard_id=None, slice_id=None):
+    """
+    /api/v1/chart/data の POST ボディを組み立てる
+
+    Args:
+        datasource_id: Dataset ID
+        groupby: GROUP BY カラム（raw モードでは取得するカラム）
+        metrics: メトリック（保存済みメトリック名 or adhoc メトリック）
+        filters: {"col", "op", "val"} 形式のフィルター
+        time_column: 期間フィルター対象カラム
+        time_range: "Last 30 days" などの期間式
+        row_limit: 最大行数
+        force: キャッシュを使わずに再実行する
+        url_params: Jinja の url_param() に渡す値（埋め込み SDK の urlParams 相当）
+        orderby: [カラム or メトリック, 昇順] のリスト
+        row_offset: 先頭から読み飛ばす行数
+        dashboard_id: チャートを表示する Dashboard の ID（Guest Token での取得に必要）
+        slice_id: チャートID（Guest Token での取得に必要）
+    """
+    filters = list(filters)
+    if time_column and time_range and time_range != NO_FILTER:
+        filters.append({"col": time_column, "op": "TEMPORAL_RANGE", "val": time_range})
+
+    query_context = {
+        "datasource": {"id": datasource_id, "type": "table"},
+        "force": force,
+        "queries": [{
+            "columns": list(groupby),
+            "metrics": list(metrics),
+            "filters": filters,
+            "extras": {"having": "", "where": ""},
+            "orderby": [list(o) for o in orderby],
+            "row_limit": row_limit,
+            "row_offset": row_offset,
+        }],
+        "result_format": "json",
+        "result_type": "full",
+    }
+    form_data = {}
+    if dashboard_id is not None:
+        form_data["dashboardId"] = int(dashboard_id)
+    if slice_id is not None:
+        form_data["slice_id"] = slice_id
+    if url_params:
+        form_data["url_params"] = url_params
+    if form_data:
+        query_context["form_data"] = form_data
+    return query_context
+
+def get_chart(chart_id, http_session=None):
+    """
+    チャート詳細を取得
+
+    Returns:
+        tuple: (slice_name, viz_type, datasource_id, params)
+    """
+    chart = superset_client.get_record(f"/api/v1/chart/{chart_id}", http_session)
+    params = chart.json_field("params")
+    datasource_id = int(params["datasource"].split("__")[0])
+    return chart["slice_name"], chart["viz_type"], datasource_id, params
+
+_datasets = {}
+
+def get_dataset(dataset_id, http_session=None):
+    """Dataset 詳細を取得（同じ Dataset を参照するチャートが多いため結果を保持する）"""
+    if dataset_id not in _datasets:
+        _datasets[dataset_id] = superset_client.get_record(f"/api/v1/dataset/{dataset_id}", http_session)
+    return _datasets[dataset_id]
+
+def load_chart(chart_id, time_column=None, http_session=None, dashboard_id=None):
+    """
+    チャート定義と参照先 Dataset の SQL・期間カラムをまとめて取得
+
+    Args:
+        dashboard_id: チャートを表示する Dashboard の ID（Guest Token で取得する場合に指定）
+
+    Returns:
+        dict: id, name, viz_type, datasource_id, dashboard_id, sql, time_column, dataset_columns と chart_query() の各項目
+    """
+    slice_name, viz_type, datasource_id, params = get_chart(chart_id, http_session)
+    dataset = get_dataset(datasource_id, http_session)
+    return {
+        "id": chart_id,
+        "name": slice_name,
+        "viz_type": viz_type,
+        "datasource_id": datasource_id,
+        "dashboard_id": dashboard_id,
+        "sql": dataset.get("sql") or f"SELECT * FROM {dataset['table_name']}",
+        "time_column": time_column or params.get("granularity_sqla") or dataset.get("main_dttm_col"),
+        "dataset_columns": [c["column_name"] for c in dataset.get("columns", [])],
+        **chart_query(params),
+    }
+
+def chart_query_context(chart, time_range=NO_FILTER, force=False, url_params=None, filters=(), row_limit=None,
+                        row_offset=0):
+    """
+    load_chart の結果から query_context を組み立てる
+
+    Args:
+        filters: 追加するフィルター（Dataset にないカラムのものは無視）
+        row_limit: チャートの row_limit を上書き
+    """
+    extra = [f for f in filters if f["col"] in chart.get("dataset_columns", ())]
+    return build_query_context(
+        chart["datasource_id"], chart["groupby"] or chart["columns"], chart["metrics"], chart["filters"] + extra,
+        time_column=chart["time_column"], time_range=time_range, force=force, url_params=url_params,
+        orderby=chart["orderby"], row_limit=row_limit or chart["row_limit"], row_offset=row_offset,
+        dashboard_id=chart.get("dashboard_id"), slice_id=chart["id"],
+    )
+
+def saved_query_context(chart, time_range=NO_FILTER, force=False, http_session=None):
+    """
+    チャートに保存されている query_context（Explore で保存したときにフロントエンドが送ったもの）に
+    期間 Native Filter の値と force だけを反映する
+
+    orderby / post_processing / extras などを組み立て直さないため、Dashboard を開いたときの
+    キャッシュキーに近い。保存されていない古いチャートは chart_query_context() で組み立てる
+
+    Args:
+        chart: load_chart() の結果
+
+    Returns:
+        tuple: (query_context, 保存済みのものを使ったか)
+    """
+    record = superset_client.get_record(f"/api/v1/chart/{chart['id']}", http_session)
+    saved = record.json_field("query_context")
+    if not saved.get("queries"):
+        return chart_query_context(chart, time_range, force=force), False
+
+    query_context = copy.deepcopy(saved)
+    query_context["force"] = force
+    if time_range and time_range != NO_FILTER:
+        column = chart["time_column"]
+        for query in query_context["queries"]:
+            query["time_range"] = time_range
+            temporal = [f for f in query.setdefault("filters", []) if f.get("op") == "TEMPORAL_RANGE"
+                        and (column is None or f.get("col") == column)]
+            for flt in temporal:
+                flt["val"] = time_range
+            if not temporal and column:
+                query["filters"].append({"col": column, "op": "TEMPORAL_RANGE", "val": time_range})
+    form_data = query_context.setdefault("form_data", {})
+    form_data["slice_id"] = chart["id"]
+    if chart.get("dashboard_id") is not None:
+        form_data["dashboardId"] = int(chart["dashboard_id"])
+    return query_context, True
+
+def _filter_scope(native_filter, chart_ids, position):
+    """
+    フィルターのスコープ内のチャートID
+
+    chartsInScope がない場合（create_cross_filter_dashboard.py で作ったフィルターなど）は
+    Superset と同じく scope.rootPath 配下から scope.excluded を除いたチャートとする
+    """
+    if "chartsInScope" in native_filter:
+        return native_filter["chartsInScope"]
+    scope = native_filter.get("scope") or {}
+    root_path = scope.get("rootPath") or ["ROOT_ID"]
+    excluded = set(scope.get("excluded") or [])
+    if "ROOT_ID" in root_path or not position:
+        in_root = set(chart_ids)
+    else:
+        from native_filter_builder import DashboardLayout
+        in_root = DashboardLayout(position, {chart_id: None for chart_id in chart_ids}, {}).charts_under(root_path)
+    return sorted(in_root - excluded)
+
+def default_time_ranges(metadata, chart_ids=(), position=None):
+    """
+    Dashboard の期間 Native Filter の既定値をチャートごとに求める
+
+    Args:
+        metadata: Dashboard の json_metadata
+        chart_ids: Dashboard のチャートID（chartsInScope のないフィルターのスコープ計算用）
+        position: Dashboard の position_json（rootPath が ROOT_ID 以外の場合に使う）
+
+    Returns:
+        dict: {chart_id: (期間カラム, 期間式)}（スコープ外のチャートは含まない）
+    """
+    ranges = {}
+    for native_filter in metadata.get("native_filter_configuration", []):
+        if native_filter.get("filterType") != "filter_time":
+            continue
+        value = native_filter.get("defaultDataMask", {}).get("filterState", {}).get("value")
+        if not value:
+            continue
+        targets = native_filter.get("targets") or [{}]
+        column = targets[0].get("column", {}).get("name")
+        for chart_id in _filter_scope(native_filter, chart_ids, position):
+            ranges[chart_id] = (column, value)
+    return ranges
+
+def dashboard_time_ranges(dashboard_id, chart_ids):
+    """Dashboard を取得して default_time_ranges() を求める"""
+    dashboard = get_dashboard(dashboard_id)
+    return default_time_ranges(dashboard.json_field("json_metadata"), chart_ids, dashboard.json_field("position_json"))
+
+def fetch_chart_data(query_context, http_session=None):
+    """
+    チャートデータを取得
+
+    Returns:
+        list: クエリごとの結果（data / is_cached / rowcount など）
+    """
+    http_session = http_session or superset_client.session
+    response = http_session.post(f"{SUPERSET_URL}/api/v1/chart/data", json=query_context)
+    response.raise_for_status()
+    return parse_json(response)["result"]
+
+def iter_chart_rows(query_context, http_session=None):
+    """
+    チャートデータの行を1行ずつ返す（複数クエリの場合は順に連結）
+
+    ijson が使える場合は応答をストリーミングでパースするため、大きな結果でも全体をメモリに載せない
+    """
+    http_session = http_session or superset_client.session
+    response = http_session.post(f"{SUPERSET_URL}/api/v1/chart/data", json=query_context, stream=STREAMING)
+    try:
+        response.raise_for_status()
+        yield from iter_json_items(response, "result.item.data.item")
+    finally:
+        response.close()
+
+def to_table(result, output="records"):
+    """
+    チャートデータの結果を変換
+
+    Args:
+        output: "records"（dict のリスト）/ "pandas"（DataFrame）/ "arrow"（pyarrow.Table）
+    """
+    data = result.get("data", [])
+    columns = result.get("colnames") or (list(data[0]) if data else [])
+    if output == "records":
+        return data
+    if output == "pandas":
+        try:
+            import pandas as pd
+        except ImportError:
+            raise RuntimeError("pandas がインストールされていません (pip install pandas)") from None
+        return pd.DataFrame.from_records(data, columns=columns)
+    if output == "arrow":
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise RuntimeError("pyarrow がインストールされていません (pip install pyarrow)") from None
+        return pa.Table.from_pylist(data) if data else pa.table({c: [] for c in columns})
+    raise ValueError(f"未対応の出力形式です: {output!r}")
+
+def dashboard_chart_ids(dashboard_id, http_session=None):
+    """Dashboard に含まれるチャートID"""
+    http_session = http_session or superset_client.session
+    response = http_session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/charts")
+    response.raise_for_status()
+    return [chart["id"] for chart in response.json()["result"]]
+
+def fetch_dashboard_data(dashboard_id, guest_token=None, time_range=None, filters=(), output="records", workers=4):
+    """
+    Dashboard の全チャートのデータを並列取得
+
+    チャート定義は管理者セッションで読み、データは guest_token 指定時は Guest ユーザー（RLS 適用）として取得する
+
+    Args:
+        dashboard_id: Dashboard ID
+        guest_token: Guest Token（省略時は管理者セッション）
+        time_range: 期間の上書き（省略時は期間 Native Filter の既定値）
+        filters: 追加フィルター {"col", "op", "val"}（そのカラムを持つチャートにだけ適用）
+        output: to_table() の出力形式
+        workers: 同時リクエスト数
+
+    Returns:
+        dict: {chart_id: {"chart", "data", "rowcount", "is_cached", "seconds", "error"}}
+    """
+    chart_ids = dashboard_chart_ids(dashboard_id)
+    time_ranges = dashboard_time_ranges(dashboard_id, chart_ids)
+    charts = []
+    for chart_id in chart_ids:
+        column, default_range = time_ranges.get(chart_id, (None, NO_FILTER))
+        chart = load_chart(chart_id, column, dashboard_id=dashboard_id)
+        chart["time_range"] = time_range or default_range
+        charts.append(chart)
+
+    http_session = superset_client.guest_session(guest_token) if guest_token else superset_client.session
+
+    def fetch(chart):
+        started = time.perf_counter()
+        try:
+            result = fetch_chart_data(chart_query_context(chart, chart["time_range"], filters=filters), http_session)[0]
+        except Exception as e:
+            return chart["id"], {"chart": chart, "data": None, "rowcount": 0, "is_cached": None,
+                                 "seconds": time.perf_counter() - started, "error": str(e)}
+        return chart["id"], {
+            "chart": chart,
+            "data": to_table(result, output),
+            "rowcount": result.get("rowcount", 0),
+            "is_cached": result.get("is_cached"),
+            "seconds": time.perf_counter() - started,
+            "error": None,
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(fetch, charts))
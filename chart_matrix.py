@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Chart マトリクス一括生成スクリプト
+
+Dataset に対して metrics × groupby × viz_type (× 部署) の全組み合わせの Chart 定義を展開し、
+並列・バッチで作成する。--dashboard-title を指定すると新規 Dashboard を作成して自動レイアウトで配置する。
+
+使い方:
+    python chart_matrix.py --dataset-id 29 --metrics count "SUM(success_count)" \\
+        --groupby status product_name --viz pie bar table \\
+        --departments 101 102 103 --dashboard-title "不具合分析マトリクス"
+"""
+
+import argparse
+import itertools
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from superset_client import SUPERSET_URL, session, login, configure_pool
+from dashboard_metadata import patch_dashboard_metadata
+from chart_builders import (
+    PieChartSpec, TableChartSpec, BarChartSpec, ChartNode,
+    simple_metric, build_position_json, grid_rows,
+)
+
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH_SIZE = 20
+
+METRIC_PATTERN = re.compile(r"^(SUM|AVG|MIN|MAX|COUNT|COUNT_DISTINCT)\((\w+)\)$", re.IGNORECASE)
+
+def parse_metric(text):
+    """'count' などの保存済みメトリック名、または 'SUM(amount)' 形式を解釈"""
+    match = METRIC_PATTERN.match(text)
+    if match:
+        return simple_metric(match.group(2), match.group(1).upper())
+    return text
+
+def metric_label(metric):
+    return metric if isinstance(metric, str) else metric["label"]
+
+def department_filter(department_id):
+    """部署で絞り込む adhoc filter"""
+    return {
+        "expressionType": "SIMPLE",
+        "subject": "department_id",
+        "operator": "==",
+        "comparator": department_id,
+        "clause": "WHERE",
+    }
+
+def build_spec(viz, dataset_id, metric, groupby, department_id):
+    """1組み合わせ分の Chart 定義を生成"""
+    name = f"{metric_label(metric)} × {groupby} [{viz}]"
+    kwargs = {}
+    if department_id is not None:
+        name += f" / 部署{department_id}"
+        kwargs["adhoc_filters"] = [department_filter(department_id)]
+
+    if viz == "pie":
+        return PieChartSpec(name, dataset_id, groupby=[groupby], metric=metric, **kwargs)
+    if viz == "table":
+        return TableChartSpec(name, dataset_id, groupby=[groupby], metrics=[metric], **kwargs)
+    if viz in ("bar", "dist_bar"):
+        return BarChartSpec(name, dataset_id, metrics=[metric], groupby=[groupby], viz_type=viz, **kwargs)
+    raise ValueError(f"未対応の viz_type です: {viz!r}")
+
+def expand_matrix(dataset_id, metrics, groupbys, viz_types, departments):
+    """全組み合わせを展開（API呼び出し前に全件検証される）"""
+    return [
+        build_spec(viz, dataset_id, metric, groupby, department_id)
+        for viz, metric, groupby, department_id in itertools.product(
+            viz_types, metrics, groupbys, departments or [None]
+        )
+    ]
+
+def create_chart(spec, dashboard_id):
+    """Chart を1件作成して ID を返す"""
+    payload = spec.payload()
+    if dashboard_id:
+        payload["dashboards"] = [dashboard_id]
+
+    response = session.post(f"{SUPERSET_URL}/api/v1/chart/", json=payload)
+    if response.status_code != 201:
+        raise RuntimeError(f"{response.status_code} - {response.text}")
+    return response.json()["id"]
+
+def create_charts(specs, dashboard_id, workers, batch_size):
+    """
+    バッチ単位で並列作成
+
+    Returns:
+        list: (spec, chart_id または None) のリスト（入力順）
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(specs), batch_size):
+            batch = specs[start:start + batch_size]
+            futures = [executor.submit(create_chart, spec, dashboard_id) for spec in batch]
+            for spec, future in zip(batch, futures):
+                try:
+                    results.append((spec, future.result()))
+                except Exception as e:
+                    print(f"  ❌ {spec.slice_name}: {e}")
+                    results.append((spec, None))
+            done = sum(1 for _, chart_id in results if chart_id)
+            print(f"  📈 {min(start + batch_size, len(specs))}/{len(specs)} 件処理 (成功 {done}件)")
+    return results
+
+def create_dashboard(title):
+    """空の Dashboard を作成"""
+    response = session.post(
+        f"{SUPERSET_URL}/api/v1/dashboard/",
+        json={"dashboard_title": title, "published": True},
+    )
+    if response.status_code != 201:
+        raise RuntimeError(f"Dashboard作成失敗: {response.status_code} - {response.text}")
+    return response.json()["id"]
+
+def layout_dashboard(dashboard_id, created, per_row):
+    """作成した Chart をグリッド状に配置"""
+    nodes = [ChartNode(chart_id, spec.slice_name) for spec, chart_id in created if chart_id]
+    position_json = build_position_json(grid_rows(nodes, per_row))
+    # json_metadata を丸ごと置き換えず、他の設定や同時更新を残してマージする
+    patch_dashboard_metadata(dashboard_id, metadata_patch={"cross_filters_enabled": True}, position_json=position_json)
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart マトリクス一括生成")
+    parser.add_argument("--dataset-id", type=int, required=True)
+    parser.add_argument("--metrics", nargs="+", required=True, help="count / SUM(amount) など")
+    parser.add_argument("--groupby", nargs="+", required=True)
+    parser.add_argument("--viz", nargs="+", default=["pie", "bar", "table"])
+    parser.add_argument("--departments", type=int, nargs="*", help="部署IDごとに adhoc filter 付きで展開")
+    parser.add_argument("--dashboard-title", help="指定すると新規Dashboardに配置")
+    parser.add_argument("--per-row", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Chart マトリクス一括生成")
+    print("=" * 60)
+    print()
+
+    try:
+        specs = expand_matrix(
+            args.dataset_id,
+            [parse_metric(m) for m in args.metrics],
+            args.groupby,
+            args.viz,
+            args.departments,
+        )
+    except ValueError as e:
+        print(f"❌ Chart定義が不正です: {e}")
+        return
+
+    print(f"🧮 {len(specs)}件の Chart 定義を展開しました")
+
+    if not login():
+        return
+
+    configure_pool(args.workers)
+    started = time.perf_counter()
+
+    dashboard_id = None
+    if args.dashboard_title:
+        dashboard_id = create_dashboard(args.dashboard_title)
+        print(f"✅ Dashboard作成成功 (ID: {dashboard_id})")
+
+    created = create_charts(specs, dashboard_id, args.workers, args.batch_size)
+    succeeded = sum(1 for _, chart_id in created if chart_id)
+
+    if dashboard_id and succeeded:
+        layout_dashboard(dashboard_id, created, args.per_row)
+        print("✅ Dashboardレイアウト設定成功")
+
+    elapsed = time.perf_counter() - started
+    print()
+    print(f"結果: 作成 {succeeded}件 / 失敗 {len(specs) - succeeded}件 ({elapsed:.1f}秒)")
+    if dashboard_id:
+        print(f"📊 Dashboard URL:")
+        print(f"   {SUPERSET_URL}/superset/dashboard/{dashboard_id}/")
+
+if __name__ == "__main__":
+    main()
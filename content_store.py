@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+コンテンツアドレス方式のローカルストア
+
+ファイル内容の SHA-256 をキーとして保存するため、同じ内容は一度しか書き込まれない
+（バックアップやサムネイルの重複排除に使用）
+"""
+
+import hashlib
+import os
+import tempfile
+
+def blob_path(store_dir, digest):
+    """ダイジェストから保存先パスを返す（先頭2文字でディレクトリを分割）"""
+    return os.path.join(store_dir, "objects", digest[:2], digest[2:])
+
+def put_blob(store_dir, data):
+    """
+    データを保存してダイジェストを返す
+
+    Returns:
+        tuple: (digest, 新規に書き込んだかどうか)
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(store_dir, digest)
+
+    if os.path.exists(path):
+        return digest, False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # 書き込み途中のファイルが残らないよう、一時ファイル経由でリネーム
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    return digest, True
+
+def get_blob(store_dir, digest):
+    """ダイジェストに対応するデータを読み込む"""
+    with open(blob_path(store_dir, digest), "rb") as f:
+        return f.read()
+
+def has_blob(store_dir, digest):
+    """ダイジェストに対応するデータが存在するか"""
+    return os.path.exists(blob_path(store_dir, digest))
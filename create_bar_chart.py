@@ -7,6 +7,8 @@ import requests
 import json
 import time
 
+from chart_builders import BarChartSpec
+
 SUPERSET_URL = "http://localhost:8088"
 USERNAME = "admin"
 PASSWORD = "admin"
@@ -52,24 +54,16 @@ def create_bar_chart():
     """Bar Chart (通常の棒グラフ) を作成"""
     print("📊 Bar Chartを作成中...")
 
-    chart_data = {
-        "slice_name": "製品別ステータス内訳",
-        "viz_type": "bar",
-        "datasource_id": DATASET_ID,
-        "datasource_type": "table",
-        "params": json.dumps({
-            "datasource": f"{DATASET_ID}__table",
-            "viz_type": "bar",
-            "metrics": ["count"],
-            "groupby": ["product_name"],
-            "columns": ["status"],
-            "row_limit": 10000,
-            "show_legend": True,
-            "y_axis_format": ",d",
-            "x_axis_label": "製品名",
-            "y_axis_label": "件数",
-        }),
-    }
+    chart_data = BarChartSpec(
+        "製品別ステータス内訳",
+        DATASET_ID,
+        metrics=["count"],
+        groupby=["product_name"],
+        columns=["status"],
+        y_axis_format=",d",
+        x_axis_label="製品名",
+        y_axis_label="件数",
+    ).payload()
 
     response = session.post(f"{SUPERSET_URL}/api/v1/chart/", json=chart_data)
 
@@ -9,6 +9,9 @@ import requests
 import json
 import time
 
+from chart_builders import PieChartSpec, TableChartSpec, NativeFilterSpec, simple_metric
+from dashboard_metadata import patch_dashboard_metadata
+
 # Superset設定
 SUPERSET_URL = "http://localhost:8088"
 USERNAME = "admin"
@@ -141,37 +144,12 @@ def create_pie_chart(dataset_id):
     """円グラフ（ステータス別売上）を作成"""
     print("🥧 円グラフを作成中...")
 
-    chart_data = {
-        "slice_name": "ステータス別売上（円グラフ）",
-        "viz_type": "pie",
-        "datasource_id": dataset_id,
-        "datasource_type": "table",
-        "params": json.dumps({
-            "datasource": f"{dataset_id}__table",
-            "viz_type": "pie",
-            "slice_id": None,
-            "groupby": ["status"],
-            "metric": {
-                "expressionType": "SIMPLE",
-                "column": {
-                    "column_name": "amount",
-                    "type": "NUMERIC"
-                },
-                "aggregate": "SUM",
-                "label": "SUM(amount)"
-            },
-            "adhoc_filters": [],
-            "row_limit": 10000,
-            "color_scheme": "supersetColors",
-            "show_labels": True,
-            "show_legend": True,
-            "label_type": "key_value",
-            "number_format": "SMART_NUMBER",
-            "date_format": "smart_date",
-            "show_labels_threshold": 5,
-            "sort_by_metric": True,
-        }),
-    }
+    chart_data = PieChartSpec(
+        "ステータス別売上（円グラフ）",
+        dataset_id,
+        groupby=["status"],
+        metric=simple_metric("amount"),
+    ).payload()
 
     response = session.post(
         f"{SUPERSET_URL}/api/v1/chart/",
@@ -191,33 +169,19 @@ def create_table_chart(dataset_id):
     """テーブルチャート（詳細データ）を作成"""
     print("📋 テーブルチャートを作成中...")
 
-    chart_data = {
-        "slice_name": "受注詳細テーブル",
-        "viz_type": "table",
-        "datasource_id": dataset_id,
-        "datasource_type": "table",
-        "params": json.dumps({
-            "datasource": f"{dataset_id}__table",
-            "viz_type": "table",
-            "slice_id": None,
-            "query_mode": "raw",
-            "groupby": [],
-            "all_columns": [
-                "order_id",
-                "order_date",
-                "customer_name",
-                "amount",
-                "status",
-                "days_since_order"
-            ],
-            "adhoc_filters": [],
-            "order_by_cols": [["order_date", False]],  # Descending
-            "row_limit": 100,
-            "table_timestamp_format": "smart_date",
-            "show_cell_bars": True,
-            "color_pn": True,
-        }),
-    }
+    chart_data = TableChartSpec(
+        "受注詳細テーブル",
+        dataset_id,
+        all_columns=[
+            "order_id",
+            "order_date",
+            "customer_name",
+            "amount",
+            "status",
+            "days_since_order"
+        ],
+        order_by_cols=[["order_date", False]],  # Descending
+    ).payload()
 
     response = session.post(
         f"{SUPERSET_URL}/api/v1/chart/",
@@ -337,73 +301,24 @@ def create_native_filter(dashboard_id, dataset_id):
     """Native Filter（期間フィルター）を作成"""
     print("🔍 期間フィルターを作成中...")
 
-    # Dashboard情報を取得
-    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}")
-
-    if response.status_code != 200:
-        print(f"❌ Dashboard情報取得失敗: {response.status_code}")
-        return False
-
-    dashboard_data = response.json()['result']
-
-    # Native Filterを追加
-    native_filter_config = {
-        "NATIVE_FILTER-1": {
-            "id": "NATIVE_FILTER-1",
-            "name": "期間フィルター",
-            "filterType": "filter_time",
-            "targets": [
-                {
-                    "datasetId": dataset_id,
-                    "column": {
-                        "name": "order_date"
-                    }
-                }
-            ],
-            "defaultDataMask": {
-                "filterState": {
-                    "value": "Last 30 days"
-                }
-            },
-            "controlValues": {
-                "enableEmptyFilter": False,
-                "defaultToFirstItem": False,
-                "multiSelect": False,
-                "searchAllOptions": False,
-                "inverseSelection": False
-            },
-            "cascadeParentIds": [],
-            "scope": {
-                "rootPath": ["ROOT_ID"],
-                "excluded": []
-            },
-            "isInstant": True,
-            "allowsMultipleValues": False,
-            "isRequired": False
-        }
-    }
-
-    # JSON metadata更新
-    json_metadata = json.loads(dashboard_data.get('json_metadata', '{}'))
-    json_metadata['native_filter_configuration'] = list(native_filter_config.values())
-
-    update_data = {
-        "json_metadata": json.dumps(json_metadata)
-    }
-
-    response = session.put(
-        f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}",
-        json=update_data,
+    native_filter = NativeFilterSpec(
+        "NATIVE_FILTER-1",
+        "期間フィルター",
+        dataset_id,
+        "order_date",
+        default_value="Last 30 days",
     )
 
-    if response.status_code == 200:
-        print(f"✅ 期間フィルター作成成功")
-        return True
-    else:
-        print(f"⚠️  期間フィルター作成失敗: {response.status_code}")
-        print(response.text)
+    # 他のフィルターや設定を消さないよう id 単位でマージ更新
+    try:
+        patch_dashboard_metadata(dashboard_id, native_filters=[native_filter.to_dict()], http_session=session)
+    except Exception as e:
+        print(f"⚠️  期間フィルター作成失敗: {e}")
         return False
 
+    print(f"✅ 期間フィルター作成成功")
+    return True
+
 def main():
     """メイン処理"""
     print("=" * 60)
@@ -461,6 +376,9 @@ def main():
     print("   2. 円グラフのセグメント（例: '進行中'）をクリック")
     print("   3. テーブルに該当ステータスのデータのみ表示されることを確認")
     print()
+    print("🔥 埋め込み前にキャッシュを温める場合:")
+    print(f"   python warm_cache.py --dashboard {dashboard_id}")
+    print()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,218 @@
+-- =====================================================
+-- orders_with_status 事前計算テーブル
+-- =====================================================
+-- Virtual Dataset "orders_with_status" はチャートのクエリごとに
+-- 全行の CASE (CURRENT_DATE - order_date) 計算と ORDER BY を実行していた。
+-- ステータスを物理テーブルに事前計算し、日次の差分リフレッシュで維持する。
+--
+-- ステータスが変わるのは経過日数が 7日 / 30日 の境界をまたぐ行だけなので、
+-- 差分リフレッシュでは「前回リフレッシュ時点で30日未満だった行」と、orders で変更された行のみを再計算する。
+--
+-- orders には更新日時がなく、order_id の最大値を基準にすると遅れてコミットされた小さい order_id や
+-- 既存受注の修正・削除を取りこぼすため、orders の INSERT / UPDATE / DELETE をトリガーで
+-- orders_with_status_changes に記録し、差分リフレッシュでそのキューを消化する。
+--
+-- 注意: Virtual Dataset と違い、orders の追加・修正・削除は次の差分リフレッシュまでチャートに反映されない。
+-- 差分リフレッシュはキューの行と境界付近の行しか触らず軽いため、鮮度が必要なら数分ごとに実行する（下記 cron 参照）。
+
+CREATE TABLE IF NOT EXISTS orders_with_status_mv (
+    order_id INT PRIMARY KEY,
+    order_date DATE NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL,
+    customer_name VARCHAR(100),
+    department_id INT,
+    status VARCHAR(10) NOT NULL      -- 新規 / 進行中 / 遅延（最終リフレッシュの基準日時点）
+);
+
+-- RLS (department_id = N) + 期間フィルター (order_date) 用
+CREATE INDEX IF NOT EXISTS idx_orders_with_status_mv_dept_date
+    ON orders_with_status_mv (department_id, order_date);
+
+-- 差分リフレッシュの境界更新（order_date の範囲だけで絞る）用
+CREATE INDEX IF NOT EXISTS idx_orders_with_status_mv_date
+    ON orders_with_status_mv (order_date);
+
+-- 円グラフの GROUP BY status 用
+CREATE INDEX IF NOT EXISTS idx_orders_with_status_mv_status
+    ON orders_with_status_mv (status);
+
+-- orders の変更キュー（ステートメントトリガーで記録、差分リフレッシュで消化）
+CREATE TABLE IF NOT EXISTS orders_with_status_changes (
+    order_id INT NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE OR REPLACE FUNCTION capture_orders_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO orders_with_status_changes (order_id) SELECT order_id FROM new_rows;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO orders_with_status_changes (order_id) SELECT order_id FROM old_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 遷移テーブルを使うトリガーはイベントごとに分ける必要がある（COPY の大量投入でも1文1回の実行で済む）
+DROP TRIGGER IF EXISTS orders_with_status_capture_insert ON orders;
+CREATE TRIGGER orders_with_status_capture_insert
+    AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capture_orders_changes();
+
+DROP TRIGGER IF EXISTS orders_with_status_capture_update ON orders;
+CREATE TRIGGER orders_with_status_capture_update
+    AFTER UPDATE ON orders REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capture_orders_changes();
+
+DROP TRIGGER IF EXISTS orders_with_status_capture_delete ON orders;
+CREATE TRIGGER orders_with_status_capture_delete
+    AFTER DELETE ON orders REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capture_orders_changes();
+
+-- リフレッシュ履歴（status_as_of は最後にステータスを計算した基準日）
+CREATE TABLE IF NOT EXISTS orders_with_status_refresh_log (
+    id SERIAL PRIMARY KEY,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    status_as_of DATE NOT NULL,
+    mode VARCHAR(11) NOT NULL,       -- full / incremental
+    rows_inserted INT NOT NULL,
+    rows_updated INT NOT NULL,
+    rows_deleted INT NOT NULL
+);
+
+-- =====================================================
+-- ステータス判定（Virtual Dataset と同じ閾値）
+-- =====================================================
+CREATE OR REPLACE FUNCTION order_status(p_order_date DATE, p_as_of DATE)
+RETURNS VARCHAR AS $$
+    SELECT CASE
+        WHEN (p_as_of - p_order_date) < 7 THEN '新規'
+        WHEN (p_as_of - p_order_date) < 30 THEN '進行中'
+        ELSE '遅延'
+    END
+$$ LANGUAGE SQL IMMUTABLE;
+
+-- =====================================================
+-- リフレッシュ
+-- =====================================================
+CREATE OR REPLACE FUNCTION refresh_orders_with_status(p_full BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (refresh_mode VARCHAR, inserted INT, updated INT, deleted INT) AS $$
+DECLARE
+    v_last_as_of DATE;
+    v_inserted INT := 0;
+    v_updated INT := 0;
+    v_deleted INT := 0;
+    v_boundary INT := 0;
+    v_mode VARCHAR := 'incremental';
+BEGIN
+    -- 同時実行を防止
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_orders_with_status'));
+
+    SELECT MAX(l.status_as_of) INTO v_last_as_of FROM orders_with_status_refresh_log l;
+
+    IF p_full OR v_last_as_of IS NULL THEN
+        v_mode := 'full';
+
+        -- 全件で作り直すため、ここまでの変更キューは不要（この後にコミットされた変更は次回の差分で処理）
+        DELETE FROM orders_with_status_changes;
+
+        DELETE FROM orders_with_status_mv mv
+        WHERE NOT EXISTS (SELECT 1 FROM orders o WHERE o.order_id = mv.order_id);
+        GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+        INSERT INTO orders_with_status_mv AS mv
+            (order_id, order_date, amount, customer_name, department_id, status)
+        SELECT order_id, order_date, amount, customer_name, department_id, order_status(order_date, CURRENT_DATE)
+        FROM orders
+        ON CONFLICT (order_id) DO UPDATE SET
+            order_date = EXCLUDED.order_date,
+            amount = EXCLUDED.amount,
+            customer_name = EXCLUDED.customer_name,
+            department_id = EXCLUDED.department_id,
+            status = EXCLUDED.status
+        WHERE (mv.order_date, mv.amount, mv.customer_name, mv.department_id, mv.status)
+            IS DISTINCT FROM (EXCLUDED.order_date, EXCLUDED.amount, EXCLUDED.customer_name, EXCLUDED.department_id, EXCLUDED.status);
+        -- 全件モードでは追加・更新の区別をせず upsert 件数を rows_updated に記録
+        GET DIAGNOSTICS v_updated = ROW_COUNT;
+    ELSE
+        -- 変更キューから今回処理する order_id を取り出す（未コミットの変更は見えないため次回に残る）
+        DROP TABLE IF EXISTS changed_orders;
+        CREATE TEMP TABLE changed_orders (order_id INT PRIMARY KEY) ON COMMIT DROP;
+        WITH taken AS (
+            DELETE FROM orders_with_status_changes RETURNING order_id
+        )
+        INSERT INTO changed_orders SELECT DISTINCT order_id FROM taken;
+
+        -- 削除された受注
+        DELETE FROM orders_with_status_mv mv
+        USING changed_orders c
+        WHERE mv.order_id = c.order_id
+          AND NOT EXISTS (SELECT 1 FROM orders o WHERE o.order_id = c.order_id);
+        GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+        -- 追加・修正された受注
+        WITH upserted AS (
+            INSERT INTO orders_with_status_mv AS mv
+                (order_id, order_date, amount, customer_name, department_id, status)
+            SELECT o.order_id, o.order_date, o.amount, o.customer_name, o.department_id, order_status(o.order_date, CURRENT_DATE)
+            FROM orders o
+            JOIN changed_orders c ON c.order_id = o.order_id
+            ON CONFLICT (order_id) DO UPDATE SET
+                order_date = EXCLUDED.order_date,
+                amount = EXCLUDED.amount,
+                customer_name = EXCLUDED.customer_name,
+                department_id = EXCLUDED.department_id,
+                status = EXCLUDED.status
+            WHERE (mv.order_date, mv.amount, mv.customer_name, mv.department_id, mv.status)
+                IS DISTINCT FROM (EXCLUDED.order_date, EXCLUDED.amount, EXCLUDED.customer_name, EXCLUDED.department_id, EXCLUDED.status)
+            RETURNING (xmax = 0) AS is_insert
+        )
+        SELECT COUNT(*) FILTER (WHERE is_insert), COUNT(*) FILTER (WHERE NOT is_insert)
+        INTO v_inserted, v_updated
+        FROM upserted;
+
+        -- 前回基準日で30日未満だった行だけが境界をまたぐ可能性がある（それ以前は「遅延」で確定）
+        UPDATE orders_with_status_mv mv
+        SET status = order_status(mv.order_date, CURRENT_DATE)
+        WHERE mv.order_date > v_last_as_of - 30
+          AND mv.status <> order_status(mv.order_date, CURRENT_DATE);
+        GET DIAGNOSTICS v_boundary = ROW_COUNT;
+        v_updated := v_updated + v_boundary;
+    END IF;
+
+    INSERT INTO orders_with_status_refresh_log (status_as_of, mode, rows_inserted, rows_updated, rows_deleted)
+    VALUES (CURRENT_DATE, v_mode, v_inserted, v_updated, v_deleted);
+
+    RETURN QUERY SELECT v_mode, v_inserted, v_updated, v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- 定期実行（pg_cron が使える場合）
+-- =====================================================
+-- 5分ごとに差分リフレッシュ（orders の変更がチャートに出るまでの遅れの上限。日付の境界は日付が変わった最初の回で更新）、
+-- 日曜 03:00 に全件リフレッシュ
+-- （差分はトリガーの変更キューで修正・削除も反映する。全件はトリガーが外れていた期間の取りこぼし対策。
+--   partition_tables.py で orders を入れ替えた後は refresh_orders_status.py --init でトリガーを付け直す）
+/*
+SELECT cron.schedule('orders_with_status_incremental', '*/5 * * * *', 'SELECT refresh_orders_with_status(false)');
+SELECT cron.schedule('orders_with_status_full', '0 3 * * 0', 'SELECT refresh_orders_with_status(true)');
+*/
+-- pg_cron が使えない場合は refresh_orders_status.py を cron から実行する
+
+-- =====================================================
+-- Virtual Dataset用SQL（事前計算テーブル版）
+-- =====================================================
+/*
+SELECT
+    order_id,
+    order_date,
+    amount,
+    customer_name,
+    department_id,
+    status,
+    (CURRENT_DATE - order_date) AS days_since_order
+FROM orders_with_status_mv
+*/
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Dashboard json_metadata のマージ更新
+
+GET → json.loads → 上書き → PUT だと、同じ Dashboard を同時に更新したジョブの
+Native Filter や設定が消えてしまう。本モジュールでは
+- Native Filter を id 単位でディープマージ（他のフィルターはそのまま残す）
+- その他の json_metadata キーもディープマージ
+- 同じマシン上の更新は Dashboard ごとのファイルロックで直列化（読み込み〜書き込みの間に割り込ませない）
+- 書き込み直前の changed_on 再確認と、書き込み後の反映確認で競合を検出してリトライ
+を行う。
+
+Superset の PUT には条件付き更新（If-Match など）がないため、ロックを共有しない別マシンのジョブや
+Superset の画面からの同時編集に対しては best-effort である（自分のパッチの反映は確認できるが、
+直前に書き込んだ相手の変更を上書きしたことは検出できない）。
+"""
+
+import copy
+import fcntl
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+import superset_client
+from superset_client import SUPERSET_URL
+
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+LOCK_DIR = os.path.join(tempfile.gettempdir(), "superset-dashboard-locks")
+
+class ConcurrentModificationError(Exception):
+    """リトライ上限まで競合が解消しなかった"""
+
+def deep_merge(base, patch):
+    """dict を再帰的にマージ（dict 以外の値は patch 側で置き換え）"""
+    merged = copy.deepcopy(base)
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+def merge_native_filters(current, updates, remove_ids=()):
+    """
+    native_filter_configuration を id 単位でマージ
+
+    既存フィルターの並び順は維持し、新しい id は末尾に追加する
+    """
+    updates_by_id = {f["id"]: f for f in updates}
+    merged = []
+    for existing in current:
+        if existing["id"] in remove_ids:
+            continue
+        update = updates_by_id.pop(existing["id"], None)
+        merged.append(deep_merge(existing, update) if update else existing)
+    merged.extend(copy.deepcopy(f) for f in updates_by_id.values())
+    return merged
+
+def _contains(current, expected):
+    """expected の内容がすべて current に含まれているか（反映確認用）"""
+    if isinstance(expected, dict):
+        return isinstance(current, dict) and all(
+            k in current and _contains(current[k], v) for k, v in expected.items()
+        )
+    return current == expected
+
+def _load_json(value):
+    if not value:
+        return {}
+    return json.loads(value) if isinstance(value, str) else value
+
+@contextmanager
+def dashboard_lock(dashboard_id):
+    """Dashboard ごとの排他ロック（同じマシン上のプロセス・スレッド間で有効）"""
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(os.path.join(LOCK_DIR, f"dashboard-{dashboard_id}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_dashboard(dashboard_id, http_session=None):
+    """Dashboard 詳細を取得（json_metadata / position_json は json_field() で読む）"""
+    return superset_client.get_record(f"/api/v1/dashboard/{dashboard_id}", http_session)
+
+def _is_applied(dashboard, metadata_patch, native_filters, remove_ids, position_json):
+    metadata = dashboard.json_field("json_metadata")
+    if metadata_patch and not _contains(metadata, metadata_patch):
+        return False
+
+    filters = {f["id"]: f for f in metadata.get("native_filter_configuration", [])}
+    if any(filter_id in filters for filter_id in remove_ids):
+        return False
+    if any(not _contains(filters.get(f["id"]), f) for f in native_filters):
+        return False
+
+    if position_json is not None and dashboard.json_field("position_json") != position_json:
+        return False
+    return True
+
+def patch_dashboard_metadata(dashboard_id, metadata_patch=None, native_filters=(), remove_filter_ids=(),
+                             position_json=None, http_session=None, max_retries=MAX_RETRIES):
+    """
+    json_metadata をマージ更新
+
+    読み込み〜書き込み〜反映確認は dashboard_lock() の中で行うため、同じマシン上の呼び出しは直列に実行される
+    （別マシンからの同時更新に対しては best-effort。モジュールの説明を参照）
+
+    Args:
+        dashboard_id: Dashboard ID
+        metadata_patch: json_metadata にディープマージする dict（例: {"cross_filters_enabled": True}）
+        native_filters: 追加・更新する Native Filter 設定のリスト（id 単位でマージ）
+        remove_filter_ids: 削除する Native Filter の id
+        position_json: 指定した場合はレイアウトも置き換える (dict)
+        http_session: 使用するセッション（省略時は superset_client.session）
+
+    Returns:
+        dict: 更新後の json_metadata
+
+    Raises:
+        ConcurrentModificationError: リトライ上限まで競合が続いた場合
+    """
+    http_session = http_session or superset_client.session
+    metadata_patch = metadata_patch or {}
+    native_filters = list(native_filters)
+    remove_ids = set(remove_filter_ids)
+
+    for attempt in range(max_retries):
+        if attempt:
+            # 同時実行ジョブ同士が同じタイミングで再試行しないようジッターを入れる
+            time.sleep(RETRY_BASE_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+        with dashboard_lock(dashboard_id):
+            result = _merge_once(dashboard_id, metadata_patch, native_filters, remove_ids, position_json, http_session)
+        if result is not None:
+            return result
+        print(f"  🔁 Dashboard {dashboard_id} の更新が競合したため再試行します ({attempt + 1}/{max_retries})")
+
+    raise ConcurrentModificationError(f"Dashboard {dashboard_id} の更新が {max_retries} 回競合しました")
+
+def _merge_once(dashboard_id, metadata_patch, native_filters, remove_ids, position_json, http_session):
+    """1回分の読み込み・マージ・書き込み（競合を検出した場合は None）"""
+    dashboard = get_dashboard(dashboard_id, http_session)
+    changed_on = dashboard.get("changed_on")
+
+    if _is_applied(dashboard, metadata_patch, native_filters, remove_ids, position_json):
+        return _load_json(dashboard.get("json_metadata"))
+
+    metadata = deep_merge(dashboard.json_field("json_metadata"), metadata_patch)
+    if native_filters or remove_ids:
+        metadata["native_filter_configuration"] = merge_native_filters(
+            metadata.get("native_filter_configuration", []), native_filters, remove_ids
+        )
+
+    # 読み込み後に（ロックを共有しない）他の更新が入っていたら、最新の状態から作り直す
+    if get_dashboard(dashboard_id, http_session).get("changed_on") != changed_on:
+        return None
+
+    update_data = {"json_metadata": json.dumps(metadata)}
+    if position_json is not None:
+        update_data["position_json"] = json.dumps(position_json)
+
+    response = http_session.put(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}", json=update_data)
+    if response.status_code != 200:
+        raise RuntimeError(f"Dashboard更新失敗: {response.status_code} - {response.text}")
+
+    # PUT 直前に割り込まれて上書きされていないか確認
+    if not _is_applied(get_dashboard(dashboard_id, http_session), metadata_patch, native_filters, remove_ids, position_json):
+        return None
+    return metadata
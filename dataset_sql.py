@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Dataset SQL の解析と、Superset が実際に発行するクエリの再構成
+
+Virtual Dataset のクエリは Superset 内で
+    SELECT ... FROM (<Dataset SQL>) AS virtual_table WHERE (<RLS>) AND <期間フィルター> GROUP BY ...
+の形に包まれる（README.md「生成される SQL」参照）。
+インデックス提案や EXPLAIN による計測では、この実効クエリを組み立てて使う。
+"""
+
+import re
+
+import jwt
+
+from generate_guest_token import generate_guest_token
+
+TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+ORDER_BY_PATTERN = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+LIMIT_PATTERN = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+RLS_COLUMN_PATTERN = re.compile(r"\b([A-Za-z_]\w*)\s*(?:=|IN\b)", re.IGNORECASE)
+SQL_KEYWORDS = {"select", "lateral", "unnest", "generate_series"}
+
+def strip_comments(sql):
+    sql = re.sub(r"--[^\n]*", "", sql)
+    return re.sub(r"/\*.*?\*/", "", sql, flags=re.DOTALL)
+
+def is_templated(sql):
+    """Jinja テンプレートを含むか（そのままでは実行できない）"""
+    return "{{" in sql or "{%" in sql
+
+def base_tables(sql):
+    """FROM / JOIN で参照しているテーブル名（スキーマ修飾は除く）"""
+    tables = []
+    for name in TABLE_PATTERN.findall(strip_comments(sql)):
+        name = name.split(".")[-1]
+        if name.lower() not in SQL_KEYWORDS and name not in tables:
+            tables.append(name)
+    return tables
+
+def has_trailing_order_by(sql):
+    """
+    最外側に LIMIT なしの ORDER BY があるか
+
+    サブクエリとして包まれると外側の GROUP BY / ORDER BY で並びが決まるため、
+    内側の ORDER BY は結果に影響せず、全行ソートのコストだけが残る
+    """
+    sql = strip_comments(sql)
+    depth = 0
+    top_level = []
+    for ch in sql:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        top_level.append(ch if depth == 0 else " ")
+    top_level = "".join(top_level)
+    return bool(ORDER_BY_PATTERN.search(top_level)) and not LIMIT_PATTERN.search(top_level)
+
+def guest_rls_clauses(department_id, username="profiler"):
+    """generate_guest_token.py が発行するトークンから RLS 句を取り出す"""
+    token, _ = generate_guest_token(department_id, username)
+    payload = jwt.decode(token, options={"verify_signature": False})
+    return [rule["clause"] for rule in payload.get("rls", payload.get("rls_rules", []))]
+
+def rls_columns(clauses):
+    """RLS 句で等価条件に使われているカラム"""
+    columns = []
+    for clause in clauses:
+        for column in RLS_COLUMN_PATTERN.findall(clause):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+def _literal(value):
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def filter_sql(query_filter):
+    """query_context の filter を SQL 条件に変換"""
+    col, op, val = query_filter["col"], query_filter["op"], query_filter["val"]
+    if op in ("IN", "NOT IN"):
+        return f"{col} {op} ({', '.join(_literal(v) for v in val)})"
+    if op in ("IS NULL", "IS NOT NULL"):
+        return f"{col} {op}"
+    return f"{col} {'=' if op == '==' else op} {_literal(val)}"
+
+def build_effective_query(dataset_sql, rls=(), time_column=None, time_range=None, groupby=(), metrics=("COUNT(*)",),
+                          row_limit=None):
+    """
+    Superset が Virtual Dataset に対して発行するクエリを組み立てる
+
+    Args:
+        dataset_sql: Dataset の SQL
+        rls: RLS 句のリスト
+        time_column: 期間フィルター対象カラム
+        time_range: (開始, 終了) の SQL 式。終了は含まない
+        groupby: GROUP BY カラム
+        metrics: 集計式
+        row_limit: LIMIT
+    """
+    select = list(groupby) + list(metrics)
+    conditions = [f"({clause})" for clause in rls]
+    if time_column and time_range:
+        start, end = time_range
+        if start is not None:
+            conditions.append(f"{time_column} >= {start}")
+        if end is not None:
+            conditions.append(f"{time_column} < {end}")
+
+    query = f"SELECT {', '.join(select)}\nFROM (\n{dataset_sql.strip().rstrip(';')}\n) AS virtual_table"
+    if conditions:
+        query += "\nWHERE " + " AND ".join(conditions)
+    if groupby:
+        query += "\nGROUP BY " + ", ".join(groupby)
+    if row_limit:
+        query += f"\nLIMIT {int(row_limit)}"
+    return query
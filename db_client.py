@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL 共通接続設定
+
+Superset の Main Database（orders / product_test_results が入っている DB）へ直接接続する
+"""
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+DB_HOST = "localhost"
+DB_PORT = 5432
+DB_NAME = "superset"
+DB_USER = "superset"
+DB_PASSWORD = "superset"
+
+def connect(autocommit=False):
+    """PostgreSQL へ接続"""
+    conn = psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+    )
+    conn.autocommit = autocommit
+    return conn
+
+def connection_pool(max_connections):
+    """スレッド間で共有する接続プール"""
+    return ThreadedConnectionPool(
+        1,
+        max_connections,
+        host=DB_HOST,
+        port=DB_PORT,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+    )
+
+def run_sql_file(conn, path):
+    """SQL ファイルを実行"""
+    with open(path, encoding="utf-8") as f:
+        sql = f.read()
+    with conn.cursor() as cur:
+        cur.execute(sql)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+不具合率の日次累積ロールアップ（プレフィックスサム）
+
+product_test_results を製品・部署・日付ごとに集計し、success_count / failure_count の累積和を保持する。
+任意期間 [start, end) の合計は「end 直前の累積 − start 直前の累積」で求まるため、
+期間の長さやデータ量に関係なく製品ごとにインデックス2回の参照で不具合率・ステータスを算出できる。
+（PERIOD_DEPENDENT_STATUS.md の「選択期間の集計値でステータスを判定する」要件に対応）
+
+使い方:
+    python defect_rollup.py build                          # ロールアップ作成（全件）
+    python defect_rollup.py build --from 2024-02-01        # 指定日以降のみ再計算
+    python defect_rollup.py query 2024-01-01 2024-02-01    # 期間の不具合率・ステータス
+    python defect_rollup.py benchmark --sizes 10000 100000 1000000
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+
+from psycopg2 import sql
+
+from db_client import connect
+
+SOURCE_TABLE = "product_test_results"
+ROLLUP_TABLE = "product_defect_daily_cumsum"
+KEYS_TABLE = "product_defect_rollup_keys"
+
+# ステータス閾値（Virtual Dataset と同じ）
+GOOD_THRESHOLD = 0.05
+WARNING_THRESHOLD = 0.10
+
+CREATE_SQL = """
+CREATE {temp} TABLE IF NOT EXISTS {rollup} (
+    product_name VARCHAR(100) NOT NULL,
+    department_id INT NOT NULL,          -- NULL は 0 として保持
+    test_date DATE NOT NULL,
+    cum_success BIGINT NOT NULL,
+    cum_failure BIGINT NOT NULL,
+    PRIMARY KEY (product_name, department_id, test_date)
+);
+CREATE {temp} TABLE IF NOT EXISTS {keys} (
+    product_name VARCHAR(100) NOT NULL,
+    department_id INT NOT NULL,
+    PRIMARY KEY (product_name, department_id)
+);
+"""
+
+# from_date 以降を再計算（それより前の累積値を起点に継続）
+REBUILD_SQL = """
+DELETE FROM {rollup} WHERE test_date >= %(from_date)s;
+
+INSERT INTO {keys} (product_name, department_id)
+SELECT DISTINCT product_name, COALESCE(department_id, 0)
+FROM {source}
+WHERE test_date >= %(from_date)s
+ON CONFLICT DO NOTHING;
+
+INSERT INTO {rollup} (product_name, department_id, test_date, cum_success, cum_failure)
+SELECT
+    d.product_name,
+    d.department_id,
+    d.test_date,
+    COALESCE(b.cum_success, 0) + SUM(d.success) OVER w,
+    COALESCE(b.cum_failure, 0) + SUM(d.failure) OVER w
+FROM (
+    SELECT product_name, COALESCE(department_id, 0) AS department_id, test_date,
+           SUM(success_count) AS success, SUM(failure_count) AS failure
+    FROM {source}
+    WHERE test_date >= %(from_date)s
+    GROUP BY 1, 2, 3
+) d
+LEFT JOIN LATERAL (
+    SELECT r.cum_success, r.cum_failure
+    FROM {rollup} r
+    WHERE r.product_name = d.product_name
+      AND r.department_id = d.department_id
+      AND r.test_date < %(from_date)s
+    ORDER BY r.test_date DESC
+    LIMIT 1
+) b ON TRUE
+WINDOW w AS (PARTITION BY d.product_name, d.department_id ORDER BY d.test_date);
+"""
+
+# 期間 [start, end) の集計をプレフィックスサムの差分で求める
+ROLLUP_QUERY_SQL = """
+SELECT
+    k.product_name,
+    k.department_id,
+    COALESCE(e.cum_success, 0) - COALESCE(s.cum_success, 0) AS total_success,
+    COALESCE(e.cum_failure, 0) - COALESCE(s.cum_failure, 0) AS total_failure
+FROM {keys} k
+LEFT JOIN LATERAL (
+    SELECT r.cum_success, r.cum_failure FROM {rollup} r
+    WHERE r.product_name = k.product_name AND r.department_id = k.department_id AND r.test_date < %(end)s
+    ORDER BY r.test_date DESC LIMIT 1
+) e ON TRUE
+LEFT JOIN LATERAL (
+    SELECT r.cum_success, r.cum_failure FROM {rollup} r
+    WHERE r.product_name = k.product_name AND r.department_id = k.department_id AND r.test_date < %(start)s
+    ORDER BY r.test_date DESC LIMIT 1
+) s ON TRUE
+ORDER BY k.product_name, k.department_id
+"""
+
+# 比較用: 元テーブルをそのまま GROUP BY
+RAW_QUERY_SQL = """
+SELECT product_name, COALESCE(department_id, 0), SUM(success_count), SUM(failure_count)
+FROM {source}
+WHERE test_date >= %(start)s AND test_date < %(end)s
+GROUP BY 1, 2
+ORDER BY 1, 2
+"""
+
+def _format(template, source=SOURCE_TABLE, rollup=ROLLUP_TABLE, keys=KEYS_TABLE, temp=False):
+    return sql.SQL(template).format(
+        source=sql.Identifier(source),
+        rollup=sql.Identifier(rollup),
+        keys=sql.Identifier(keys),
+        temp=sql.SQL("TEMP" if temp else ""),
+    )
+
+def status_of(total_success, total_failure):
+    """期間集計値からステータスを判定"""
+    total = total_success + total_failure
+    if total == 0:
+        return None, None
+    rate = total_failure / total
+    if rate <= GOOD_THRESHOLD:
+        return rate, "Good"
+    if rate <= WARNING_THRESHOLD:
+        return rate, "Warning"
+    return rate, "Bad"
+
+def build(conn, from_date=datetime.date.min, **tables):
+    """ロールアップを作成（from_date 以降を再計算）"""
+    with conn.cursor() as cur:
+        cur.execute(_format(CREATE_SQL, **tables))
+        cur.execute(_format(REBUILD_SQL, **tables), {"from_date": from_date})
+    conn.commit()
+
+def query_range(conn, start, end, **tables):
+    """
+    期間 [start, end) の製品別不具合率
+
+    Returns:
+        list: (product_name, department_id, total_success, total_failure, defect_rate, status)
+    """
+    with conn.cursor() as cur:
+        cur.execute(_format(ROLLUP_QUERY_SQL, **tables), {"start": start, "end": end})
+        rows = cur.fetchall()
+
+    results = []
+    for product_name, department_id, success, failure in rows:
+        rate, status = status_of(success, failure)
+        if status:
+            results.append((product_name, department_id, success, failure, rate, status))
+    return results
+
+# =====================================================
+# ベンチマーク
+# =====================================================
+
+BENCH_SOURCE = "bench_product_test_results"
+BENCH_ROLLUP = "bench_product_defect_daily_cumsum"
+BENCH_KEYS = "bench_product_defect_rollup_keys"
+BENCH_PRODUCTS = 100
+BENCH_REPEAT = 5
+
+def _timed(cur, query, params):
+    timings = []
+    for _ in range(BENCH_REPEAT):
+        started = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def benchmark(sizes):
+    """元テーブルの GROUP BY とプレフィックスサム参照をデータ量ごとに比較"""
+    tables = {"source": BENCH_SOURCE, "rollup": BENCH_ROLLUP, "keys": BENCH_KEYS}
+
+    print(f"{'rows':>12} {'期間':>6} {'GROUP BY(ms)':>14} {'prefix sum(ms)':>16} {'倍率':>8}")
+    print("-" * 62)
+
+    for size in sizes:
+        days = max(size // BENCH_PRODUCTS, 1)
+        conn = connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    CREATE TEMP TABLE {source} AS
+                    SELECT
+                        DATE '2020-01-01' + (g / %(products)s)::INT AS test_date,
+                        'product-' || (g %% %(products)s) AS product_name,
+                        101 + (g %% 3) AS department_id,
+                        (80 + random() * 20)::INT AS success_count,
+                        (random() * 15)::INT AS failure_count
+                    FROM generate_series(0, %(size)s - 1) g;
+                    CREATE INDEX ON {source} (test_date);
+                    ANALYZE {source};
+                """).format(source=sql.Identifier(BENCH_SOURCE)), {"products": BENCH_PRODUCTS, "size": size})
+            build(conn, temp=True, **tables)
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("ANALYZE {}; ANALYZE {};").format(sql.Identifier(BENCH_ROLLUP), sql.Identifier(BENCH_KEYS)))
+
+            first_day = datetime.date(2020, 1, 1)
+            for span in (30, days):
+                params = {"start": first_day + datetime.timedelta(days=days - span), "end": first_day + datetime.timedelta(days=days)}
+                with conn.cursor() as cur:
+                    raw = _timed(cur, _format(RAW_QUERY_SQL, **tables), params)
+                    prefix = _timed(cur, _format(ROLLUP_QUERY_SQL, **tables), params)
+                label = "30日" if span == 30 else "全期間"
+                print(f"{size:>12,} {label:>6} {raw * 1000:>14.2f} {prefix * 1000:>16.2f} {raw / prefix:>7.1f}x")
+        finally:
+            conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="不具合率の日次累積ロールアップ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="ロールアップ作成")
+    build_parser.add_argument("--from", dest="from_date", type=datetime.date.fromisoformat, default=datetime.date.min)
+
+    query_parser = subparsers.add_parser("query", help="期間 [start, end) の不具合率")
+    query_parser.add_argument("start", type=datetime.date.fromisoformat)
+    query_parser.add_argument("end", type=datetime.date.fromisoformat)
+
+    bench_parser = subparsers.add_parser("benchmark", help="GROUP BY との比較")
+    bench_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        benchmark(args.sizes)
+        return
+
+    conn = connect()
+    try:
+        if args.command == "build":
+            print("🔄 ロールアップを作成中...")
+            build(conn, args.from_date)
+            print("✅ 作成完了")
+        else:
+            print(f"📊 {args.start} 〜 {args.end} (終了日を含まない)")
+            for product_name, department_id, success, failure, rate, status in query_range(conn, args.start, args.end):
+                print(f"  {product_name} (部署{department_id}): 不具合率 {rate * 100:.1f}% → {status} ({failure}/{success + failure})")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+チャートデータの部署別ストリーミングエクスポート（CSV / Parquet）
+
+テーブルチャートは row_limit 100、円グラフは 10000 で打ち切られるため、画面やチャートの CSV ダウンロードでは
+orders_with_status の部署別全件を取り出せない。チャートの定義（カラム・フィルター・期間）のまま、
+一定サイズのチャンクで取得しては書き出すことを繰り返すため、数百万行でもメモリ使用量は一定。
+
+取得方法:
+    api  Guest Token で /api/v1/chart/data を row_offset / row_limit の窓でページング（RLS は Superset が適用）
+    db   PostgreSQL のサーバーサイドカーソルで実効クエリ（RLS 句付き）を直接読み出す（大量データ向け）
+
+使い方:
+    python export_chart.py 15                                   # 全部署を CSV で exports/ に出力
+    python export_chart.py 15 --department 101 --format parquet --source db --chunk-size 200000
+"""
+
+import argparse
+import csv
+import os
+import time
+
+from generate_guest_token import DEPARTMENTS, DASHBOARD_ID, generate_guest_token
+from superset_client import login, guest_session
+from chart_data import NO_FILTER, load_chart, get_dataset, chart_query_context, iter_chart_rows, metric_label, metric_sql
+from dataset_sql import guest_rls_clauses, filter_sql, build_effective_query
+from time_range import to_sql
+
+OUTPUT_DIR = "exports"
+DEFAULT_CHUNK_SIZE = 50000  # Superset の SQL_MAX_ROW（既定 100000）以下にする
+
+class CsvChunkWriter:
+    """チャンクごとに追記する CSV ライター"""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.header_written = False
+
+    def write(self, columns, rows):
+        if not self.header_written:
+            self.writer.writerow(columns)
+            self.header_written = True
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetChunkWriter:
+    """
+    チャンクごとに row group を追加する Parquet ライター（スキーマは最初のチャンクで確定）
+
+    スキーマは column_types（arrow_types() で Dataset のカラム型・メトリックから求めたもの）を優先し、
+    それ以外のカラムだけ最初のチャンクから推定する。推定では全行 None のカラムが null 型に、
+    Decimal のカラムがそのチャンクの桁数の decimal 型になり後続のチャンクを書けないため、
+    それぞれ文字列・float64 にする
+    """
+
+    def __init__(self, path, column_types=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet 出力には pyarrow が必要です (pip install pyarrow)") from None
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.column_types = column_types or {}
+        self.writer = None
+
+    def _schema(self, data):
+        inferred = self.pa.table({c: v for c, v in data.items() if c not in self.column_types}).schema
+        fields = []
+        for column in data:
+            if column in self.column_types:
+                arrow_type = self.column_types[column]
+            else:
+                arrow_type = inferred.field(column).type
+                if self.pa.types.is_null(arrow_type):
+                    arrow_type = self.pa.string()
+                elif self.pa.types.is_decimal(arrow_type):
+                    arrow_type = self.pa.float64()
+            fields.append(self.pa.field(column, arrow_type))
+        return self.pa.schema(fields)
+
+    def _coerce(self, arrow_type, values):
+        """値をスキーマの型に合わせる（psycopg2 の Decimal → float など）"""
+        if self.pa.types.is_string(arrow_type):
+            return [v if v is None or isinstance(v, str) else str(v) for v in values]
+        if self.pa.types.is_floating(arrow_type):
+            return [None if v is None else float(v) for v in values]
+        return values
+
+    def write(self, columns, rows):
+        data = {c: [row[i] for row in rows] for i, c in enumerate(columns)}
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self._schema(data))
+        schema = self.writer.schema
+        data = {c: self._coerce(schema.field(c).type, values) for c, values in data.items()}
+        self.writer.write_table(self.pa.table(data, schema=schema))
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+WRITERS = {"csv": CsvChunkWriter, "parquet": ParquetChunkWriter}
+
+def arrow_types(chart, source):
+    """
+    結果カラムの pyarrow の型（Dataset のカラム型・メトリックから求める。Parquet の null 型カラムの置き換え用）
+
+    時刻は api では epoch ミリ秒、db では date / datetime で返るため source ごとに型を変える
+    """
+    import pyarrow as pa
+
+    types = {}
+    for column in get_dataset(chart["datasource_id"]).get("columns", []):
+        sql_type = (column.get("type") or "").upper()
+        if "TIMESTAMP" in sql_type or (column.get("is_dttm") and "DATE" not in sql_type):
+            arrow_type = pa.timestamp("ms") if source == "api" else pa.timestamp("us")
+        elif "DATE" in sql_type:
+            arrow_type = pa.timestamp("ms") if source == "api" else pa.date32()
+        elif "INT" in sql_type:
+            arrow_type = pa.int64()
+        elif any(t in sql_type for t in ("NUMERIC", "DECIMAL", "FLOAT", "DOUBLE", "REAL")):
+            arrow_type = pa.float64()
+        elif "BOOL" in sql_type:
+            arrow_type = pa.bool_()
+        else:
+            arrow_type = pa.string()
+        types[column["column_name"]] = arrow_type
+    for metric in chart["metrics"]:
+        counts = metric == "count" or (isinstance(metric, dict) and metric.get("aggregate") in ("COUNT", "COUNT_DISTINCT"))
+        types[metric_label(metric)] = pa.int64() if counts else pa.float64()
+    return types
+
+def _result_columns(chart):
+    return (chart["groupby"] or chart["columns"]) + [metric_label(m) for m in chart["metrics"]]
+
+def api_chunks(chart, department_id, user_name, time_range, chunk_size):
+    """Chart Data API を row_offset / row_limit でページング"""
+    guest = guest_session(generate_guest_token(department_id, user_name)[0])
+    columns = _result_columns(chart)
+    offset = 0
+    while True:
+        query_context = chart_query_context(chart, time_range, row_limit=chunk_size, row_offset=offset)
+        rows = [[row.get(c) for c in columns] for row in iter_chart_rows(query_context, http_session=guest)]
+        if rows:
+            yield columns, rows
+        if len(rows) < chunk_size:
+            return
+        offset += chunk_size
+
+def db_chunks(chart, department_id, time_range, chunk_size):
+    """サーバーサイドカーソル（名前付きカーソル）で実効クエリを読み出す"""
+    from db_client import connect
+
+    if chart["metrics"]:
+        select = [f'{metric_sql(m)} AS "{metric_label(m)}"' for m in chart["metrics"]]
+    else:
+        select = chart["columns"]
+    query = build_effective_query(
+        chart["sql"],
+        rls=guest_rls_clauses(department_id) + [filter_sql(f) for f in chart["filters"]],
+        time_column=chart["time_column"],
+        time_range=to_sql(time_range),
+        groupby=chart["groupby"],
+        metrics=select,
+    )
+    order = [f"{column} {'ASC' if ascending else 'DESC'}" for column, ascending in chart["orderby"]
+             if isinstance(column, str)]
+    if order:
+        query += "\nORDER BY " + ", ".join(order)
+
+    conn = connect()
+    try:
+        with conn.cursor(name="export_chart") as cur:
+            cur.itersize = chunk_size
+            cur.execute(query)
+            columns = None
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if columns is None:
+                    columns = [d[0] for d in cur.description]
+                if not rows:
+                    return
+                yield columns, rows
+    finally:
+        conn.close()
+
+def export(chart, department, args):
+    department_id, user_name, department_name = department
+    path = os.path.join(args.output_dir, f"chart{chart['id']}_{department_id}.{args.format}")
+    if args.source == "api":
+        chunks = api_chunks(chart, department_id, user_name, args.time_range, args.chunk_size)
+    else:
+        chunks = db_chunks(chart, department_id, args.time_range, args.chunk_size)
+
+    started = time.perf_counter()
+    if args.format == "parquet":
+        writer = ParquetChunkWriter(path, arrow_types(chart, args.source))
+    else:
+        writer = WRITERS[args.format](path)
+    total = 0
+    try:
+        for columns, rows in chunks:
+            writer.write(columns, rows)
+            total += len(rows)
+            print(f"  {department_name}: {total:,}行 ({total / (time.perf_counter() - started):,.0f}行/秒)")
+    finally:
+        writer.close()
+    print(f"✅ {department_name}: {total:,}行 → {path} ({time.perf_counter() - started:.1f}秒)")
+
+def main():
+    parser = argparse.ArgumentParser(description="チャートデータの部署別ストリーミングエクスポート")
+    parser.add_argument("chart_id", type=int)
+    parser.add_argument("--department", type=int, nargs="+", help="部署ID（省略時は全部署）")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--source", choices=("api", "db"), default="api")
+    parser.add_argument("--time-range", default=NO_FILTER)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dashboard", default=DASHBOARD_ID, help="チャートを含む埋め込み Dashboard（api で Guest Token の認可に使う）")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("チャートデータ エクスポート")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    chart = load_chart(args.chart_id, dashboard_id=args.dashboard)
+    if args.source == "api" and not chart["orderby"]:
+        print("⚠️  並び順が指定されていないチャートのため、ページ間で行が重複・欠落する可能性があります（--source db を推奨）")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    departments = [d for d in DEPARTMENTS if not args.department or d[0] in args.department]
+    print(f"📤 {chart['name']} ({args.source} / {args.format} / {args.time_range}) × {len(departments)}部署")
+    for department in departments:
+        export(chart, department, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Dashboard の全チャートのデータを並列取得
+
+スクリーンショットではなくデータで確認するためのもの。--department を指定するとその部署の
+Guest Token（RLS 適用）で取得するため、埋め込みユーザーが見るのと同じ結果になる。
+
+使い方:
+    python fetch_dashboard_data.py --department 101
+    python fetch_dashboard_data.py --department 102 --time-range "Last 7 days" --filter status=新規,進行中
+    python fetch_dashboard_data.py --format pandas --show 5
+"""
+
+import argparse
+
+from superset_client import login
+from generate_guest_token import DEPARTMENTS, DASHBOARD_ID, generate_guest_token
+from chart_data import fetch_dashboard_data
+
+def parse_filter(text):
+    """col=value または col=v1,v2（IN）を query_context の filter に変換"""
+    column, _, value = text.partition("=")
+    if not column or not value:
+        raise argparse.ArgumentTypeError(f"col=value の形式で指定してください: {text!r}")
+    values = [int(v) if v.lstrip("-").isdigit() else v for v in value.split(",")]
+    if len(values) == 1:
+        return {"col": column, "op": "==", "val": values[0]}
+    return {"col": column, "op": "IN", "val": values}
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard の全チャートのデータを並列取得")
+    parser.add_argument("--dashboard", default=DASHBOARD_ID)
+    parser.add_argument("--department", type=int, choices=[d[0] for d in DEPARTMENTS],
+                        help="この部署の Guest Token で取得（省略時は管理者）")
+    parser.add_argument("--time-range", help="期間の上書き（省略時は Native Filter の既定値）")
+    parser.add_argument("--filter", type=parse_filter, action="append", default=[], help="追加フィルター col=value")
+    parser.add_argument("--format", choices=("records", "pandas", "arrow"), default="records")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--show", type=int, default=0, help="各チャートの先頭 N 行を表示")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Dashboard データ取得")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    guest_token = None
+    if args.department:
+        user_name = next(user for d, user, _ in DEPARTMENTS if d == args.department)
+        guest_token, _ = generate_guest_token(args.department, user_name)
+        print(f"🔑 Guest Token: {user_name}")
+
+    results = fetch_dashboard_data(args.dashboard, guest_token, args.time_range, args.filter, args.format, args.workers)
+
+    for chart_id, result in results.items():
+        chart = result["chart"]
+        if result["error"]:
+            print(f"❌ {chart['name']} (ID: {chart_id}): {result['error']}")
+            continue
+        cached = " (キャッシュ)" if result["is_cached"] else ""
+        print(f"✅ {chart['name']} (ID: {chart_id}, {chart['viz_type']}, {chart['time_range']}): "
+              f"{result['rowcount']}行 {result['seconds']:.2f}秒{cached}")
+        if args.show:
+            data = result["data"]
+            if args.format == "records":
+                for row in data[:args.show]:
+                    print(f"    {row}")
+            elif args.format == "pandas":
+                print(data.head(args.show).to_string())
+            else:
+                print(data.slice(0, args.show))
+
+if __name__ == "__main__":
+    main()
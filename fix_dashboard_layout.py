@@ -4,7 +4,8 @@
 """
 
 import requests
-import json
+
+from dashboard_metadata import patch_dashboard_metadata
 
 SUPERSET_URL = "http://localhost:8088"
 USERNAME = "admin"
@@ -136,21 +137,21 @@ def fix_dashboard_layout(chart_ids):
         },
     }
 
-    update_data = {
-        "position_json": json.dumps(position_json),
-        "json_metadata": json.dumps({"cross_filters_enabled": True}),
-    }
-
-    response = session.put(f"{SUPERSET_URL}/api/v1/dashboard/{DASHBOARD_ID}", json=update_data)
-
-    if response.status_code == 200:
-        print("✅ Dashboardレイアウト修正成功")
-        return True
-    else:
-        print(f"❌ Dashboardレイアウト修正失敗: {response.status_code}")
-        print(f"Response: {response.text}")
+    # json_metadata 全体を上書きすると Native Filter 等が消えるため、必要なキーだけマージ
+    try:
+        patch_dashboard_metadata(
+            DASHBOARD_ID,
+            metadata_patch={"cross_filters_enabled": True},
+            position_json=position_json,
+            http_session=session,
+        )
+    except Exception as e:
+        print(f"❌ Dashboardレイアウト修正失敗: {e}")
         return False
 
+    print("✅ Dashboardレイアウト修正成功")
+    return True
+
 def main():
     print("=" * 60)
     print("Dashboard レイアウト修正スクリプト")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+未使用の Chart / Dataset を検出して削除するスクリプト（ガベージコレクション）
+
+Dashboard・Chart・Dataset を一度ずつ全件取得して参照グラフを構築し、
+- どの Dashboard からも参照されていない Chart
+- どの Chart からも、どの Dashboard の Native Filter（targets の datasetId）からも参照されていない Dataset
+を検出する。削除は依存順（Chart → Dataset）に一括削除APIで実行する。
+
+使い方:
+    python gc_orphans.py            # 検出のみ（ドライラン）
+    python gc_orphans.py --apply    # 実際に削除
+"""
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from superset_client import SUPERSET_URL, session, login, configure_pool, fetch_all, rison_ids
+
+BATCH_SIZE = 50
+WORKERS = 8
+
+def position_chart_ids(position_json):
+    """position_json から chartId を抽出"""
+    if not position_json:
+        return set()
+    position = json.loads(position_json) if isinstance(position_json, str) else position_json
+    return {
+        node["meta"]["chartId"]
+        for node in position.values()
+        if isinstance(node, dict) and node.get("type") == "CHART" and node.get("meta", {}).get("chartId")
+    }
+
+def filter_dataset_ids(json_metadata):
+    """json_metadata の Native Filter が参照する datasetId を抽出"""
+    if not json_metadata:
+        return set()
+    metadata = json.loads(json_metadata) if isinstance(json_metadata, str) else json_metadata
+    return {
+        target["datasetId"]
+        for native_filter in metadata.get("native_filter_configuration", [])
+        for target in native_filter.get("targets", [])
+        if target.get("datasetId")
+    }
+
+def fetch_dashboard_detail(dashboard_id):
+    """Dashboard詳細（position_json / json_metadata）を取得"""
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}")
+    response.raise_for_status()
+    return response.json()["result"]
+
+def build_reference_graph():
+    """
+    参照グラフを構築
+
+    Returns:
+        tuple: (charts, datasets, {chart_id: 参照元Dashboard ID集合},
+                {dataset_id: 参照元Chart ID と ("dashboard", Dashboard ID) の集合})
+    """
+    print("🔍 Dashboard / Chart / Dataset を取得中...")
+    dashboards = fetch_all("dashboard", columns=["id", "dashboard_title"])
+    charts = fetch_all("chart", columns=["id", "slice_name", "datasource_id", "datasource_type", "dashboards.id"])
+    datasets = fetch_all("dataset", columns=["id", "table_name"])
+    print(f"  Dashboard {len(dashboards)}件 / Chart {len(charts)}件 / Dataset {len(datasets)}件")
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        details = list(executor.map(fetch_dashboard_detail, [d["id"] for d in dashboards]))
+
+    chart_refs = {chart["id"]: set() for chart in charts}
+
+    # レイアウト上の参照（position_json の chartId）
+    for detail in details:
+        for chart_id in position_chart_ids(detail.get("position_json")):
+            chart_refs.setdefault(chart_id, set()).add(detail["id"])
+
+    # Dashboard と Chart の関連付け（レイアウト未配置でも所属していれば使用中とみなす）
+    for chart in charts:
+        for dashboard in chart.get("dashboards", []):
+            chart_refs[chart["id"]].add(dashboard["id"])
+
+    dataset_refs = {ds["id"]: set() for ds in datasets}
+    for chart in charts:
+        if chart.get("datasource_type") == "table" and chart["datasource_id"] in dataset_refs:
+            dataset_refs[chart["datasource_id"]].add(chart["id"])
+
+    # Native Filter の対象 Dataset（Chart の削除では未使用にならないよう Dashboard 参照として区別する）
+    for detail in details:
+        for dataset_id in filter_dataset_ids(detail.get("json_metadata")):
+            if dataset_id in dataset_refs:
+                dataset_refs[dataset_id].add(("dashboard", detail["id"]))
+
+    return charts, datasets, chart_refs, dataset_refs
+
+def find_orphans(charts, datasets, chart_refs, dataset_refs):
+    """
+    未使用オブジェクトを検出
+
+    未使用Chartを削除すると、そのChartしか参照していなかったDatasetも未使用になるため
+    Datasetの判定は「削除予定でないChart」からの参照の有無で行う
+    """
+    orphan_charts = [c for c in charts if not chart_refs[c["id"]]]
+    orphan_chart_ids = {c["id"] for c in orphan_charts}
+
+    orphan_datasets = [
+        ds for ds in datasets
+        if not (dataset_refs[ds["id"]] - orphan_chart_ids)
+    ]
+    return orphan_charts, orphan_datasets
+
+def delete_in_batches(resource, ids):
+    """一括削除APIでバッチ削除"""
+    deleted = 0
+    failed = 0
+
+    for i in range(0, len(ids), BATCH_SIZE):
+        batch = ids[i:i + BATCH_SIZE]
+        response = session.delete(
+            f"{SUPERSET_URL}/api/v1/{resource}/",
+            params={"q": rison_ids(batch)},
+        )
+        if response.status_code == 200:
+            deleted += len(batch)
+            print(f"  ✅ {resource} {len(batch)}件削除")
+        else:
+            failed += len(batch)
+            print(f"  ❌ {resource} {len(batch)}件削除失敗: {response.status_code} - {response.text}")
+
+    return deleted, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="未使用 Chart / Dataset のガベージコレクション")
+    parser.add_argument("--apply", action="store_true", help="実際に削除する（省略時はドライラン）")
+    parser.add_argument("--keep-datasets", action="store_true", help="Dataset は削除しない")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("未使用オブジェクト GC")
+    print("=" * 60)
+    print()
+
+    if not login():
+        return
+
+    configure_pool(WORKERS)
+
+    charts, datasets, chart_refs, dataset_refs = build_reference_graph()
+    orphan_charts, orphan_datasets = find_orphans(charts, datasets, chart_refs, dataset_refs)
+    if args.keep_datasets:
+        orphan_datasets = []
+
+    print()
+    print(f"📈 未使用Chart: {len(orphan_charts)}件")
+    for chart in orphan_charts:
+        print(f"  - {chart['slice_name']} (ID: {chart['id']})")
+    print(f"📊 未使用Dataset: {len(orphan_datasets)}件")
+    for ds in orphan_datasets:
+        print(f"  - {ds['table_name']} (ID: {ds['id']})")
+
+    if not args.apply:
+        print()
+        print("ℹ️  ドライランです。削除するには --apply を指定してください")
+        return
+
+    # 依存順: Chart を先に削除しないと Dataset を削除できない
+    print()
+    print("🗑️  削除中...")
+    chart_deleted, chart_failed = delete_in_batches("chart", [c["id"] for c in orphan_charts])
+    if chart_failed:
+        print("⚠️  Chart削除に失敗したため Dataset の削除をスキップします")
+        return
+    dataset_deleted, dataset_failed = delete_in_batches("dataset", [ds["id"] for ds in orphan_datasets])
+
+    print()
+    print(f"結果: Chart {chart_deleted}件 / Dataset {dataset_deleted}件削除 (失敗 {chart_failed + dataset_failed}件)")
+
+if __name__ == "__main__":
+    main()
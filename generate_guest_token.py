@@ -11,14 +11,25 @@ import sys
 SUPERSET_SECRET_KEY = "TEST_NON_DEV_SECRET"  # From docker/.env
 SUPERSET_URL = "http://localhost:8088"
 DASHBOARD_ID = "12"  # Dashboard ID (number, not UUID)
+EMBEDDED_DASHBOARD_UUID = "7aaabc03-2c47-4540-8233-f22bbdb2cc81"  # embedded_dashboards UUID
 
-def generate_guest_token(department_id, username):
+# 部署情報: (部署ID, ユーザー名, 部署名)
+DEPARTMENTS = [
+    (101, "営業部ユーザー", "営業部"),
+    (102, "開発部ユーザー", "開発部"),
+    (103, "マーケティング部ユーザー", "マーケティング部")
+]
+
+def generate_guest_token(department_id, username, dashboard_uuid=EMBEDDED_DASHBOARD_UUID, rls=True, extra_json=None):
     """
     Generate Guest Token with department_id filter
 
     Args:
         department_id: 部署ID (101: 営業部, 102: 開発部, 103: マーケティング部)
         username: ユーザー名
+        dashboard_uuid: 埋め込み Dashboard の UUID
+        rls: department_id の RLS 句を付けるか
+        extra_json: user.extra_json に入れる値（SupersetService の extra_json 方式の検証用）
 
     Returns:
         tuple: (token, embed_url)
@@ -31,14 +42,17 @@ def generate_guest_token(department_id, username):
         },
         "resources": [{
             "type": "dashboard",
-            "id": "7aaabc03-2c47-4540-8233-f22bbdb2cc81"  # Use embedded_dashboards UUID
+            "id": dashboard_uuid  # Use embedded_dashboards UUID
         }],
         "rls": [
             {"clause": f"department_id = {department_id}"}
-        ],
+        ] if rls else [],
         "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=24)
     }
 
+    if extra_json is not None:
+        payload["user"]["extra_json"] = extra_json
+
     token = jwt.encode(payload, SUPERSET_SECRET_KEY, algorithm="HS256")
     # Correct endpoint for Superset 5.0 (without /superset prefix)
     # Add standalone=true to bypass iframe check
@@ -47,19 +61,12 @@ def generate_guest_token(department_id, username):
     return token, embed_url
 
 if __name__ == "__main__":
-    # 部署情報
-    departments = [
-        (101, "営業部ユーザー", "営業部"),
-        (102, "開発部ユーザー", "開発部"),
-        (103, "マーケティング部ユーザー", "マーケティング部")
-    ]
-
     print("=" * 100)
     print("Superset Guest Token Generator - 部署別フィルタリング検証")
     print("=" * 100)
     print()
 
-    for dept_id, user_name, dept_name in departments:
+    for dept_id, user_name, dept_name in DEPARTMENTS:
         token, url = generate_guest_token(dept_id, user_name)
 
         print(f"【{dept_name}】")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+大規模サンプルデータ生成スクリプト
+
+orders / product_test_results に本番規模（1000万行以上）のデータを投入し、
+Dashboard のクエリ挙動をローカルで再現するためのもの。
+
+- NumPy でチャンク単位にベクトル化生成（部署の偏り・曜日/季節変動・不具合スパイク）
+- チャンクごとに別プロセス・別接続で COPY FROM STDIN を並列実行
+- チャンク i の乱数は seed から派生させるため、ワーカー数に関係なく同じデータになる
+
+使い方:
+    python generate_sample_data.py --orders 10000000 --tests 10000000 --workers 8 --truncate
+"""
+
+import argparse
+import datetime
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from db_client import connect
+
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_SIZE = 500000
+
+# 部署ごとの受注比率と平均受注額（営業部に偏る）
+DEPARTMENTS = np.array([101, 102, 103])
+DEPARTMENT_WEIGHTS = np.array([0.5, 0.35, 0.15])
+DEPARTMENT_AMOUNT_MEDIAN = np.array([30000, 25000, 12000])
+
+CUSTOMER_COUNT = 50000
+
+PRODUCTS = [
+    ("iPhone 14", "スマートフォン", 101),
+    ("Galaxy S23", "スマートフォン", 102),
+    ("Pixel 8", "スマートフォン", 103),
+    ("iPad Air", "タブレット", 101),
+    ("Galaxy Tab S9", "タブレット", 102),
+    ("Pixel Tablet", "タブレット", 103),
+    ("AirPods Pro", "オーディオ", 101),
+    ("Galaxy Buds2", "オーディオ", 102),
+]
+BASE_DEFECT_RATE = 0.03
+SPIKES_PER_PRODUCT = 3
+SPIKE_DEFECT_RATE = 0.18
+
+def day_weights(start, days):
+    """曜日・季節変動を反映した日付ごとの重み"""
+    dates = np.datetime64(start) + np.arange(days)
+    weekday = (dates.astype("datetime64[D]").view("int64") + 3) % 7  # 0 = 月曜
+    month = dates.astype("datetime64[M]").astype(int) % 12 + 1
+
+    weights = np.where(weekday >= 5, 0.4, 1.0)                      # 土日は少ない
+    weights *= 1.0 + 0.25 * np.sin(2 * np.pi * (month - 3) / 12)    # 年間の季節変動
+    weights *= np.where(month == 12, 1.5, 1.0)                      # 年末商戦
+    weights *= np.where(month == 3, 1.3, 1.0)                       # 年度末
+    return weights / weights.sum()
+
+def product_spikes(seed, days):
+    """製品ごとの不具合スパイク期間（全チャンク共通）"""
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, max(days - 14, 1), size=(len(PRODUCTS), SPIKES_PER_PRODUCT))
+    lengths = rng.integers(5, 21, size=(len(PRODUCTS), SPIKES_PER_PRODUCT))
+    return starts, starts + lengths
+
+def _to_copy_buffer(columns):
+    """列配列をタブ区切りの COPY テキストに変換"""
+    lines = columns[0].astype(str)
+    for column in columns[1:]:
+        lines = np.char.add(np.char.add(lines, "\t"), column.astype(str))
+    return io.StringIO("\n".join(lines.tolist()) + "\n")
+
+def generate_orders(rng, rows, start, days):
+    weights = day_weights(start, days)
+    day_index = rng.choice(days, size=rows, p=weights)
+    order_date = np.datetime64(start) + day_index
+
+    department_index = rng.choice(len(DEPARTMENTS), size=rows, p=DEPARTMENT_WEIGHTS)
+    amount = np.round(
+        rng.lognormal(np.log(DEPARTMENT_AMOUNT_MEDIAN[department_index]), 0.6), -2
+    ).clip(1000, 9999900)
+
+    # リピーター顧客が多い分布
+    customer = np.minimum(rng.zipf(1.3, size=rows), CUSTOMER_COUNT)
+    customer_name = np.char.add("顧客", customer.astype(str))
+
+    return [order_date, amount, customer_name, DEPARTMENTS[department_index]]
+
+def generate_tests(rng, rows, start, days, spikes):
+    spike_starts, spike_ends = spikes
+    weights = day_weights(start, days)
+    day_index = rng.choice(days, size=rows, p=weights)
+    product_index = rng.integers(0, len(PRODUCTS), size=rows)
+
+    in_spike = (
+        (day_index[:, None] >= spike_starts[product_index])
+        & (day_index[:, None] < spike_ends[product_index])
+    ).any(axis=1)
+    defect_rate = np.where(in_spike, SPIKE_DEFECT_RATE, BASE_DEFECT_RATE)
+    defect_rate = defect_rate * rng.uniform(0.5, 1.5, size=rows)
+
+    tests = rng.integers(50, 201, size=rows)
+    failure = rng.binomial(tests, np.clip(defect_rate, 0, 1))
+
+    names = np.array([p[0] for p in PRODUCTS])
+    categories = np.array([p[1] for p in PRODUCTS])
+    departments = np.array([p[2] for p in PRODUCTS])
+
+    return [
+        np.datetime64(start) + day_index,
+        names[product_index],
+        categories[product_index],
+        departments[product_index],
+        tests - failure,
+        failure,
+    ]
+
+TABLE_COLUMNS = {
+    "orders": ("orders", ("order_date", "amount", "customer_name", "department_id")),
+    "tests": ("product_test_results",
+              ("test_date", "product_name", "product_category", "department_id", "success_count", "failure_count")),
+}
+
+def load_chunk(kind, seed_sequence, rows, start, days, spike_seed):
+    """1チャンク分を生成して COPY（別プロセスで実行）"""
+    rng = np.random.default_rng(seed_sequence)
+    if kind == "orders":
+        columns = generate_orders(rng, rows, start, days)
+    else:
+        columns = generate_tests(rng, rows, start, days, product_spikes(spike_seed, days))
+
+    table, column_names = TABLE_COLUMNS[kind]
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_from(_to_copy_buffer(columns), table, columns=column_names)
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+def load(kind, total_rows, seed, workers, chunk_size, start, days):
+    """チャンクに分割して並列投入"""
+    table = TABLE_COLUMNS[kind][0]
+    chunk_sizes = [min(chunk_size, total_rows - i) for i in range(0, total_rows, chunk_size)]
+    # 種別ごとに独立した乱数列を使う（orders と tests で同じ乱数にならないように）
+    seeds = np.random.SeedSequence([seed, 0 if kind == "orders" else 1]).spawn(len(chunk_sizes))
+
+    print(f"📥 {table}: {total_rows:,}行 ({len(chunk_sizes)}チャンク)")
+    started = time.perf_counter()
+    loaded = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(load_chunk, kind, s, rows, start, days, seed)
+            for s, rows in zip(seeds, chunk_sizes)
+        ]
+        for future in as_completed(futures):
+            loaded += future.result()
+            elapsed = time.perf_counter() - started
+            print(f"  {loaded:>12,}/{total_rows:,}行 ({loaded / elapsed:,.0f}行/秒)")
+
+    print(f"✅ {table} 投入完了 ({time.perf_counter() - started:.1f}秒)")
+
+def main():
+    parser = argparse.ArgumentParser(description="大規模サンプルデータ生成")
+    parser.add_argument("--orders", type=int, default=0, help="orders の行数")
+    parser.add_argument("--tests", type=int, default=0, help="product_test_results の行数")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--start-date", type=datetime.date.fromisoformat,
+                        default=datetime.date.today() - datetime.timedelta(days=730))
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat, default=datetime.date.today())
+    parser.add_argument("--truncate", action="store_true", help="投入前に既存データを削除")
+    args = parser.parse_args()
+
+    days = (args.end_date - args.start_date).days + 1
+
+    print("=" * 60)
+    print("大規模サンプルデータ生成")
+    print("=" * 60)
+    print(f"期間: {args.start_date} 〜 {args.end_date} ({days}日) / seed: {args.seed}")
+    print()
+
+    if args.truncate:
+        conn = connect()
+        try:
+            with conn.cursor() as cur:
+                if args.orders:
+                    cur.execute("TRUNCATE orders RESTART IDENTITY")
+                if args.tests:
+                    cur.execute("TRUNCATE product_test_results RESTART IDENTITY")
+            conn.commit()
+        finally:
+            conn.close()
+        print("🗑️  既存データを削除しました")
+
+    if args.orders:
+        load("orders", args.orders, args.seed, args.workers, args.chunk_size, args.start_date, days)
+    if args.tests:
+        load("tests", args.tests, args.seed, args.workers, args.chunk_size, args.start_date, days)
+
+    print()
+    print("ℹ️  投入後は ANALYZE を実行してください")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Dataset 向けインデックス提案ツール
+
+埋め込み Dashboard のクエリは Guest Token の RLS（department_id = N）と
+Native Filter（order_date / test_date の期間）で必ず絞り込まれるが、
+サンプル DDL には主キー以外のインデックスがないため、部署ごとのクエリが全件スキャンになる。
+
+以下を突き合わせて元テーブルごとにインデックスを提案する:
+- 各 Dataset の SQL（参照している元テーブル）
+- generate_guest_token.py が発行する RLS 句の等価条件カラム
+- 全 Dashboard の Native Filter の対象カラム（期間フィルターは範囲条件）
+- pg_stats の相関係数（挿入順と日付順がほぼ一致する大きなテーブルは BRIN も提案）
+
+使い方:
+    python index_advisor.py                 # 提案のみ（実効クエリの EXPLAIN ANALYZE 付き）
+    python index_advisor.py --apply         # CREATE INDEX CONCURRENTLY で作成し、前後の EXPLAIN ANALYZE を比較
+"""
+
+import argparse
+import json
+import re
+
+from psycopg2 import sql
+
+from db_client import connect
+from superset_client import login, fetch_all, session, SUPERSET_URL
+from dashboard_metadata import get_dashboard
+from dataset_sql import base_tables, is_templated, guest_rls_clauses, rls_columns, build_effective_query
+from generate_guest_token import DEPARTMENTS
+
+RANGE_FILTER_TYPES = {"filter_time", "filter_range"}
+EQUALITY_FILTER_TYPES = {"filter_select"}
+
+# BRIN を提案する条件（相関が高く、btree だと大きくなりすぎるテーブル）
+BRIN_MIN_ROWS = 1000000
+BRIN_MIN_CORRELATION = 0.9
+
+# EXPLAIN 用の代表的な期間（Native Filter の "Last 30 days" 相当）
+SAMPLE_TIME_RANGE = ("CURRENT_DATE - 30", "CURRENT_DATE")
+
+INDEX_COLUMNS_PATTERN = re.compile(r"USING (\w+) \((.*)\)")
+
+def collect_targets():
+    """
+    Dataset ごとのフィルター対象カラムを収集
+
+    Returns:
+        dict: {dataset_id: {"name", "sql", "equality": [...], "range": [...]}}
+    """
+    rls = rls_columns(guest_rls_clauses(DEPARTMENTS[0][0]))
+    datasets = {}
+    for item in fetch_all("dataset", columns=["id"]):
+        response = session.get(f"{SUPERSET_URL}/api/v1/dataset/{item['id']}")
+        response.raise_for_status()
+        detail = response.json()["result"]
+        datasets[item["id"]] = {
+            "name": detail["table_name"],
+            "sql": detail.get("sql") or f"SELECT * FROM {detail['table_name']}",
+            "main_dttm_col": detail.get("main_dttm_col"),
+            # Guest Token の RLS は dataset 指定なしのため全 Dataset に適用される
+            "equality": list(rls),
+            "range": [],
+        }
+
+    for dashboard in fetch_all("dashboard", columns=["id"]):
+        metadata = get_dashboard(dashboard["id"]).json_field("json_metadata")
+        for native_filter in metadata.get("native_filter_configuration", []):
+            for target in native_filter.get("targets", []):
+                dataset = datasets.get(target.get("datasetId"))
+                if not dataset:
+                    continue
+                column = target.get("column", {}).get("name")
+                if native_filter.get("filterType") in RANGE_FILTER_TYPES:
+                    column = column or dataset["main_dttm_col"]
+                    kind = "range"
+                elif native_filter.get("filterType") in EQUALITY_FILTER_TYPES:
+                    kind = "equality"
+                else:
+                    continue
+                if column and column not in dataset[kind]:
+                    dataset[kind].append(column)
+    return datasets
+
+def table_stats(cur, table):
+    """カラム一覧・推定行数・既存インデックス・カラムごとの相関係数"""
+    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s", (table,))
+    columns = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT reltuples::BIGINT FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    rows = row[0] if row else 0
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", (table,))
+    indexes = {}
+    for name, definition in cur.fetchall():
+        match = INDEX_COLUMNS_PATTERN.search(definition)
+        if match:
+            indexes[name] = (match.group(1), [c.strip().strip('"') for c in match.group(2).split(",")])
+    cur.execute("SELECT attname, correlation FROM pg_stats WHERE tablename = %s", (table,))
+    correlation = {name: value for name, value in cur.fetchall() if value is not None}
+    return columns, rows, indexes, correlation
+
+def _covered(indexes, method, columns):
+    """既存インデックスの先頭カラムが提案と一致していれば不要"""
+    return any(m == method and existing[:len(columns)] == columns for m, existing in indexes.values())
+
+def propose(cur, table, equality, ranges):
+    """
+    元テーブルに対するインデックス提案
+
+    等価条件（RLS・選択フィルター）を先頭、範囲条件（期間）を末尾にした複合 btree を基本とし、
+    日付の相関が高い大きなテーブルには BRIN を追加で提案する
+
+    Returns:
+        list: (インデックス名, 方式, カラム, 理由)
+    """
+    columns, rows, indexes, correlation = table_stats(cur, table)
+    equality = [c for c in equality if c in columns]
+    ranges = [c for c in ranges if c in columns]
+
+    candidates = []
+    for range_column in ranges or [None]:
+        key = equality + ([range_column] if range_column else [])
+        if key:
+            reason = "RLS/選択フィルターの等価条件" + (f" + {range_column} の範囲条件" if range_column else "")
+            candidates.append(("btree", key, reason))
+        if range_column and rows >= BRIN_MIN_ROWS and abs(correlation.get(range_column, 0)) >= BRIN_MIN_CORRELATION:
+            candidates.append(("brin", [range_column],
+                               f"{rows:,}行・相関 {correlation[range_column]:.2f}（挿入順と日付順がほぼ一致）"))
+
+    proposals = []
+    for method, key, reason in candidates:
+        if _covered(indexes, method, key):
+            continue
+        name = f"{table}_{'_'.join(key)}_{method}_idx"[:63]
+        proposals.append((name, method, key, reason))
+    return proposals
+
+def _scan_nodes(plan):
+    """実行計画から (ノード種別, テーブル, インデックス) を列挙"""
+    nodes = []
+    if "Relation Name" in plan:
+        nodes.append((plan["Node Type"], plan["Relation Name"], plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+    return nodes
+
+def explain(cur, query):
+    """EXPLAIN ANALYZE を実行して (実行時間ms, スキャンノード) を返す"""
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+    result = cur.fetchone()[0]
+    result = result[0] if isinstance(result, list) else json.loads(result)[0]
+    return result["Execution Time"], _scan_nodes(result["Plan"])
+
+def explain_all(cur, datasets):
+    """Dataset × 部署の実効クエリを EXPLAIN ANALYZE"""
+    results = {}
+    for dataset_id, dataset in datasets.items():
+        for department_id, _, department_name in DEPARTMENTS:
+            query = build_effective_query(
+                dataset["sql"],
+                rls=guest_rls_clauses(department_id),
+                time_column=dataset["range"][0] if dataset["range"] else None,
+                time_range=SAMPLE_TIME_RANGE,
+            )
+            elapsed, nodes = explain(cur, query)
+            results[(dataset_id, department_id)] = (elapsed, nodes)
+            scans = ", ".join(f"{node}({index or table})" for node, table, index in nodes)
+            mark = "⚠️ " if any(node == "Seq Scan" for node, _, _ in nodes) else "✅"
+            print(f"  {mark} {dataset['name']:<32} {department_name:<10} {elapsed:>10.2f}ms  {scans}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset 向けインデックス提案")
+    parser.add_argument("--apply", action="store_true", help="提案したインデックスを作成する")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Dataset インデックス提案")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    print("🔍 Dataset と Native Filter の対象カラムを収集中...")
+    datasets = {}
+    for dataset_id, dataset in collect_targets().items():
+        if is_templated(dataset["sql"]):
+            print(f"  ⚠️  {dataset['name']} は Jinja テンプレートを含むためスキップ")
+            continue
+        datasets[dataset_id] = dataset
+        print(f"  📊 {dataset['name']}: 等価 {dataset['equality']} / 範囲 {dataset['range']}")
+    print()
+
+    # 元テーブルごとにフィルター対象カラムをまとめる
+    tables = {}
+    for dataset in datasets.values():
+        for table in base_tables(dataset["sql"]):
+            equality, ranges = tables.setdefault(table, ([], []))
+            equality.extend(c for c in dataset["equality"] if c not in equality)
+            ranges.extend(c for c in dataset["range"] if c not in ranges)
+
+    # CREATE INDEX CONCURRENTLY はトランザクション外で実行する必要がある
+    conn = connect(autocommit=True)
+    try:
+        with conn.cursor() as cur:
+            proposals = []
+            print("💡 インデックス提案")
+            for table, (equality, ranges) in tables.items():
+                for name, method, key, reason in propose(cur, table, equality, ranges):
+                    proposals.append((table, name, method, key))
+                    print(f"  {table}: {method} ({', '.join(key)}) - {reason}")
+            if not proposals:
+                print("  ✅ 追加が必要なインデックスはありません")
+            print()
+
+            print("⏱️  実効クエリ (EXPLAIN ANALYZE)")
+            before = explain_all(cur, datasets)
+            print()
+
+            if not args.apply or not proposals:
+                if proposals:
+                    print("ℹ️  --apply で作成します")
+                return
+
+            for table, name, method, key in proposals:
+                print(f"🏗️  {name} を作成中...")
+                # method は propose() が返す btree / brin のみ。名前はすべて識別子として引用する
+                cur.execute(sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING {method} ({key})").format(
+                    name=sql.Identifier(name),
+                    table=sql.Identifier(table),
+                    method=sql.SQL(method),
+                    key=sql.SQL(", ").join(map(sql.Identifier, key)),
+                ))
+            for table in {p[0] for p in proposals}:
+                cur.execute(sql.SQL("ANALYZE {table}").format(table=sql.Identifier(table)))
+            print()
+
+            print("⏱️  作成後 (EXPLAIN ANALYZE)")
+            after = explain_all(cur, datasets)
+            print()
+
+            print("📊 前後比較")
+            for dataset_id, department_id in before:
+                b, a = before[(dataset_id, department_id)][0], after[(dataset_id, department_id)][0]
+                print(f"  {datasets[dataset_id]['name']:<32} 部署{department_id}: {b:>10.2f}ms → {a:>10.2f}ms "
+                      f"({b / a if a else 0:.1f}x)")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
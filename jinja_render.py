@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Dataset SQL の Jinja テンプレート事前レンダリング・計測ツール
+
+JINJA_TEMPLATE_INVESTIGATION.md の調査や SupersetService の extra_json.target_department_id のように、
+Dataset SQL の Jinja に依存する構成はテンプレートの誤りが全埋め込みクエリに波及する。
+Superset と同じサンドボックス環境・マクロ（スタブ）でローカルにレンダリングし、部署ごとに
+レンダリング時間・生成 SQL のサイズを計測して、エラーや危険な結果（None の埋め込みなど）を検出する。
+
+- コンパイル済みテンプレートは SQL 文字列ごとにキャッシュ（部署数 × 繰り返し回数分の再パースを避ける）
+- --guest を付けると Superset 5.0 の Guest ユーザーと同じく current_user_id() / extra_json が空になる
+
+使い方:
+    python jinja_render.py                          # Superset 上のテンプレート付き Dataset 全件
+    python jinja_render.py --file dataset.sql       # ローカルの SQL ファイル
+    python jinja_render.py --guest --explain        # Guest ユーザー相当で描画し、EXPLAIN で構文確認
+"""
+
+import argparse
+import re
+import statistics
+import time
+from functools import lru_cache
+
+from jinja2 import StrictUndefined, TemplateError
+from jinja2.sandbox import SandboxedEnvironment
+
+from dataset_sql import is_templated
+from generate_guest_token import DEPARTMENTS
+from time_range import NO_FILTER, resolve
+
+REPEAT = 20
+
+# 文字列リテラル・引用符付き識別子（この中の None / {} は正しい SQL の一部）
+QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+NONE_TOKEN = re.compile(r"\bNone\b")
+# 空の dict、または型名・ARRAY の直後ではない [] （int[] や ARRAY[] は正しい SQL）
+EMPTY_TOKEN = re.compile(r"\{\}|(?<![\w\]])\[\]")
+
+def where_in(values):
+    """Superset の where_in フィルター: ['a', 1] → ('a', 1)"""
+    def quote(value):
+        return str(value) if isinstance(value, (int, float)) else "'" + str(value).replace("'", "''") + "'"
+    return "(" + ", ".join(quote(v) for v in values) + ")"
+
+_environment = SandboxedEnvironment(undefined=StrictUndefined)
+_environment.filters["where_in"] = where_in
+
+@lru_cache(maxsize=256)
+def compile_template(sql):
+    """テンプレートをコンパイル（同じ SQL は再利用）"""
+    return _environment.from_string(sql)
+
+class TimeFilter:
+    """get_time_filter() の戻り値"""
+
+    def __init__(self, start, end, time_range):
+        self.from_expr = f"'{start}'" if start else None
+        self.to_expr = f"'{end}'" if end else None
+        self.time_range = time_range
+
+class GuestUser:
+    """current_user() のスタブ（SupersetService が Guest Token に入れる extra_json を持つ）"""
+
+    def __init__(self, username, extra_json):
+        self.username = username
+        self.extra_json = extra_json
+
+def build_context(department_id, username, filters=(), url_params=None, time_range=NO_FILTER, guest=False):
+    """
+    Superset の Jinja マクロのスタブ
+
+    Args:
+        department_id: 部署ID（extra_json.target_department_id に入る）
+        username: ユーザー名
+        filters: {"col", "op", "val"} 形式の Native Filter / Cross Filter の状態
+        url_params: url_param() が返す値
+        time_range: get_time_filter() が返す期間
+        guest: Superset 5.0 の Guest ユーザーと同じ挙動にする（ID・extra_json なし）
+    """
+    url_params = url_params or {}
+    extra_json = {} if guest else {"target_department_id": department_id}
+
+    def filter_values(column, default=None, remove_filter=False):
+        values = []
+        for f in filters:
+            if f["col"] == column and f["op"] in ("IN", "=="):
+                values.extend(f["val"] if isinstance(f["val"], list) else [f["val"]])
+        return values or (default or [])
+
+    def get_filters(column, remove_filter=False):
+        return [dict(f) for f in filters if f["col"] == column]
+
+    def get_time_filter(column=None, default=None, target_type=None, strftime=None, remove_filter=False):
+        start, end = resolve(time_range if time_range != NO_FILTER else (default or NO_FILTER))
+        return TimeFilter(start, end, time_range)
+
+    return {
+        "current_user_id": lambda add_to_cache_keys=True: None if guest else department_id,
+        "current_username": lambda add_to_cache_keys=True: username,
+        "current_user_email": lambda add_to_cache_keys=True: None,
+        "current_user": lambda: GuestUser(username, extra_json),
+        "extra_json": extra_json,
+        "url_param": lambda param, default=None, add_to_cache_keys=True, escape_result=True: url_params.get(param, default),
+        "filter_values": filter_values,
+        "get_filters": get_filters,
+        "get_time_filter": get_time_filter,
+        "cache_key_wrapper": lambda value: value,
+    }
+
+def check_rendered(sql):
+    """レンダリング結果の危険なパターン"""
+    problems = []
+    bare = QUOTED.sub("''", sql)
+    if NONE_TOKEN.search(bare):
+        problems.append("None が埋め込まれている（Guest ユーザーでは値が取れないマクロの可能性）")
+    if EMPTY_TOKEN.search(bare):
+        problems.append("空の dict / list が埋め込まれている")
+    return problems
+
+def render(sql, context, repeat=REPEAT):
+    """
+    テンプレートをレンダリングして計測
+
+    テンプレート内の実行時エラー（None との演算の TypeError や期間の解析エラーなど）も失敗として返す
+
+    Returns:
+        dict: rendered, render_ms（中央値）, size, error, problems
+    """
+    try:
+        template = compile_template(sql)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rendered = template.render(**context)
+            timings.append(time.perf_counter() - started)
+    except Exception as e:
+        return {"rendered": None, "render_ms": None, "size": 0, "error": f"{type(e).__name__}: {e}", "problems": []}
+    return {
+        "rendered": rendered,
+        "render_ms": statistics.median(timings) * 1000,
+        "size": len(rendered.encode()),
+        "error": None,
+        "problems": check_rendered(rendered),
+    }
+
+def load_templates(path):
+    """対象テンプレート: {名前: SQL}"""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return {path: f.read()}
+
+    from superset_client import login, fetch_all
+    from chart_data import get_dataset
+
+    if not login():
+        return {}
+    templates = {}
+    for item in fetch_all("dataset", columns=["id"]):
+        dataset = get_dataset(item["id"])
+        if dataset.get("sql") and is_templated(dataset["sql"]):
+            templates[dataset["table_name"]] = dataset["sql"]
+    return templates
+
+def explain(conn, sql):
+    """EXPLAIN で構文・参照カラムを確認（実行はしない）"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN " + sql)
+        return None
+    except Exception as e:
+        return str(e).strip().splitlines()[0]
+    finally:
+        conn.rollback()
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset SQL の Jinja テンプレート事前レンダリング")
+    parser.add_argument("--file", help="ローカルの SQL テンプレート")
+    parser.add_argument("--guest", action="store_true", help="Superset 5.0 の Guest ユーザーと同じ挙動で描画")
+    parser.add_argument("--time-range", default="Last 30 days", help="get_time_filter() に渡す期間")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--explain", action="store_true", help="描画結果を EXPLAIN して構文を確認")
+    parser.add_argument("--show-sql", action="store_true")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Jinja テンプレート事前レンダリング")
+    print("=" * 60)
+
+    templates = load_templates(args.file)
+    if not templates:
+        print("ℹ️  Jinja テンプレートを含む Dataset はありません")
+        return
+
+    conn = None
+    if args.explain:
+        from db_client import connect
+        conn = connect()
+
+    failed = 0
+    try:
+        for name, sql in templates.items():
+            compile_started = time.perf_counter()
+            try:
+                compile_template(sql)
+                print(f"📄 {name} (コンパイル {(time.perf_counter() - compile_started) * 1000:.2f}ms)")
+            except TemplateError as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+                continue
+
+            for department_id, user_name, department_name in DEPARTMENTS:
+                context = build_context(department_id, user_name, time_range=args.time_range, guest=args.guest)
+                result = render(sql, context, args.repeat)
+                if result["error"]:
+                    failed += 1
+                    print(f"  ❌ {department_name}: {result['error']}")
+                    continue
+
+                problems = result["problems"]
+                if conn:
+                    error = explain(conn, result["rendered"])
+                    if error:
+                        problems.append(f"EXPLAIN 失敗: {error}")
+                failed += bool(problems)
+                mark = "⚠️ " if problems else "✅"
+                print(f"  {mark} {department_name:<12} {result['render_ms']:>8.3f}ms  {result['size']:>8,} bytes")
+                for problem in problems:
+                    print(f"      {problem}")
+                if args.show_sql:
+                    print("      " + result["rendered"].strip().replace("\n", "\n      "))
+    finally:
+        if conn:
+            conn.close()
+
+    print()
+    print(f"📊 {len(templates)}テンプレート × {len(DEPARTMENTS)}部署 / 問題 {failed}件")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Native Filter ビルダー
+
+Dashboard のレイアウト (position_json) と所属 Chart・Dataset を読み込み、
+各フィルターの chartsInScope / tabsInScope / scope.excluded を自動計算する。
+カスケード（親子）フィルターも定義でき、全フィルターを検証してから1回の更新で反映する。
+
+- 対象カラムを持たない Dataset の Chart はスコープから除外（不要なクエリ再実行を防ぐ）
+- datasetId は対象カラムを持つ Dataset から自動解決（ハードコード不要）
+
+使い方:
+    python native_filter_builder.py --dashboard 15 --config filters.json
+
+filters.json の例:
+    [
+      {"id": "NATIVE_FILTER-period", "name": "期間フィルター", "column": "test_date", "type": "filter_time"},
+      {"id": "NATIVE_FILTER-category", "name": "カテゴリ", "column": "product_category", "type": "filter_select"},
+      {"id": "NATIVE_FILTER-product", "name": "製品", "column": "product_name", "type": "filter_select",
+       "parent": "NATIVE_FILTER-category"}
+    ]
+"""
+
+import argparse
+import json
+
+from superset_client import SUPERSET_URL, session, login
+from chart_builders import NativeFilterSpec
+from dashboard_metadata import get_dashboard, patch_dashboard_metadata
+
+# カスケード可能なフィルター種別（値の選択肢を親フィルターで絞り込めるもの）
+CASCADE_TYPES = ("filter_select",)
+
+class DashboardLayout:
+    """Dashboard のレイアウトと Chart・Dataset の情報"""
+
+    def __init__(self, position, charts, dataset_columns):
+        self.position = position
+        self.charts = charts                    # {chart_id: dataset_id}
+        self.dataset_columns = dataset_columns  # {dataset_id: set(column_name)}
+
+        # children から親を逆引き（position_json の parents は欠けていることがあるため使わない）
+        self.parent_of = {}
+        for node_id, node in position.items():
+            if isinstance(node, dict):
+                for child in node.get("children", []):
+                    self.parent_of[child] = node_id
+
+        self.chart_nodes = {
+            node["meta"]["chartId"]: node_id
+            for node_id, node in position.items()
+            if isinstance(node, dict) and node.get("type") == "CHART" and node.get("meta", {}).get("chartId")
+        }
+
+    def ancestors(self, node_id):
+        result = []
+        while node_id in self.parent_of:
+            node_id = self.parent_of[node_id]
+            result.append(node_id)
+        return result
+
+    def charts_under(self, root_path):
+        """rootPath 配下に配置されている Chart ID"""
+        roots = set(root_path)
+        return {
+            chart_id for chart_id, node_id in self.chart_nodes.items()
+            if chart_id in self.charts and (node_id in roots or roots & set(self.ancestors(node_id)))
+        }
+
+    def tabs_of(self, chart_ids):
+        """Chart を含む TAB ノード ID"""
+        tabs = set()
+        for chart_id in chart_ids:
+            for node_id in self.ancestors(self.chart_nodes[chart_id]):
+                if self.position.get(node_id, {}).get("type") == "TAB":
+                    tabs.add(node_id)
+        return sorted(tabs)
+
+    def datasets_with(self, column):
+        return sorted(ds_id for ds_id, columns in self.dataset_columns.items() if column in columns)
+
+def load_layout(dashboard_id):
+    """Dashboard のレイアウト・Chart・Dataset カラムを取得"""
+    dashboard = get_dashboard(dashboard_id)
+    position = dashboard.json_field("position_json")
+
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/charts")
+    response.raise_for_status()
+    charts = {}
+    for chart in response.json()["result"]:
+        datasource = chart.get("form_data", {}).get("datasource", "")
+        if datasource.endswith("__table"):
+            charts[chart["id"]] = int(datasource.split("__")[0])
+
+    dataset_columns = {}
+    for dataset_id in set(charts.values()):
+        response = session.get(f"{SUPERSET_URL}/api/v1/dataset/{dataset_id}")
+        response.raise_for_status()
+        dataset_columns[dataset_id] = {c["column_name"] for c in response.json()["result"]["columns"]}
+
+    return DashboardLayout(position, charts, dataset_columns)
+
+class NativeFilterPlan:
+    """複数の Native Filter を組み立てて一括で検証・反映する"""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.definitions = []
+
+    def add(self, filter_id, name, column, filter_type="filter_time", parent=None, dataset_id=None,
+            default_value=None, root_path=("ROOT_ID",), control_values=None):
+        self.definitions.append({
+            "id": filter_id,
+            "name": name,
+            "column": column,
+            "type": filter_type,
+            "parent": parent,
+            "dataset_id": dataset_id,
+            "default_value": default_value,
+            "root_path": list(root_path),
+            "control_values": control_values,
+        })
+        return self
+
+    def validate(self):
+        """定義全体を検証（エラーメッセージのリストを返す）"""
+        errors = []
+        ids = [d["id"] for d in self.definitions]
+        by_id = {d["id"]: d for d in self.definitions}
+
+        for filter_id in {i for i in ids if ids.count(i) > 1}:
+            errors.append(f"{filter_id}: id が重複しています")
+
+        for definition in self.definitions:
+            filter_id = definition["id"]
+            candidates = self.layout.datasets_with(definition["column"])
+            if definition["dataset_id"] is not None and definition["dataset_id"] not in candidates:
+                errors.append(f"{filter_id}: Dataset {definition['dataset_id']} にカラム {definition['column']} がありません")
+            elif not candidates:
+                errors.append(f"{filter_id}: カラム {definition['column']} を持つ Dataset が Dashboard にありません")
+
+            parent = definition["parent"]
+            if parent is None:
+                continue
+            if parent not in by_id:
+                errors.append(f"{filter_id}: 親フィルター {parent} が定義されていません")
+                continue
+            if definition["type"] not in CASCADE_TYPES or by_id[parent]["type"] not in CASCADE_TYPES:
+                errors.append(f"{filter_id}: カスケードは {', '.join(CASCADE_TYPES)} 同士のみ設定できます")
+
+        # 親子関係の循環検出
+        for definition in self.definitions:
+            seen = {definition["id"]}
+            parent = definition["parent"]
+            while parent in by_id:
+                if parent in seen:
+                    errors.append(f"{definition['id']}: カスケードが循環しています")
+                    break
+                seen.add(parent)
+                parent = by_id[parent]["parent"]
+
+        return errors
+
+    def build(self):
+        """スコープを計算して NativeFilterSpec のリストを返す"""
+        errors = self.validate()
+        if errors:
+            raise ValueError("\n".join(errors))
+
+        specs = []
+        for definition in self.definitions:
+            column = definition["column"]
+            dataset_id = definition["dataset_id"] or self.layout.datasets_with(column)[0]
+
+            candidates = self.layout.charts_under(definition["root_path"])
+            in_scope = sorted(
+                chart_id for chart_id in candidates
+                if column in self.layout.dataset_columns.get(self.layout.charts[chart_id], ())
+            )
+            excluded = sorted(set(self.layout.charts) - set(in_scope))
+
+            specs.append(NativeFilterSpec(
+                definition["id"],
+                definition["name"],
+                dataset_id,
+                column,
+                filter_type=definition["type"],
+                default_value=definition["default_value"],
+                control_values=definition["control_values"],
+                cascade_parent_ids=[definition["parent"]] if definition["parent"] else [],
+                charts_in_scope=in_scope,
+                tabs_in_scope=self.layout.tabs_of(in_scope),
+                root_path=definition["root_path"],
+                excluded=excluded,
+            ))
+        return specs
+
+    def apply(self, dashboard_id, metadata_patch=None):
+        """検証済みの全フィルターを1回の更新で反映"""
+        specs = self.build()
+        patch_dashboard_metadata(dashboard_id, metadata_patch, native_filters=[spec.to_dict() for spec in specs])
+        return specs
+
+def main():
+    parser = argparse.ArgumentParser(description="Native Filter ビルダー")
+    parser.add_argument("--dashboard", type=int, required=True)
+    parser.add_argument("--config", required=True, help="フィルター定義の JSON ファイル")
+    parser.add_argument("--dry-run", action="store_true", help="スコープ計算結果の表示のみ")
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        definitions = json.load(f)
+
+    print("=" * 60)
+    print("Native Filter ビルダー")
+    print("=" * 60)
+    print()
+
+    if not login():
+        return
+
+    layout = load_layout(args.dashboard)
+    print(f"📊 Chart {len(layout.charts)}件 / Dataset {len(layout.dataset_columns)}件")
+
+    plan = NativeFilterPlan(layout)
+    for d in definitions:
+        plan.add(
+            d["id"], d["name"], d["column"],
+            filter_type=d.get("type", "filter_time"),
+            parent=d.get("parent"),
+            dataset_id=d.get("dataset_id"),
+            default_value=d.get("default"),
+            root_path=d.get("root_path", ["ROOT_ID"]),
+        )
+
+    try:
+        specs = plan.build() if args.dry_run else plan.apply(args.dashboard)
+    except ValueError as e:
+        print("❌ フィルター定義が不正です:")
+        print(e)
+        return
+
+    for spec in specs:
+        print(f"  🔍 {spec.name} ({spec.filter_id}): chartsInScope={spec.charts_in_scope} tabsInScope={spec.tabs_in_scope}")
+
+    print()
+    print("ℹ️  ドライランのため反映していません" if args.dry_run else "✅ フィルター反映完了")
+
+if __name__ == "__main__":
+    main()
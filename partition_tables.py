@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+orders / product_test_results の月次レンジパーティション化ツール
+
+全 Dataset が order_date / test_date の期間フィルター（"Last 30 days" など）で絞り込むため、
+月次パーティションにすると直近期間のクエリは該当月のパーティションだけを読む（パーティションプルーニング）。
+
+移行中の元テーブルへの INSERT / UPDATE / DELETE はトリガーで {table}_migration_changes に主キーを記録し、
+移行の各回と入れ替え時（書き込みを止めた状態）に反映するため、コピー済みの行への変更も失われない。
+
+使い方:
+    python partition_tables.py create               # パーティションテーブル作成（既存データの期間 + 先3ヶ月分）
+    python partition_tables.py migrate              # 既存データをバッチで移行（中断しても再実行で続きから）
+    python partition_tables.py migrate --swap       # 移行完了後にテーブル名を入れ替え
+    python partition_tables.py maintain             # 先の月のパーティションを作成（cron で月次実行）
+    python partition_tables.py benchmark            # パーティション有無で EXPLAIN ANALYZE を比較
+"""
+
+import argparse
+import datetime
+import json
+
+from psycopg2 import sql
+
+from db_client import connect
+
+# テーブル名: (主キー, パーティションキー)
+TABLES = {
+    "orders": ("order_id", "order_date"),
+    "product_test_results": ("id", "test_date"),
+}
+PARTITIONED_SUFFIX = "_partitioned"
+LEGACY_SUFFIX = "_unpartitioned"
+MONTHS_AHEAD = 3
+BATCH_SIZE = 100000
+CHANGES_SUFFIX = "_migration_changes"
+CAPTURE_TRIGGER = "partition_migration_capture"
+
+# 元テーブルの変更された主キーを記録（TG_ARGV: 主キーカラム名, 記録先テーブル名）
+CAPTURE_FUNCTION = """
+CREATE OR REPLACE FUNCTION capture_migration_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        EXECUTE format('INSERT INTO %I (pk) VALUES (($1 ->> %L)::BIGINT)', TG_ARGV[1], TG_ARGV[0]) USING to_jsonb(NEW);
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        EXECUTE format('INSERT INTO %I (pk) VALUES (($1 ->> %L)::BIGINT)', TG_ARGV[1], TG_ARGV[0]) USING to_jsonb(OLD);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+def month_start(date):
+    return date.replace(day=1)
+
+def add_months(date, months):
+    month = date.month - 1 + months
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+def partitioned_name(table):
+    return table + PARTITIONED_SUFFIX
+
+def changes_name(table):
+    return table + CHANGES_SUFFIX
+
+def install_capture(cur, table, pk):
+    """元テーブルに変更記録トリガーを設置（移行開始前に必要）"""
+    ident = {"table": sql.Identifier(table), "changes": sql.Identifier(changes_name(table)),
+             "trigger": sql.Identifier(CAPTURE_TRIGGER)}
+    cur.execute(CAPTURE_FUNCTION)
+    cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {changes} (pk BIGINT NOT NULL)").format(**ident))
+    cur.execute(sql.SQL("DROP TRIGGER IF EXISTS {trigger} ON {table}").format(**ident))
+    cur.execute(sql.SQL("""
+        CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION capture_migration_changes(%s, %s)
+    """).format(**ident), (pk, changes_name(table)))
+
+def _has_capture(cur, table):
+    cur.execute("SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND tgname = %s", (table, CAPTURE_TRIGGER))
+    return cur.fetchone() is not None
+
+def apply_changes(cur, table, pk, upto=None):
+    """
+    記録された変更をパーティションテーブルに反映（変更された主キーの行を削除して元テーブルから入れ直す）
+
+    upto: これ以下の主キーだけを反映（未コピーの範囲の行を先に入れるとバッチの再開位置がずれるため）
+
+    Returns:
+        int: 反映した主キー数
+    """
+    ident = {
+        "table": sql.Identifier(table),
+        "parent": sql.Identifier(partitioned_name(table)),
+        "changes": sql.Identifier(changes_name(table)),
+        "pk": sql.Identifier(pk),
+    }
+    condition = sql.SQL("WHERE pk <= %(upto)s") if upto is not None else sql.SQL("")
+    cur.execute("DROP TABLE IF EXISTS changed_keys")
+    cur.execute("CREATE TEMP TABLE changed_keys (pk BIGINT PRIMARY KEY) ON COMMIT DROP")
+    cur.execute(sql.SQL("""
+        WITH taken AS (DELETE FROM {changes} {condition} RETURNING pk)
+        INSERT INTO changed_keys SELECT DISTINCT pk FROM taken
+    """).format(condition=condition, **ident), {"upto": upto})
+    count = cur.rowcount
+    cur.execute(sql.SQL("DELETE FROM {parent} p USING changed_keys c WHERE p.{pk} = c.pk").format(**ident))
+    cur.execute(sql.SQL("INSERT INTO {parent} SELECT t.* FROM {table} t JOIN changed_keys c ON t.{pk} = c.pk").format(**ident))
+    return count
+
+def _date_range(cur, table, date_column):
+    cur.execute(sql.SQL("SELECT MIN({col}), MAX({col}) FROM {table}").format(
+        col=sql.Identifier(date_column), table=sql.Identifier(table)))
+    return cur.fetchone()
+
+def ensure_partition(cur, table, parent, month):
+    """
+    月次パーティションを作成（既存なら何もしない）
+
+    パーティション名は論理テーブル名から付ける（テーブル名入れ替え後も同じ名前で管理できるように）。
+    DEFAULT パーティションに該当期間の行がある場合も失敗しないよう、
+    独立テーブルとして作成 → DEFAULT から行を移動 → ATTACH の順で行う
+    """
+    name = partition_name(table, month)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0]:
+        return False
+
+    _, date_column = TABLES[table]
+    params = {"from": month, "to": add_months(month, 1)}
+    ident = {
+        "parent": sql.Identifier(parent),
+        "name": sql.Identifier(name),
+        "default": sql.Identifier(f"{table}_default"),
+        "col": sql.Identifier(date_column),
+    }
+
+    cur.execute(sql.SQL("CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(**ident))
+    cur.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {default} WHERE {col} >= %(from)s AND {col} < %(to)s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """).format(**ident), params)
+    cur.execute(sql.SQL("ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%(from)s) TO (%(to)s)").format(**ident), params)
+    return True
+
+def create(conn):
+    """パーティションテーブルを作成"""
+    today = datetime.date.today()
+    with conn.cursor() as cur:
+        for table, (pk, date_column) in TABLES.items():
+            parent = partitioned_name(table)
+            print(f"🏗️  {parent} を作成中...")
+            ident = {
+                "parent": sql.Identifier(parent),
+                "table": sql.Identifier(table),
+                "pk": sql.Identifier(pk),
+                "col": sql.Identifier(date_column),
+                "default": sql.Identifier(f"{table}_default"),
+            }
+            # 主キーにはパーティションキーを含める必要がある
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {parent} (
+                    LIKE {table} INCLUDING DEFAULTS,
+                    PRIMARY KEY ({pk}, {col})
+                ) PARTITION BY RANGE ({col});
+                CREATE TABLE IF NOT EXISTS {default} PARTITION OF {parent} DEFAULT;
+            """).format(**ident))
+            # 移行前に元テーブルの変更記録を開始する
+            install_capture(cur, table, pk)
+            # RLS (department_id) + 期間フィルター用（各パーティションに伝播する）
+            cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {idx} ON {parent} (department_id, {col})").format(
+                idx=sql.Identifier(f"{parent}_dept_date_idx"), **ident))
+
+            first, _ = _date_range(cur, table, date_column)
+            month = month_start(first or today)
+            created = 0
+            while month <= add_months(month_start(today), MONTHS_AHEAD):
+                created += ensure_partition(cur, table, parent, month)
+                month = add_months(month, 1)
+            print(f"✅ {parent}: パーティション {created}件作成")
+    conn.commit()
+
+def _copy_batches(conn, table, pk):
+    """主キー順にバッチで移行（移行済みの最大キーから再開）"""
+    parent = partitioned_name(table)
+    ident = {"parent": sql.Identifier(parent), "table": sql.Identifier(table), "pk": sql.Identifier(pk)}
+    moved = 0
+
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("SELECT COALESCE(MAX({pk}), 0) FROM {parent}").format(**ident))
+            last = cur.fetchone()[0]
+            cur.execute(sql.SQL("""
+                INSERT INTO {parent}
+                SELECT * FROM {table}
+                WHERE {pk} > %(last)s AND {pk} <= %(last)s + %(batch)s
+            """).format(**ident), {"last": last, "batch": BATCH_SIZE})
+            count = cur.rowcount
+
+            if count == 0:
+                cur.execute(sql.SQL("SELECT MIN({pk}) FROM {table} WHERE {pk} > %s").format(**ident), (last,))
+                next_key = cur.fetchone()[0]
+                if next_key is None:
+                    conn.commit()
+                    return moved
+                # 主キーの欠番が BATCH_SIZE 以上続く場合は次の既存キーまで飛ばす
+                cur.execute(sql.SQL("""
+                    INSERT INTO {parent}
+                    SELECT * FROM {table}
+                    WHERE {pk} >= %(next)s AND {pk} < %(next)s + %(batch)s
+                """).format(**ident), {"next": next_key, "batch": BATCH_SIZE})
+                count = cur.rowcount
+        conn.commit()
+        moved += count
+        print(f"  {table}: {moved:,}行移行")
+
+def migrate(conn, swap):
+    """既存データを移行（--swap で最終同期とテーブル名の入れ替え）"""
+    for table, (pk, _) in TABLES.items():
+        with conn.cursor() as cur:
+            if not _has_capture(cur, table):
+                raise RuntimeError(f"{table} に変更記録トリガーがありません。先に create を実行してください")
+        print(f"🚚 {table} → {partitioned_name(table)} を移行中...")
+        moved = _copy_batches(conn, table, pk)
+        # コピー済みの範囲への更新・削除を反映（入れ替え時のロック時間を短くするため）
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("SELECT COALESCE(MAX({pk}), 0) FROM {parent}").format(
+                pk=sql.Identifier(pk), parent=sql.Identifier(partitioned_name(table))))
+            changed = apply_changes(cur, table, pk, upto=cur.fetchone()[0])
+        conn.commit()
+        print(f"✅ {table}: {moved:,}行移行 / 移行中の変更 {changed:,}件を反映")
+
+    if not swap:
+        return
+
+    print("🔁 テーブル名を入れ替え中...")
+    with conn.cursor() as cur:
+        for table, (pk, _) in TABLES.items():
+            parent = partitioned_name(table)
+            ident = {
+                "table": sql.Identifier(table),
+                "parent": sql.Identifier(parent),
+                "legacy": sql.Identifier(table + LEGACY_SUFFIX),
+                "pk": sql.Identifier(pk),
+            }
+            # 移行中に追加された行と、コピー済みの行への更新・削除を書き込みを止めた状態で同期
+            cur.execute(sql.SQL("LOCK TABLE {table} IN EXCLUSIVE MODE").format(**ident))
+            cur.execute(sql.SQL("""
+                INSERT INTO {parent}
+                SELECT * FROM {table} WHERE {pk} > (SELECT COALESCE(MAX({pk}), 0) FROM {parent})
+            """).format(**ident))
+            apply_changes(cur, table, pk)
+            cur.execute(sql.SQL("DROP TRIGGER {trigger} ON {table}").format(trigger=sql.Identifier(CAPTURE_TRIGGER), **ident))
+            cur.execute(sql.SQL("DROP TABLE {changes}").format(changes=sql.Identifier(changes_name(table))))
+
+            # SERIAL のシーケンスを新テーブルへ付け替え
+            cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, pk))
+            sequence = cur.fetchone()[0]
+
+            cur.execute(sql.SQL("ALTER TABLE {table} RENAME TO {legacy}").format(**ident))
+            cur.execute(sql.SQL("ALTER TABLE {parent} RENAME TO {table}").format(**ident))
+            if sequence:
+                cur.execute(sql.SQL("ALTER TABLE {table} ALTER COLUMN {pk} SET DEFAULT nextval(%s::regclass)").format(**ident), (sequence,))
+                cur.execute(sql.SQL("ALTER SEQUENCE {seq} OWNED BY {table}.{pk}").format(
+                    seq=sql.SQL(sequence), **ident))
+            print(f"  ✅ {table} (旧テーブルは {table + LEGACY_SUFFIX})")
+    conn.commit()
+    # orders_with_status の変更キューのトリガーは旧テーブルに残るため付け直す
+    print("ℹ️  orders_with_status を使っている場合は python refresh_orders_status.py --init でトリガーを付け直してください")
+
+def maintain(conn):
+    """先の月のパーティションを作成（cron で月次実行）"""
+    today = datetime.date.today()
+    with conn.cursor() as cur:
+        for table in TABLES:
+            parent = table if _is_partitioned(cur, table) else partitioned_name(table)
+            created = 0
+            for offset in range(MONTHS_AHEAD + 1):
+                created += ensure_partition(cur, table, parent, add_months(month_start(today), offset))
+            print(f"✅ {parent}: パーティション {created}件作成")
+    conn.commit()
+
+def _is_partitioned(cur, table):
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+def _scanned_relations(plan):
+    """実行計画から実際にスキャンしたテーブルを列挙"""
+    relations = []
+    if "Relation Name" in plan:
+        relations.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        relations.extend(_scanned_relations(child))
+    return relations
+
+def benchmark(conn, days):
+    """直近 N 日の集計クエリをパーティション有無で比較"""
+    print(f"⏱️  直近 {days} 日の集計クエリ (EXPLAIN ANALYZE)")
+    print()
+    with conn.cursor() as cur:
+        for table, (_, date_column) in TABLES.items():
+            if _is_partitioned(cur, table):
+                pairs = [(table + LEGACY_SUFFIX, "パーティションなし"), (table, "パーティションあり")]
+            else:
+                pairs = [(table, "パーティションなし"), (partitioned_name(table), "パーティションあり")]
+
+            for relation, label in pairs:
+                cur.execute(sql.SQL("""
+                    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+                    SELECT department_id, COUNT(*) FROM {table}
+                    WHERE {col} >= CURRENT_DATE - %(days)s
+                    GROUP BY department_id
+                """).format(table=sql.Identifier(relation), col=sql.Identifier(date_column)), {"days": days})
+                result = cur.fetchone()[0]
+                result = result[0] if isinstance(result, list) else json.loads(result)[0]
+                plan = result["Plan"]
+                scanned = _scanned_relations(plan)
+                print(f"  {relation:<40} {label:<12} {result['Execution Time']:>10.2f}ms "
+                      f"スキャン {len(scanned)}テーブル / shared hit+read "
+                      f"{plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)}ブロック")
+            print()
+
+def main():
+    parser = argparse.ArgumentParser(description="月次レンジパーティション化ツール")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("create", help="パーティションテーブル作成")
+    migrate_parser = subparsers.add_parser("migrate", help="既存データ移行")
+    migrate_parser.add_argument("--swap", action="store_true", help="移行後にテーブル名を入れ替え")
+    subparsers.add_parser("maintain", help="先の月のパーティション作成")
+    bench_parser = subparsers.add_parser("benchmark", help="パーティションプルーニングの比較")
+    bench_parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.command == "create":
+            create(conn)
+        elif args.command == "migrate":
+            migrate(conn, args.swap)
+        elif args.command == "maintain":
+            maintain(conn)
+        else:
+            benchmark(conn, args.days)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
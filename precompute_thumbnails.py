@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Dashboard / Chart のサムネイル・スクリーンショットの一括事前計算
+
+check_embedded.py などの Playwright スクリーンショットは1ページずつ描画するため、一覧やプレビュー用の
+画像を揃えるには向かない。Superset の THUMBNAILS 機能（Celery ワーカーでの描画・キャッシュ）に
+全 Dashboard / Chart の計算をまとめて依頼し、完成したものから取得してコンテンツアドレス方式で保存する。
+
+- thumbnail:  一覧 API の thumbnail_url を GET（未計算なら 202 で計算が始まり、完成すると 200 で画像が返る）
+- screenshot: cache_screenshot / cache_dashboard_screenshot で計算を依頼し、image_url を 404 の間ポーリング
+- 依頼は同時実行数を制限して一括で送り、未完成のものだけを指数バックオフでまとめて再確認する
+- thumbnail_url のダイジェストが前回と同じで画像が保存済みなら取得しない
+
+保存先: thumbnails/objects/（content_store.py）、一覧は thumbnails/index.json
+
+使い方:
+    python precompute_thumbnails.py                          # 全 Dashboard / Chart のサムネイル
+    python precompute_thumbnails.py --kind screenshot --resource dashboard --workers 2
+    python precompute_thumbnails.py --force                  # キャッシュ済みでも再計算
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from superset_client import SUPERSET_URL, session, login, configure_pool, fetch_all
+from content_store import put_blob, has_blob
+
+THUMBNAIL_DIR = "thumbnails"
+INDEX_PATH = os.path.join(THUMBNAIL_DIR, "index.json")
+DEFAULT_WORKERS = 4
+POLL_INTERVAL = 2.0
+MAX_POLL_INTERVAL = 30.0
+TIMEOUT = 600
+
+TITLE_COLUMNS = {"dashboard": "dashboard_title", "chart": "slice_name"}
+FORCE = "(force:!t)"
+
+def load_index():
+    if not os.path.exists(INDEX_PATH):
+        return {}
+    with open(INDEX_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_index(index):
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    with open(INDEX_PATH, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+def list_targets(resources, kind):
+    """対象の Dashboard / Chart（thumbnail は thumbnail_url があるものだけ）"""
+    targets = []
+    for resource in resources:
+        title = TITLE_COLUMNS[resource]
+        for item in fetch_all(resource, columns=["id", title, "thumbnail_url"]):
+            if kind == "thumbnail" and not item.get("thumbnail_url"):
+                continue
+            targets.append({
+                "key": f"{kind}/{resource}/{item['id']}",
+                "resource": resource,
+                "id": item["id"],
+                "title": item[title],
+                "thumbnail_url": item.get("thumbnail_url"),
+            })
+    return targets
+
+def _image(response):
+    """画像が返っていれば bytes、計算中なら None"""
+    if response.status_code in (202, 404):
+        return None
+    response.raise_for_status()
+    if not response.headers.get("Content-Type", "").startswith("image/"):
+        raise RuntimeError(f"画像以外の応答です: {response.headers.get('Content-Type')}")
+    return response.content
+
+def request_image(target, kind, force):
+    """
+    計算を依頼する（すでにキャッシュされていればその画像を返す）
+
+    Returns:
+        tuple: (ポーリングする URL, そのクエリパラメータ, 画像 bytes または None)
+    """
+    params = {"q": FORCE} if force else {}
+    if kind == "thumbnail":
+        url = f"{SUPERSET_URL}{target['thumbnail_url']}"
+        response = session.get(url, params=params)
+        # ダイジェストが古い場合は最新の URL にリダイレクトされる（再確認では force を付けない）
+        return response.url.split("?")[0], {}, _image(response)
+
+    if target["resource"] == "chart":
+        response = session.get(f"{SUPERSET_URL}/api/v1/chart/{target['id']}/cache_screenshot/", params=params)
+    else:
+        response = session.post(f"{SUPERSET_URL}/api/v1/dashboard/{target['id']}/cache_dashboard_screenshot/",
+                                params=params, json={})
+    response.raise_for_status()
+    # image_url は WEBDRIVER_BASEURL（ワーカーから見た URL）で組み立てられるため、パスだけを使う
+    url = SUPERSET_URL + urlparse(response.json()["image_url"]).path
+    poll_params = {"download_format": "png"} if target["resource"] == "dashboard" else {}
+    return url, poll_params, None
+
+def poll_image(url, params):
+    return _image(session.get(url, params=params))
+
+def store(target, data, index):
+    digest, is_new = put_blob(THUMBNAIL_DIR, data)
+    index[target["key"]] = {
+        "title": target["title"],
+        "digest": digest,
+        "source": target["thumbnail_url"],
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    mark = "新規" if is_new else "変更なし"
+    print(f"  ✅ {target['key']} {target['title']} ({len(data):,} bytes, {mark})")
+
+def precompute(targets, kind, force, workers, timeout, index):
+    """
+    計算を一括で依頼し、完成したものから保存
+
+    Returns:
+        tuple: (保存数, 失敗数)
+    """
+    stored = failed = 0
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(request_image, t, kind, force): t for t in targets}
+        for future, target in futures.items():
+            try:
+                url, params, data = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  ❌ {target['key']} {target['title']}: {e}")
+                continue
+            if data is None:
+                pending[target["key"]] = (target, url, params)
+            else:
+                store(target, data, index)
+                stored += 1
+
+        print(f"⏳ 計算待ち {len(pending)}件")
+        started = time.perf_counter()
+        interval = POLL_INTERVAL
+        while pending and time.perf_counter() - started < timeout:
+            time.sleep(interval)
+            futures = {executor.submit(poll_image, url, params): key for key, (_, url, params) in pending.items()}
+            ready = 0
+            for future, key in futures.items():
+                target = pending[key][0]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    del pending[key]
+                    failed += 1
+                    print(f"  ❌ {key} {target['title']}: {e}")
+                    continue
+                if data is not None:
+                    del pending[key]
+                    store(target, data, index)
+                    stored += 1
+                    ready += 1
+            # 完成が続いている間は間隔を保ち、進捗がなければ間隔を広げる
+            interval = POLL_INTERVAL if ready else min(interval * 2, MAX_POLL_INTERVAL)
+
+    for key, (target, _, _) in pending.items():
+        failed += 1
+        print(f"  ❌ {key} {target['title']}: {timeout}秒以内に完成しませんでした")
+    return stored, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="サムネイル・スクリーンショットの一括事前計算")
+    parser.add_argument("--kind", choices=("thumbnail", "screenshot"), default="thumbnail")
+    parser.add_argument("--resource", choices=sorted(TITLE_COLUMNS), nargs="+", default=["dashboard", "chart"])
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同時リクエスト数（Celery ワーカー数程度）")
+    parser.add_argument("--force", action="store_true", help="キャッシュ済みでも再計算する")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="計算待ちの上限（秒）")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("サムネイル・スクリーンショットの一括事前計算")
+    print("=" * 60)
+
+    if not login():
+        return
+    configure_pool(args.workers)
+
+    index = load_index()
+    targets = list_targets(args.resource, args.kind)
+    if not args.force:
+        # thumbnail_url のダイジェストは内容の変更で変わるため、同じ URL の画像は取得済みとみなす
+        skipped = {t["key"] for t in targets if t["thumbnail_url"] and t["key"] in index
+                   and index[t["key"]]["source"] == t["thumbnail_url"] and has_blob(THUMBNAIL_DIR, index[t["key"]]["digest"])}
+        targets = [t for t in targets if t["key"] not in skipped]
+        print(f"📊 対象 {len(targets)}件 (変更なしでスキップ: {len(skipped)}件)")
+    else:
+        print(f"📊 対象 {len(targets)}件")
+
+    started = time.perf_counter()
+    try:
+        stored, failed = precompute(targets, args.kind, args.force, args.workers, args.timeout, index)
+    finally:
+        save_index(index)
+
+    print()
+    print(f"結果: 保存 {stored}件 / 失敗 {failed}件 ({time.perf_counter() - started:.1f}秒)")
+    print(f"📄 一覧: {INDEX_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Virtual Dataset の実効クエリ プロファイラー
+
+埋め込みユーザーのクエリは Superset 内で Dataset SQL をサブクエリとして包み、
+RLS（department_id = N）と期間フィルターを付けて実行されるため、画面からは実際の SQL が見えない。
+Dataset × 部署ごとにその実効クエリを組み立て、EXPLAIN (ANALYZE, BUFFERS) を並列に実行してコスト順に並べる。
+
+検出するパターン:
+- サブクエリ内の ORDER BY（外側で GROUP BY されるため不要なソートになる）
+- 大きなテーブルの Seq Scan（RLS / 期間フィルターがインデックスを使えていない）
+- ディスクを使う外部ソート（work_mem 不足）
+
+使い方:
+    python profile_datasets.py                      # 全 Dataset × 全部署（直近30日）
+    python profile_datasets.py --days 90 --workers 8 --top 10
+"""
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from db_client import connection_pool
+from superset_client import login
+from dataset_sql import is_templated, has_trailing_order_by, guest_rls_clauses, build_effective_query
+from generate_guest_token import DEPARTMENTS
+from index_advisor import collect_targets
+
+# この行数を超えるテーブルの Seq Scan を警告する
+SEQ_SCAN_MIN_ROWS = 10000
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+def findings(dataset, plan):
+    """実行計画と Dataset SQL から問題のあるパターンを検出"""
+    found = []
+    if has_trailing_order_by(dataset["sql"]):
+        found.append("サブクエリ内の ORDER BY（不要なソート）")
+    for node in _walk(plan):
+        scanned = node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)
+        if node["Node Type"] == "Seq Scan" and scanned >= SEQ_SCAN_MIN_ROWS:
+            found.append(f"Seq Scan on {node['Relation Name']} ({scanned:,}行読み取り / {node.get('Actual Rows', 0):,}行使用)")
+        if node["Node Type"] == "Sort" and "external" in node.get("Sort Method", ""):
+            found.append(f"外部ソート ({node.get('Sort Space Used', 0):,}kB ディスク使用)")
+    return found
+
+def profile(pool, dataset_id, dataset, department, days):
+    """1ケース分の EXPLAIN ANALYZE（プールから接続を借りて実行）"""
+    department_id, _, department_name = department
+    query = build_effective_query(
+        dataset["sql"],
+        rls=guest_rls_clauses(department_id),
+        time_column=dataset["range"][0] if dataset["range"] else None,
+        time_range=(f"CURRENT_DATE - {int(days)}", "CURRENT_DATE"),
+    )
+
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+            result = cur.fetchone()[0]
+        conn.rollback()
+    finally:
+        pool.putconn(conn)
+
+    result = result[0] if isinstance(result, list) else json.loads(result)[0]
+    plan = result["Plan"]
+    return {
+        "dataset_id": dataset_id,
+        "dataset": dataset["name"],
+        "department": department_name,
+        "cost": plan["Total Cost"],
+        "execution_ms": result["Execution Time"],
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "findings": findings(dataset, plan),
+        "query": query,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual Dataset の実効クエリ プロファイラー")
+    parser.add_argument("--days", type=int, default=30, help="期間フィルター（直近 N 日）")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--top", type=int, default=0, help="コスト上位 N 件のみ表示")
+    parser.add_argument("--show-sql", action="store_true", help="実効クエリを表示")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Virtual Dataset 実効クエリ プロファイラー")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    datasets = {}
+    for dataset_id, dataset in collect_targets().items():
+        if is_templated(dataset["sql"]):
+            print(f"⚠️  {dataset['name']} は Jinja テンプレートを含むためスキップ")
+            continue
+        datasets[dataset_id] = dataset
+
+    cases = [(dataset_id, dataset, department) for dataset_id, dataset in datasets.items() for department in DEPARTMENTS]
+    print(f"🔍 {len(datasets)} Dataset × {len(DEPARTMENTS)} 部署 = {len(cases)}ケース (直近 {args.days} 日)")
+    print()
+
+    pool = connection_pool(args.workers)
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(lambda case: profile(pool, *case, args.days), cases))
+    finally:
+        pool.closeall()
+
+    results.sort(key=lambda r: r["cost"], reverse=True)
+    if args.top:
+        results = results[:args.top]
+
+    print(f"{'#':>3} {'Dataset':<32} {'部署':<12} {'cost':>12} {'実行(ms)':>10} {'buffers':>10}")
+    print("-" * 84)
+    for rank, result in enumerate(results, 1):
+        print(f"{rank:>3} {result['dataset']:<32} {result['department']:<12} {result['cost']:>12,.0f} "
+              f"{result['execution_ms']:>10.2f} {result['buffers']:>10,}")
+        for finding in result["findings"]:
+            print(f"      ⚠️  {finding}")
+        if args.show_sql:
+            print("      " + result["query"].replace("\n", "\n      "))
+
+    flagged = sum(1 for r in results if r["findings"])
+    print()
+    if flagged:
+        print(f"⚠️  {flagged}/{len(results)}ケースで改善候補あり（index_advisor.py も参照）")
+    else:
+        print("✅ 問題のあるパターンは検出されませんでした")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+orders_with_status 事前計算テーブルのリフレッシュスクリプト
+
+cron から定期実行する想定（pg_cron が使える場合は create_orders_status_table.sql の cron.schedule を使用）
+差分リフレッシュは orders のトリガーが記録した変更キュー（追加・修正・削除）と、日付の境界をまたぐ行だけを処理する
+
+注意: 元の Virtual Dataset と違い、orders の追加・修正・削除は次の差分リフレッシュまでチャートに反映されない。
+差分リフレッシュは軽いため、鮮度が必要なら数分ごとに実行する（実行間隔が反映の遅れの上限になる）
+
+使い方:
+    python refresh_orders_status.py --init              # テーブル・関数作成 + 全件リフレッシュ
+    python refresh_orders_status.py                     # 差分リフレッシュ（数分ごと）
+    python refresh_orders_status.py --full              # 全件リフレッシュ（週次）
+    python refresh_orders_status.py --update-dataset    # Dataset の SQL を事前計算テーブル参照に切り替え
+
+crontab の例:
+    */5 * * * *  cd /path/to/repo && python refresh_orders_status.py
+    0 3 * * 0    cd /path/to/repo && python refresh_orders_status.py --full
+"""
+
+import argparse
+import json
+import time
+
+from db_client import connect, run_sql_file
+
+DDL_PATH = "create_orders_status_table.sql"
+DATASET_NAME = "orders_with_status"
+
+# 事前計算テーブルを参照する Dataset SQL（ORDER BY はチャート側で指定する）
+DATASET_SQL = """
+SELECT
+    order_id,
+    order_date,
+    amount,
+    customer_name,
+    department_id,
+    status,
+    (CURRENT_DATE - order_date) AS days_since_order
+FROM orders_with_status_mv
+""".strip()
+
+def refresh(full):
+    """リフレッシュを実行して結果を表示"""
+    mode_label = "全件" if full else "差分"
+    print(f"🔄 {mode_label}リフレッシュ中...")
+
+    started = time.perf_counter()
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT * FROM refresh_orders_with_status(%s)", (full,))
+            mode, inserted, updated, deleted = cur.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ リフレッシュ完了 ({mode}): 追加 {inserted}件 / 更新 {updated}件 / 削除 {deleted}件 ({elapsed:.2f}秒)")
+
+def init():
+    """テーブル・インデックス・関数を作成"""
+    print("🏗️  事前計算テーブルを作成中...")
+    conn = connect()
+    try:
+        run_sql_file(conn, DDL_PATH)
+        conn.commit()
+    finally:
+        conn.close()
+    print("✅ 作成完了")
+
+def update_dataset():
+    """Superset の orders_with_status Dataset を事前計算テーブル参照に切り替え"""
+    from superset_client import SUPERSET_URL, session, login
+
+    if not login():
+        return False
+
+    response = session.get(
+        f"{SUPERSET_URL}/api/v1/dataset/",
+        params={"q": json.dumps({"filters": [{"col": "table_name", "opr": "eq", "value": DATASET_NAME}]})},
+    )
+    if response.status_code != 200 or response.json()["count"] == 0:
+        print(f"❌ Dataset '{DATASET_NAME}' が見つかりません")
+        return False
+
+    dataset_id = response.json()["result"][0]["id"]
+    response = session.put(f"{SUPERSET_URL}/api/v1/dataset/{dataset_id}", json={"sql": DATASET_SQL})
+    if response.status_code != 200:
+        print(f"❌ Dataset更新失敗: {response.status_code} - {response.text}")
+        return False
+
+    print(f"✅ Dataset '{DATASET_NAME}' (ID: {dataset_id}) を事前計算テーブル参照に切り替えました")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="orders_with_status 事前計算テーブルのリフレッシュ")
+    parser.add_argument("--init", action="store_true", help="テーブル・関数を作成して全件リフレッシュ")
+    parser.add_argument("--full", action="store_true", help="全件リフレッシュ")
+    parser.add_argument("--update-dataset", action="store_true", help="Dataset の SQL を切り替え")
+    args = parser.parse_args()
+
+    if args.init:
+        init()
+    refresh(args.full or args.init)
+    if args.update_dataset:
+        update_dataset()
+
+if __name__ == "__main__":
+    main()
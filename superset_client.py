@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Superset API 共通クライアント
+
+各スクリプトで共通のログイン処理・一覧取得（ページング）をまとめたモジュール
+
+大きな応答（一覧・Dashboard 詳細・チャートデータ）向けに
+- gzip / br（brotli がインストールされている場合）で圧縮転送
+- ijson（C バックエンド）があれば一覧・チャートデータをストリームのまま逐次パース
+- position_json / json_metadata などの JSON 文字列フィールドは読まれたときだけデコード
+を行う。
+"""
+
+import requests
+import json
+from importlib.util import find_spec
+from requests.adapters import HTTPAdapter
+
+try:
+    import ijson
+    # 純 Python バックエンドは json.loads より遅いため、C バックエンドのときだけ使う
+    STREAMING = ijson.backend.startswith("yajl2_c")
+except ImportError:
+    ijson = None
+    STREAMING = False
+
+# br は urllib3 がデコードできる場合（brotli / brotlicffi がある場合）だけ受け入れる
+if find_spec("brotli") or find_spec("brotlicffi"):
+    ACCEPT_ENCODING = "gzip, deflate, br"
+else:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+SUPERSET_URL = "http://localhost:8088"
+USERNAME = "admin"
+PASSWORD = "admin"
+
+# 一覧取得時の1ページあたりの件数（Superset側の上限は100）
+PAGE_SIZE = 100
+
+session = requests.Session()
+session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+class ApiRecord(dict):
+    """
+    API のレコード（dict のまま使える）
+
+    JSON 文字列のフィールドは json_field() で初めて読まれたときにデコードし、結果を保持する。
+    元の文字列もそのまま残るため、既存の json.loads(record["json_metadata"]) も動く
+    """
+
+    __slots__ = ("_decoded",)
+
+    def json_field(self, name, default=None):
+        """JSON 文字列フィールドをデコードして返す（2回目以降はキャッシュ、変更しないこと）"""
+        try:
+            decoded = self._decoded
+        except AttributeError:
+            decoded = self._decoded = {}
+        if name not in decoded:
+            value = self.get(name)
+            if not value:
+                return {} if default is None else default
+            decoded[name] = json.loads(value) if isinstance(value, (str, bytes)) else value
+        return decoded[name]
+
+def parse_json(response):
+    """応答を bytes のままパース（文字列への変換を省く）"""
+    return json.loads(response.content)
+
+def _walk_items(value, path):
+    if not path:
+        yield value
+    elif path[0] == "item":
+        for child in value or []:
+            yield from _walk_items(child, path[1:])
+    elif isinstance(value, dict):
+        yield from _walk_items(value.get(path[0]), path[1:])
+
+def iter_json_items(response, prefix):
+    """
+    応答の prefix（ijson 形式: "result.item" など）の要素を順に返す
+
+    stream=STREAMING で取得した応答を渡す。ijson が使える場合は逐次パースし、応答全体をメモリに載せない
+    """
+    if STREAMING:
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, prefix, use_float=True)
+    else:
+        yield from _walk_items(parse_json(response), prefix.split("."))
+
+def get_record(path, http_session=None):
+    """詳細 API（/api/v1/dashboard/{id} など）の result を ApiRecord で返す"""
+    response = (http_session or session).get(f"{SUPERSET_URL}{path}")
+    response.raise_for_status()
+    return ApiRecord(parse_json(response)["result"])
+
+def configure_pool(max_workers):
+    """並列リクエスト用にコネクションプールを拡張"""
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+def login():
+    """Supersetにログイン"""
+    login_data = {"username": USERNAME, "password": PASSWORD, "provider": "db"}
+    response = session.post(f"{SUPERSET_URL}/api/v1/security/login", json=login_data)
+
+    if response.status_code == 200:
+        access_token = response.json()['access_token']
+        csrf_response = session.get(
+            f"{SUPERSET_URL}/api/v1/security/csrf_token/",
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+        csrf_token = csrf_response.json().get('result') if csrf_response.status_code == 200 else ''
+
+        session.headers.update({
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrf_token,
+            'Referer': SUPERSET_URL,
+        })
+        print("✅ ログイン成功")
+        return True
+    else:
+        print(f"❌ ログイン失敗: {response.status_code}")
+        return False
+
+def guest_session(guest_token):
+    """
+    Guest Token で認証するセッション（埋め込みユーザーと同じ権限・RLS で API を呼ぶ）
+
+    CSRF トークンはセッション Cookie に紐づくため、Guest Token ごとに別セッションを使う
+    """
+    guest = requests.Session()
+    guest.headers.update({'X-GuestToken': guest_token, 'Referer': SUPERSET_URL, 'Accept-Encoding': ACCEPT_ENCODING})
+    csrf_response = guest.get(f"{SUPERSET_URL}/api/v1/security/csrf_token/")
+    if csrf_response.status_code == 200:
+        guest.headers['X-CSRFToken'] = csrf_response.json().get('result', '')
+    return guest
+
+def rison_ids(ids):
+    """IDリストを Rison 形式 (!(1,2,3)) に変換（export / 一括削除APIのq引数用）"""
+    return "!(" + ",".join(str(i) for i in ids) + ")"
+
+def iter_all(resource, columns=None, filters=None):
+    """
+    一覧APIを全ページ順に取得（1件ずつ ApiRecord で返す）
+
+    Args:
+        resource: 'dashboard' / 'chart' / 'dataset' など
+        columns: 取得するカラム（省略時はSuperset既定）
+        filters: Superset の filters 条件
+    """
+    page = 0
+
+    while True:
+        query = {"page": page, "page_size": PAGE_SIZE}
+        if columns:
+            query["columns"] = columns
+        if filters:
+            query["filters"] = filters
+
+        response = session.get(
+            f"{SUPERSET_URL}/api/v1/{resource}/",
+            params={"q": json.dumps(query)},
+            stream=STREAMING,
+        )
+        response.raise_for_status()
+
+        count = 0
+        for item in iter_json_items(response, "result.item"):
+            count += 1
+            yield ApiRecord(item)
+        response.close()
+
+        if count < PAGE_SIZE:
+            break
+        page += 1
+
+def fetch_all(resource, columns=None, filters=None):
+    """
+    一覧APIを全ページ取得
+
+    Args:
+        resource: 'dashboard' / 'chart' / 'dataset' など
+        columns: 取得するカラム（省略時はSuperset既定）
+        filters: Superset の filters 条件
+
+    Returns:
+        list: 全件の result
+    """
+    return list(iter_all(resource, columns, filters))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Superset の期間式（time_range）をローカルで評価するモジュール
+
+Native Filter の defaultDataMask（"Last 30 days" など）や Chart Data API の TEMPORAL_RANGE と同じ規則で
+期間式を具体的な [開始, 終了) に変換し、日付カラムへのフィルターを NumPy でベクトル化して適用する。
+Superset へ問い合わせずに数百万行の期待値を計算するためのもの。
+
+対応する期間式:
+    No filter
+    Last day / week / month / quarter / year           # 今日 0時から遡る（終了は今日 0時、今日は含まない）
+    Last 7 days / Last 2 weeks / Last 3 months ...
+    previous calendar week / month / quarter / year    # 前の暦週（月曜始まり）・暦月・四半期・暦年
+    2024-01-01 : 2024-02-01                            # 明示的な範囲（today / now / 空欄も可）
+
+使い方:
+    python time_range.py "Last 30 days" "previous calendar month" --today 2026-01-11
+"""
+
+import argparse
+import calendar
+import datetime
+import re
+
+import numpy as np
+
+NO_FILTER = "No filter"
+LAST_UNITS = {"day": (1, 0), "week": (7, 0), "month": (0, 1), "quarter": (0, 3), "year": (0, 12)}
+
+LAST_PATTERN = re.compile(r"^last\s+(?:(\d+)\s+)?(day|week|month|quarter|year)s?$", re.IGNORECASE)
+PREVIOUS_PATTERN = re.compile(r"^previous\s+calendar\s+(week|month|quarter|year)$", re.IGNORECASE)
+
+def add_months(date, months):
+    """月を加算（月末を超える日は月末に丸める: 3/31 - 1ヶ月 = 2/28）"""
+    month = date.month - 1 + months
+    year, month = date.year + month // 12, month % 12 + 1
+    return datetime.date(year, month, min(date.day, calendar.monthrange(year, month)[1]))
+
+def _parse_endpoint(text, today):
+    text = text.strip()
+    if not text or text.lower() == NO_FILTER.lower():
+        return None
+    if text.lower() in ("today", "now"):
+        return today
+    try:
+        return datetime.date.fromisoformat(text[:10])
+    except ValueError:
+        raise ValueError(f"未対応の日付です: {text!r}") from None
+
+def resolve(expression, today=None):
+    """
+    期間式を [開始, 終了) の日付に変換
+
+    Args:
+        expression: 期間式
+        today: 基準日（省略時は今日）
+
+    Returns:
+        tuple: (開始日 or None, 終了日 or None)。終了日は含まない
+    """
+    today = today or datetime.date.today()
+    expression = (expression or NO_FILTER).strip()
+    if expression.lower() == NO_FILTER.lower():
+        return None, None
+
+    match = LAST_PATTERN.match(expression)
+    if match:
+        count = int(match.group(1) or 1)
+        days, months = LAST_UNITS[match.group(2).lower()]
+        if months:
+            return add_months(today, -months * count), today
+        return today - datetime.timedelta(days=days * count), today
+
+    match = PREVIOUS_PATTERN.match(expression)
+    if match:
+        unit = match.group(1).lower()
+        if unit == "week":
+            this_week = today - datetime.timedelta(days=today.weekday())
+            return this_week - datetime.timedelta(days=7), this_week
+        months = {"month": 1, "quarter": 3, "year": 12}[unit]
+        if unit == "month":
+            current = today.replace(day=1)
+        elif unit == "quarter":
+            current = datetime.date(today.year, (today.month - 1) // 3 * 3 + 1, 1)
+        else:
+            current = datetime.date(today.year, 1, 1)
+        return add_months(current, -months), current
+
+    if ":" in expression:
+        start, end = expression.split(":", 1) if expression.count(":") == 1 else expression.split(" : ", 1)
+        start, end = _parse_endpoint(start, today), _parse_endpoint(end, today)
+        if start and end and start > end:
+            raise ValueError(f"開始日が終了日より後です: {expression!r}")
+        return start, end
+
+    raise ValueError(f"未対応の期間式です: {expression!r}")
+
+def to_sql(expression, today=None):
+    """期間式を SQL の (開始, 終了) リテラルに変換（dataset_sql.build_effective_query 用）"""
+    start, end = resolve(expression, today)
+    if start is None and end is None:
+        return None
+    return (f"DATE '{start}'" if start else None), (f"DATE '{end}'" if end else None)
+
+def mask(values, expression, today=None):
+    """
+    日付配列に期間フィルターを適用した真偽値マスク
+
+    Args:
+        values: datetime64 / date の配列（pandas の Series も可）
+        expression: 期間式
+    """
+    values = np.asarray(values, dtype="datetime64[D]")
+    start, end = resolve(expression, today)
+    result = np.ones(values.shape, dtype=bool)
+    if start is not None:
+        result &= values >= np.datetime64(start)
+    if end is not None:
+        result &= values < np.datetime64(end)
+    return result
+
+def range_sums(values, expressions, weights=None, today=None):
+    """
+    複数の期間式について、期間内の行数（weights 指定時は合計）をまとめて計算
+
+    日付でソートした累積和を二分探索するため、期間式が多くても全行の走査は1回で済む
+
+    Returns:
+        dict: {期間式: 件数 or 合計}
+    """
+    values = np.asarray(values, dtype="datetime64[D]")
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)
+    cumulative = np.concatenate(([0.0], np.cumsum(weights[order])))
+
+    results = {}
+    for expression in expressions:
+        start, end = resolve(expression, today)
+        lo = 0 if start is None else np.searchsorted(sorted_values, np.datetime64(start), side="left")
+        hi = len(sorted_values) if end is None else np.searchsorted(sorted_values, np.datetime64(end), side="left")
+        results[expression] = cumulative[max(hi, lo)] - cumulative[lo]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Superset 期間式の評価")
+    parser.add_argument("expressions", nargs="+")
+    parser.add_argument("--today", type=datetime.date.fromisoformat, default=datetime.date.today())
+    args = parser.parse_args()
+
+    for expression in args.expressions:
+        start, end = resolve(expression, args.today)
+        print(f"{expression:<32} {start or '-∞'} 〜 {end or '+∞'} (終了日を含まない)")
+
+if __name__ == "__main__":
+    main()
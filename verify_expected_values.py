@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+期待値の自動検算
+
+verify_date_filter.sql / DATE_FILTER_EXPECTED_VALUES.md で手作業していた検算を自動化する。
+部署 × 期間ごとに
+- 正解値: PostgreSQL へ直接、Superset と同じ形の実効クエリ（RLS・期間フィルター付き）を実行
+- 実際の値: その部署の Guest Token で /api/v1/chart/data からチャートのデータを取得
+を並列に求めて、GROUP BY キーごとに数値を比較する。
+API 側は全ケースを一括投入し、GLOBAL_ASYNC_QUERIES が有効な場合も完了したジョブから順に受け取る（async_query.py）。
+
+使い方:
+    python verify_expected_values.py                                  # 埋め込み Dashboard の全チャート
+    python verify_expected_values.py --charts 101 102 --time-ranges "No filter" "Last 7 days"
+"""
+
+import argparse
+import datetime
+import decimal
+from concurrent.futures import ThreadPoolExecutor
+
+from db_client import connection_pool
+from superset_client import login, guest_session, session, SUPERSET_URL
+from dataset_sql import guest_rls_clauses, filter_sql, build_effective_query
+from generate_guest_token import DEPARTMENTS, DASHBOARD_ID, generate_guest_token
+from time_range import to_sql
+from chart_data import NO_FILTER, metric_label, metric_sql, load_chart, chart_query_context
+from async_query import AsyncQueryClient
+
+DEFAULT_TIME_RANGES = [NO_FILTER, "Last 7 days", "Last 30 days", "Last 60 days", "previous calendar month"]
+TOLERANCE = 0.005
+
+def load_charts(chart_ids, time_column):
+    """検算対象チャート（集計チャートのみ）の定義と Dataset SQL を取得"""
+    charts = []
+    for chart_id in chart_ids:
+        chart = load_chart(chart_id, time_column, dashboard_id=DASHBOARD_ID)
+        if not chart["metrics"]:
+            print(f"ℹ️  {chart['name']} ({chart['viz_type']}) は集計チャートではないためスキップ")
+            continue
+        charts.append(chart)
+    return charts
+
+def _key_value(value):
+    """GROUP BY キーを比較用の文字列に（API は時刻を epoch ミリ秒、psycopg は date / datetime で返す）"""
+    if isinstance(value, datetime.datetime):
+        value = value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+        return str(int(value.timestamp() * 1000))
+    if isinstance(value, datetime.date):
+        return _key_value(datetime.datetime.combine(value, datetime.time()))
+    if isinstance(value, decimal.Decimal):
+        value = float(value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _rows_to_map(rows, groupby, labels):
+    return {
+        tuple(_key_value(row[g]) for g in groupby): [float(row[label] or 0) for label in labels]
+        for row in rows
+    }
+
+def expected(pool, chart, department_id, time_range):
+    """正解値を PostgreSQL から直接取得"""
+    labels = [metric_label(m) for m in chart["metrics"]]
+    query = build_effective_query(
+        chart["sql"],
+        rls=guest_rls_clauses(department_id) + [filter_sql(f) for f in chart["filters"]],
+        time_column=chart["time_column"],
+        time_range=to_sql(time_range),
+        groupby=chart["groupby"],
+        metrics=[f'{metric_sql(m)} AS "{label}"' for m, label in zip(chart["metrics"], labels)],
+    )
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            names = [d[0] for d in cur.description]
+            rows = [dict(zip(names, row)) for row in cur.fetchall()]
+        conn.rollback()
+    finally:
+        pool.putconn(conn)
+    return _rows_to_map(rows, chart["groupby"], labels)
+
+def actual(guests, cases, workers):
+    """
+    全ケースを Guest Token で Chart Data API から取得
+
+    Returns:
+        dict: {ケース番号: (GROUP BY キーごとの値, エラー)}
+    """
+    client = AsyncQueryClient(workers=workers)
+    tasks = [(i, guests[department[0]], chart_query_context(chart, time_range))
+             for i, (chart, department, time_range) in enumerate(cases)]
+    maps = {}
+    for i, result, error, _ in client.run(tasks):
+        chart = cases[i][0]
+        if error:
+            maps[i] = (None, error)
+            continue
+        labels = [metric_label(m) for m in chart["metrics"]]
+        maps[i] = (_rows_to_map(result[0]["data"], chart["groupby"], labels), None)
+    return maps
+
+def compare(expected_map, actual_map):
+    """GROUP BY キーごとの差分"""
+    diffs = []
+    for key in sorted(set(expected_map) | set(actual_map)):
+        want, got = expected_map.get(key), actual_map.get(key)
+        if want is None or got is None or any(abs(w - g) > TOLERANCE for w, g in zip(want, got)):
+            diffs.append((key, want, got))
+    return diffs
+
+def verify(expected_future, actual_result, chart, department, time_range):
+    department_name = department[2]
+    actual_map, error = actual_result
+    try:
+        if error:
+            raise RuntimeError(f"Chart Data API: {error}")
+        diffs = compare(expected_future.result(), actual_map)
+        return chart, department_name, time_range, diffs, None
+    except Exception as e:
+        return chart, department_name, time_range, [], e
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart Data API と直接 SQL の期待値比較")
+    parser.add_argument("--charts", type=int, nargs="+", help="チャートID（省略時は埋め込み Dashboard の全チャート）")
+    parser.add_argument("--time-ranges", nargs="+", default=DEFAULT_TIME_RANGES)
+    parser.add_argument("--time-column", help="期間フィルター対象カラム（省略時はチャート/Dataset の設定）")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("期待値の自動検算")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    chart_ids = args.charts
+    if not chart_ids:
+        response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{DASHBOARD_ID}/charts")
+        response.raise_for_status()
+        chart_ids = [chart["id"] for chart in response.json()["result"]]
+    charts = load_charts(chart_ids, args.time_column)
+
+    guests = {
+        department_id: guest_session(generate_guest_token(department_id, user_name)[0])
+        for department_id, user_name, _ in DEPARTMENTS
+    }
+    cases = [(chart, department, time_range)
+             for chart in charts for department in DEPARTMENTS for time_range in args.time_ranges]
+    print(f"🔍 {len(charts)}チャート × {len(DEPARTMENTS)}部署 × {len(args.time_ranges)}期間 = {len(cases)}ケース")
+    print()
+
+    pool = connection_pool(args.workers)
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            # DB 側の正解値を求めている間に API 側のジョブを投入・回収する
+            expected_futures = [executor.submit(expected, pool, chart, department[0], time_range)
+                                for chart, department, time_range in cases]
+            actual_results = actual(guests, cases, args.workers)
+            results = [verify(expected_futures[i], actual_results[i], *case) for i, case in enumerate(cases)]
+    finally:
+        pool.closeall()
+
+    failed = 0
+    for chart, department_name, time_range, diffs, error in results:
+        label = f"{chart['name']} / {department_name} / {time_range}"
+        if error:
+            failed += 1
+            print(f"❌ {label}: {error}")
+        elif diffs:
+            failed += 1
+            print(f"❌ {label}: {len(diffs)}件の差分")
+            for key, want, got in diffs:
+                print(f"     {', '.join(key) or '(合計)'}: 期待値 {want} / API {got}")
+        else:
+            print(f"✅ {label}")
+
+    print()
+    print(f"📊 {len(results) - failed}/{len(results)}ケース一致")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+部署別の埋め込み Dashboard の画像回帰テスト（知覚ハッシュ）
+
+superset-demo-frontend/test-rls-営業部.png などの基準画像との比較は目視だった。
+Angular アプリ（localhost:4200）を部署ごとに別のブラウザコンテキストで並列に開いてスクリーンショットを撮り、
+基準画像と知覚ハッシュ（pHash）で比較する。
+
+- 画像をグレースケールで縮小し、タイルごとに DCT の低周波 8x8 の符号からハッシュを作る（NumPy で一括計算）
+- アンチエイリアスやフォントの微差ではハッシュが変わらず、数値・凡例・チャートの形の変化だけを検出する
+- 中央値との差が HASH_MARGIN 未満の係数は符号がノイズで反転するため、どちらの画像でもそうならそのビットは比較しない
+- 背景だけのほぼ平坦なタイル（低周波のエネルギーが FLAT_ENERGY 未満）はハッシュではなく平均輝度の差で比較する
+- 描画時刻やキャッシュ表示などの動的な部分はマスク（基準画像の座標の矩形）で比較から外す
+- 差分のあったタイルに赤枠を付けた画像を出力する
+
+使い方:
+    python visual_regression.py                                 # 撮影して test-rls-{部署}.png と比較
+    python visual_regression.py --baseline-prefix test-extra-json --mask 0,0,1280,90
+    python visual_regression.py --compare-only screenshots/visual/20250101T000000Z
+    python visual_regression.py --update-baseline               # 撮影した画像で基準画像を更新
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import shutil
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from generate_guest_token import DEPARTMENTS
+
+APP_URL = "http://localhost:4200"
+BASELINE_DIR = "superset-demo-frontend"
+OUTPUT_DIR = os.path.join("screenshots", "visual")
+VIEWPORT = {"width": 1280, "height": 720}  # 基準画像と同じ（Playwright の既定）
+RENDER_WAIT_MS = 5000
+
+HASH_SIZE = 8          # ハッシュに使う低周波成分（8x8 = 64bit）
+TILE_PIXELS = 32       # タイルを縮小するサイズ（DCT の入力）
+DEFAULT_GRID = (6, 8)  # 行 x 列
+TILE_THRESHOLD = 10    # タイルのハミング距離がこれを超えたら差分
+GLOBAL_THRESHOLD = 8
+HASH_MARGIN = 0.01     # 中央値との差がこれ未満の係数は不安定（輝度 0〜1 の DCT 係数）
+FLAT_ENERGY = 0.02     # 低周波の AC 成分の RMS がこれ未満のタイルは平坦とみなす
+LUMA_THRESHOLD = 8 / 255  # 平坦なタイルの平均輝度の差の閾値
+
+def _dct_matrix(n):
+    """DCT-II の直交行列"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(TILE_PIXELS)
+
+def parse_mask(text):
+    """x,y,w,h（基準画像のピクセル座標）"""
+    x, y, w, h = (int(v) for v in text.split(","))
+    return x, y, w, h
+
+def load_gray(path, masks=(), base_size=None):
+    """
+    グレースケールの float 配列として読み込み、マスク部分を一定値で塗りつぶす
+
+    base_size: マスク座標の基準サイズ (width, height)。画像サイズが異なる場合は比率で換算する
+    """
+    image = Image.open(path).convert("L")
+    pixels = np.asarray(image, dtype=np.float32) / 255
+    if masks:
+        pixels = pixels.copy()
+        scale_x = image.width / base_size[0] if base_size else 1
+        scale_y = image.height / base_size[1] if base_size else 1
+        for x, y, w, h in masks:
+            pixels[int(y * scale_y):int((y + h) * scale_y), int(x * scale_x):int((x + w) * scale_x)] = 0.5
+    return pixels
+
+def _resize(pixels, height, width):
+    return np.asarray(Image.fromarray(pixels).resize((width, height), Image.BOX), dtype=np.float32)
+
+def tile_features(pixels, grid=DEFAULT_GRID):
+    """
+    タイルごとの低周波 DCT 係数の中央値との差・AC 成分の RMS・平均輝度
+
+    Returns:
+        tuple: ((行, 列, 64) の中央値との差, (行, 列) の AC の RMS, (行, 列) の平均輝度)
+    """
+    rows, cols = grid
+    small = _resize(pixels, rows * TILE_PIXELS, cols * TILE_PIXELS)
+    tiles = small.reshape(rows, TILE_PIXELS, cols, TILE_PIXELS).transpose(0, 2, 1, 3)
+    coefficients = (_DCT @ tiles @ _DCT.T)[..., :HASH_SIZE, :HASH_SIZE].reshape(rows, cols, -1)
+    # 直流成分（明るさ）は除いて中央値を取る
+    ac = coefficients[..., 1:]
+    median = np.median(ac, axis=-1, keepdims=True)
+    energy = np.sqrt(np.mean(ac ** 2, axis=-1))
+    return coefficients - median, energy, tiles.mean(axis=(2, 3))
+
+def phash_tiles(pixels, grid=DEFAULT_GRID):
+    """
+    タイルごとの pHash
+
+    Returns:
+        ndarray: (行, 列, 64) の bool
+    """
+    return tile_features(pixels, grid)[0] > 0
+
+def tile_distances(baseline, actual, grid=DEFAULT_GRID):
+    """
+    タイルごとの差
+
+    Returns:
+        tuple: ((行, 列) のハミング距離, (行, 列) の平坦なタイルの平均輝度の差。ハッシュで比較したタイルは NaN)
+    """
+    base_delta, base_energy, base_mean = tile_features(baseline, grid)
+    actual_delta, actual_energy, actual_mean = tile_features(actual, grid)
+    # どちらの画像でも中央値に近い係数は比較しない
+    stable = np.maximum(np.abs(base_delta), np.abs(actual_delta)) >= HASH_MARGIN
+    distances = np.count_nonzero(((base_delta > 0) != (actual_delta > 0)) & stable, axis=-1)
+
+    # 平坦なタイル同士は平均輝度で比較（片方だけに内容が現れた場合はハッシュの差で検出する）
+    low, high = np.minimum(base_energy, actual_energy), np.maximum(base_energy, actual_energy)
+    flat = (low < FLAT_ENERGY) & (high < FLAT_ENERGY * 2)
+    distances[flat] = 0
+    luma = np.where(flat, np.abs(base_mean - actual_mean), np.nan)
+    return distances, luma
+
+def masked_tiles(masks, size, grid=DEFAULT_GRID):
+    """マスクで完全に覆われたタイル（比較しない）"""
+    rows, cols = grid
+    width, height = size
+    covered = np.zeros((height, width), dtype=bool)
+    for x, y, w, h in masks:
+        covered[y:y + h, x:x + w] = True
+    tile_h, tile_w = height / rows, width / cols
+    return np.array([[covered[int(r * tile_h):int((r + 1) * tile_h), int(c * tile_w):int((c + 1) * tile_w)].all()
+                      for c in range(cols)] for r in range(rows)])
+
+def compare(baseline_path, actual_path, masks=(), grid=DEFAULT_GRID,
+            tile_threshold=TILE_THRESHOLD, global_threshold=GLOBAL_THRESHOLD):
+    """
+    基準画像と比較
+
+    Returns:
+        dict: global_distance, tile_distances (行 x 列), changed_tiles [(行, 列, 差の表示)], passed
+    """
+    size = Image.open(baseline_path).size
+    baseline = load_gray(baseline_path, masks, size)
+    actual = load_gray(actual_path, masks, size)
+
+    global_distances, global_luma = tile_distances(baseline, actual, (1, 1))
+    global_distance = int(global_distances[0, 0])
+    distances, luma = tile_distances(baseline, actual, grid)
+    masked = masked_tiles(masks, size, grid)
+    distances[masked] = 0
+    luma[masked] = np.nan
+
+    changed = [(int(r), int(c), f"{distances[r, c]}bit") for r, c in zip(*np.nonzero(distances > tile_threshold))]
+    changed += [(int(r), int(c), f"輝度差 {luma[r, c] * 255:.0f}") for r, c in zip(*np.nonzero(luma > LUMA_THRESHOLD))]
+    changed.sort()
+    if not np.isnan(global_luma[0, 0]) and global_luma[0, 0] > LUMA_THRESHOLD:
+        global_distance = HASH_SIZE * HASH_SIZE
+    return {
+        "global_distance": global_distance,
+        "tile_distances": distances,
+        "changed_tiles": changed,
+        "passed": not changed and global_distance <= global_threshold,
+    }
+
+def write_diff(actual_path, result, masks, grid, output_path):
+    """差分タイルに赤枠、マスクに灰色の網掛けを付けた画像を保存"""
+    image = Image.open(actual_path).convert("RGB")
+    overlay = ImageDraw.Draw(image, "RGBA")
+    rows, cols = grid
+    tile_w, tile_h = image.width / cols, image.height / rows
+    for x, y, w, h in masks:
+        overlay.rectangle([x, y, x + w, y + h], fill=(128, 128, 128, 96))
+    for r, c, label in result["changed_tiles"]:
+        box = [c * tile_w, r * tile_h, (c + 1) * tile_w - 1, (r + 1) * tile_h - 1]
+        overlay.rectangle(box, outline=(255, 0, 0, 255), width=3)
+        overlay.text((box[0] + 4, box[1] + 4), label, fill=(255, 0, 0, 255))
+    image.save(output_path)
+
+async def capture_department(browser, department_name, path):
+    """1部署分: 独立したコンテキストでアプリを開き、部署タブを選んで撮影"""
+    context = await browser.new_context(viewport=VIEWPORT)
+    try:
+        page = await context.new_page()
+        await page.goto(APP_URL, wait_until="networkidle", timeout=60000)
+        await page.click(f'button:has-text("{department_name}")')
+        # 埋め込み iframe 内のチャートの描画を待つ
+        frame = page.frame_locator("#superset-dashboard iframe")
+        try:
+            await frame.locator(".chart-container").first.wait_for(timeout=30000)
+        except Exception:
+            print(f"⚠️  {department_name}: チャートの描画を確認できませんでした")
+        await page.wait_for_load_state("networkidle")
+        await page.wait_for_timeout(RENDER_WAIT_MS)
+        await page.screenshot(path=path, full_page=False)
+    finally:
+        await context.close()
+
+async def capture(output_dir, department_names):
+    """全部署を並列に撮影"""
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        raise RuntimeError("撮影には playwright が必要です (pip install playwright && playwright install chromium)") from None
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            await asyncio.gather(*(
+                capture_department(browser, name, os.path.join(output_dir, f"{name}.png"))
+                for name in department_names
+            ))
+        finally:
+            await browser.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="部署別の埋め込み Dashboard の画像回帰テスト")
+    parser.add_argument("--baseline-prefix", default="test-rls", help="基準画像 {prefix}-{部署名}.png")
+    parser.add_argument("--baseline-dir", default=BASELINE_DIR)
+    parser.add_argument("--compare-only", metavar="DIR", help="撮影せず、DIR 内の {部署名}.png を比較")
+    parser.add_argument("--mask", type=parse_mask, action="append", default=[], help="比較から外す矩形 x,y,w,h")
+    parser.add_argument("--grid", type=int, nargs=2, default=DEFAULT_GRID, metavar=("ROWS", "COLS"))
+    parser.add_argument("--threshold", type=int, default=TILE_THRESHOLD, help="タイルのハミング距離の閾値（0〜64）")
+    parser.add_argument("--update-baseline", action="store_true", help="撮影した画像で基準画像を置き換える")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("埋め込み Dashboard の画像回帰テスト")
+    print("=" * 60)
+
+    department_names = [name for _, _, name in DEPARTMENTS]
+    grid = tuple(args.grid)
+
+    if args.compare_only:
+        output_dir = args.compare_only
+    else:
+        output_dir = os.path.join(OUTPUT_DIR, datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ"))
+        os.makedirs(output_dir, exist_ok=True)
+        started = time.perf_counter()
+        asyncio.run(capture(output_dir, department_names))
+        print(f"📸 {len(department_names)}部署を撮影 ({time.perf_counter() - started:.1f}秒) → {output_dir}")
+
+    if args.update_baseline:
+        for name in department_names:
+            shutil.copyfile(os.path.join(output_dir, f"{name}.png"),
+                            os.path.join(args.baseline_dir, f"{args.baseline_prefix}-{name}.png"))
+        print(f"✅ 基準画像を更新しました ({args.baseline_dir}/{args.baseline_prefix}-*.png)")
+        return
+
+    started = time.perf_counter()
+    failed = 0
+    for name in department_names:
+        baseline_path = os.path.join(args.baseline_dir, f"{args.baseline_prefix}-{name}.png")
+        actual_path = os.path.join(output_dir, f"{name}.png")
+        if not os.path.exists(baseline_path):
+            failed += 1
+            print(f"❌ {name}: 基準画像がありません ({baseline_path})")
+            continue
+
+        result = compare(baseline_path, actual_path, args.mask, grid, args.threshold)
+        if result["passed"]:
+            print(f"✅ {name}: 全体 {result['global_distance']}bit / 最大タイル {result['tile_distances'].max()}bit")
+            continue
+
+        failed += 1
+        diff_path = os.path.join(output_dir, f"{name}.diff.png")
+        write_diff(actual_path, result, args.mask, grid, diff_path)
+        print(f"❌ {name}: 全体 {result['global_distance']}bit / 差分タイル {len(result['changed_tiles'])}件 → {diff_path}")
+        for r, c, label in result["changed_tiles"]:
+            print(f"     タイル ({r}, {c}): {label}")
+
+    print()
+    print(f"📊 {len(department_names) - failed}/{len(department_names)}部署一致 (比較 {time.perf_counter() - started:.2f}秒)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+チャートデータのキャッシュウォーマー
+
+create_cross_filter_dashboard.py でのプロビジョニング直後や Guest Token の更新後は、
+各部署の最初の埋め込みユーザーが全チャートのクエリを待つことになる。
+部署ごとに Guest Token を発行し、各チャートの保存済み query_context（期間 Native Filter の既定値だけを反映）で
+/api/v1/chart/data を並列に叩いて、Superset のキャッシュに結果を載せておく。
+
+- 自前で組み立てた query_context は orderby / post_processing / extras などがフロントエンドと異なり
+  キャッシュキーが一致しないため、チャートに保存されたものを使う（保存されていないチャートは警告して組み立てる）
+- Guest Token は --dashboard の埋め込み設定の UUID で発行する（別の Dashboard のトークンでは 403 になる）
+- RLS 句はキャッシュキーに含まれるため、部署ごとに別々にウォームする必要がある
+- 利用ログ（/api/v1/log/）の閲覧数が多いチャートから順に実行する
+- GLOBAL_ASYNC_QUERIES が有効な場合は全ジョブを一括投入し、完了したものから結果を受け取る（async_query.py）
+
+使い方:
+    python warm_cache.py                             # 埋め込み Dashboard の全チャート × 全部署
+    python warm_cache.py --workers 4 --force         # データ更新後にキャッシュを作り直す
+    python warm_cache.py --output warm_report.json   # 結果を JSON で保存
+"""
+
+import argparse
+import datetime
+import json
+import time
+from collections import Counter
+
+import requests
+
+from superset_client import login, fetch_all, guest_session, session, SUPERSET_URL
+from generate_guest_token import DEPARTMENTS, DASHBOARD_ID, EMBEDDED_DASHBOARD_UUID, generate_guest_token
+from chart_data import NO_FILTER, load_chart, saved_query_context, dashboard_time_ranges
+from async_query import AsyncQueryClient, JOB_TIMEOUT
+
+USAGE_DAYS = 30
+
+def chart_usage(days):
+    """直近 N 日のチャート別閲覧数（ログ API が使えない場合は空）"""
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=days)).isoformat()
+    try:
+        logs = fetch_all("log", columns=["slice_id"], filters=[{"col": "dttm", "opr": "gt", "value": since}])
+    except requests.RequestException as e:
+        print(f"⚠️  利用ログを取得できないため Dashboard の並び順で実行します: {e}")
+        return Counter()
+    return Counter(log["slice_id"] for log in logs if log.get("slice_id"))
+
+def embedded_uuid(dashboard_id):
+    """Dashboard の埋め込み設定の UUID（埋め込みが有効でなければ None）"""
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/embedded")
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()["result"]["uuid"]
+
+def load_dashboard_charts(dashboard_id):
+    """Dashboard のチャート定義に期間 Native Filter の既定値を反映して取得"""
+    response = session.get(f"{SUPERSET_URL}/api/v1/dashboard/{dashboard_id}/charts")
+    response.raise_for_status()
+    items = response.json()["result"]
+    time_ranges = dashboard_time_ranges(dashboard_id, [item["id"] for item in items])
+
+    charts = []
+    for item in items:
+        column, time_range = time_ranges.get(item["id"], (None, NO_FILTER))
+        chart = load_chart(item["id"], column, dashboard_id=dashboard_id)
+        chart["time_range"] = time_range
+        chart["query_context"], saved = saved_query_context(chart, time_range)
+        if not saved:
+            print(f"⚠️  {chart['name']}: 保存済みの query_context がないため組み立てたもので実行します"
+                  "（Dashboard 表示時とキャッシュキーが一致しない可能性があります。Explore で一度保存してください）")
+        charts.append(chart)
+    return charts
+
+def warm(tasks, force, workers, timeout):
+    """
+    チャート × 部署分のデータを取得してキャッシュに載せる
+
+    Args:
+        tasks: (Guest セッション, チャート, 部署名) のリスト
+    """
+    client = AsyncQueryClient(workers=workers, timeout=timeout)
+    queries = [(i, guest, {**chart["query_context"], "force": force})
+               for i, (guest, chart, _) in enumerate(tasks)]
+    results = []
+    for i, result, error, seconds in client.run(queries):
+        _, chart, department_name = tasks[i]
+        result = result[0] if result else {}
+        results.append({
+            "chart_id": chart["id"],
+            "chart": chart["name"],
+            "department": department_name,
+            "time_range": chart["time_range"],
+            "seconds": round(seconds, 3),
+            "was_cached": result.get("is_cached"),
+            "rowcount": result.get("rowcount"),
+            "error": error,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="チャートデータのキャッシュウォーマー")
+    parser.add_argument("--dashboard", default=DASHBOARD_ID, help="対象 Dashboard（Guest Token の埋め込み先）")
+    parser.add_argument("--workers", type=int, default=4, help="同時実行数（DB への負荷に合わせて調整）")
+    parser.add_argument("--force", action="store_true", help="キャッシュ済みでも再実行する")
+    parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT, help="非同期ジョブ1件あたりの待ち時間の上限（秒）")
+    parser.add_argument("--usage-days", type=int, default=USAGE_DAYS, help="優先順位に使う利用ログの期間")
+    parser.add_argument("--output", help="結果を保存する JSON ファイル")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("チャートデータのキャッシュウォーマー")
+    print("=" * 60)
+
+    if not login():
+        return
+
+    dashboard_uuid = embedded_uuid(args.dashboard)
+    if not dashboard_uuid:
+        print(f"❌ Dashboard {args.dashboard} は埋め込みが有効ではありません")
+        return
+    if dashboard_uuid != EMBEDDED_DASHBOARD_UUID:
+        print(f"ℹ️  Dashboard {args.dashboard} の埋め込み UUID ({dashboard_uuid}) で Guest Token を発行します")
+
+    charts = load_dashboard_charts(args.dashboard)
+    usage = chart_usage(args.usage_days)
+    charts.sort(key=lambda chart: usage[chart["id"]], reverse=True)
+
+    guests = {
+        department_id: guest_session(generate_guest_token(department_id, user_name, dashboard_uuid)[0])
+        for department_id, user_name, _ in DEPARTMENTS
+    }
+    # 閲覧数の多いチャートから、全部署分を続けて投入する
+    tasks = [(guests[department_id], chart, department_name)
+             for chart in charts for department_id, _, department_name in DEPARTMENTS]
+    print(f"🔥 {len(charts)}チャート × {len(DEPARTMENTS)}部署 = {len(tasks)}件 (同時実行 {args.workers})")
+    print()
+
+    started = time.perf_counter()
+    results = warm(tasks, args.force, args.workers, args.timeout)
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        if result["error"]:
+            print(f"❌ {result['chart']} / {result['department']}: {result['error']}")
+        else:
+            state = "キャッシュ済み" if result["was_cached"] else "ウォーム"
+            print(f"✅ {result['chart']} / {result['department']} ({result['time_range']}): "
+                  f"{result['seconds']:.2f}秒 {state} {result['rowcount']}行 (閲覧 {usage[result['chart_id']]}回)")
+
+    succeeded = [r for r in results if not r["error"]]
+    warmed = [r for r in succeeded if not r["was_cached"]]
+    print()
+    print(f"📊 ウォーム {len(warmed)}件 / キャッシュ済み {len(succeeded) - len(warmed)}件 / "
+          f"失敗 {len(results) - len(succeeded)}件 ({elapsed:.1f}秒)")
+    for result in sorted(succeeded, key=lambda r: r["seconds"], reverse=True)[:5]:
+        print(f"  🐢 {result['chart']} / {result['department']}: {result['seconds']:.2f}秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"elapsed": round(elapsed, 3), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"💾 {args.output} に保存しました")
+
+if __name__ == "__main__":
+    main()